@@ -0,0 +1,44 @@
+"""Benchmarks for django-changelog
+
+Run a benchmark as a module from the repository root, e.g.::
+
+    python -m benchmarks.receivers
+
+Benchmarks use ``tests.test_settings`` (override with
+``DJANGO_SETTINGS_MODULE``) and run against a throwaway test database.
+"""
+from __future__ import print_function
+
+from contextlib import contextmanager
+import os
+import timeit
+
+
+@contextmanager
+def test_database():
+    """Set up Django and a test database for the duration of the block"""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tests.test_settings')
+
+    import django
+    django.setup()
+
+    from django.test.runner import DiscoverRunner
+    runner = DiscoverRunner(interactive=False, verbosity=0)
+    old_config = runner.setup_databases()
+    try:
+        yield
+    finally:
+        runner.teardown_databases(old_config)
+
+
+def measure(func, number, repeat=3):
+    """Return the best time per call of ``func``, in seconds"""
+    timer = timeit.Timer(func)
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def report(name, seconds, baseline=None):
+    line = '{:<48} {:>12.2f} us'.format(name, seconds * 1e6)
+    if baseline:
+        line += '  ({:.2f}x)'.format(seconds / baseline)
+    print(line)
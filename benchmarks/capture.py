@@ -0,0 +1,81 @@
+"""Save throughput of the capture modes
+
+Compares saving a changed instance, and updating a queryset of
+``UPDATE_NUMBER`` rows, with changes captured by signal receivers
+(``snapshot`` and ``descriptor``) and by database triggers (``trigger``),
+against saving with nothing captured.
+"""
+from __future__ import print_function
+
+import itertools
+
+from benchmarks import measure, report, test_database
+
+
+NUMBER = 2000
+UPDATE_NUMBER = 1000
+
+
+def run(install_triggers):
+    from changelog.triggers import configure_capture_triggers
+    from tests.models import TrackedModel
+
+    if install_triggers:
+        # installs them in trigger mode, removes them in others
+        configure_capture_triggers()
+
+    instance = TrackedModel.objects.create(tracked_char='initial')
+    values = itertools.count()
+
+    def save():
+        instance.tracked_char = str(next(values))
+        instance.save()
+
+    def update():
+        TrackedModel.objects.update(tracked_char=str(next(values)))
+
+    TrackedModel.objects.bulk_create(
+        TrackedModel(tracked_char='initial')
+        for _ in range(UPDATE_NUMBER - 1)
+    )
+
+    return {
+        'save': measure(save, number=NUMBER),
+        'update {} rows'.format(UPDATE_NUMBER): measure(update, number=5),
+    }
+
+
+def main():
+    from django.test.utils import override_settings
+
+    from tests.models import TrackedModel
+
+    print('Saving {} times per mode'.format(NUMBER))
+
+    results = {}
+    for mode in ('none', 'snapshot', 'descriptor', 'trigger'):
+        # trigger mode without triggers captures nothing
+        settings = override_settings(
+            CHANGELOG_CAPTURE='trigger' if mode == 'none' else mode,
+        )
+        settings.enable()
+        try:
+            results[mode] = run(install_triggers=mode != 'none')
+        finally:
+            settings.disable()
+            TrackedModel.objects.all().delete()
+
+    for operation in sorted(results['none']):
+        baseline = results['none'][operation]
+        for mode in ('none', 'snapshot', 'descriptor', 'trigger'):
+            seconds = results[mode][operation]
+            report(
+                '{}, {} ({:.0f}/s)'.format(operation, mode, 1 / seconds),
+                seconds,
+                baseline=baseline if mode != 'none' else None,
+            )
+
+
+if __name__ == '__main__':
+    with test_database():
+        main()
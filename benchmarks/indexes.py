@@ -0,0 +1,152 @@
+"""History lookups on a large ``changelog_changelog`` table, with and without
+the indexes added by ``0004_changelog_indexes``
+
+Generates logs (2 million by default; pass a number to change it), 20 per
+instance, 1% of which log a rare field. Reports the plan and the latency of
+building a ``ChangeSet``, finding the latest log of an instance that logged a
+field, and counting the logs of the rare field.
+
+(``get_logged_values()`` reads ``ChangeLogState`` rather than the logs, so
+it isn't affected by these indexes, and isn't measured here.)
+
+    python -m benchmarks.indexes 5000000
+"""
+from __future__ import print_function
+
+import sys
+
+from benchmarks import measure, report, test_database
+
+
+NUMBER = 2000000
+LOGS_PER_INSTANCE = 20
+
+INDEXES = (
+    (
+        'changelog_changelog_history',
+        'CREATE INDEX changelog_changelog_history ON changelog_changelog '
+        '(content_type_id, object_id, created_at, id)',
+    ),
+    (
+        'changelog_changelog_fields',
+        'CREATE INDEX changelog_changelog_fields ON changelog_changelog '
+        'USING gin (fields)',
+    ),
+)
+
+
+def generate_logs(number, content_type_id):
+    from django.db import connection
+
+    with connection.cursor() as c:
+        c.execute(
+            """
+INSERT INTO changelog_changelog (
+    created_at,
+    object_id,
+    fields,
+    content_type_id,
+    log_type
+)
+SELECT
+    now() - n * interval '1 second',
+    n %% %s,
+    CASE WHEN n %% 100 = 0
+        THEN '{"rare": {"now": 1}}'::jsonb
+        ELSE jsonb_build_object(
+            'tracked_char',
+            jsonb_build_object('now', md5(n::text))
+        )
+    END,
+    %s,
+    0
+FROM
+    generate_series(1, %s) AS n
+            """,
+            [number // LOGS_PER_INSTANCE, content_type_id, number],
+        )
+
+
+def get_plan(queryset):
+    """Return the scans of the plan of ``queryset``"""
+    from django.db import connection
+
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as c:
+        c.execute('EXPLAIN ' + sql, params)
+        return [
+            line.strip(' ->')
+            for line, in c.fetchall()
+            if 'Scan' in line
+        ]
+
+
+def run(name):
+    from django.contrib.contenttypes.models import ContentType
+
+    from changelog.models import ChangeLog, ChangeSet
+    from tests.models import TrackedModel
+
+    instance = TrackedModel(pk=LOGS_PER_INSTANCE // 2)
+    changeset = ChangeSet(instance=instance)
+    latest = ChangeLog.objects.filter(
+        content_type=ContentType.objects.get_for_model(TrackedModel),
+        object_id=instance.pk,
+        fields__has_key='tracked_char',
+    ).order_by('-created_at', '-id')[:1]
+    rare = ChangeLog.objects.filter(fields__has_key='rare')
+
+    print(name)
+    for line in get_plan(changeset.iter_logs()):
+        print('    ChangeSet:', line)
+    for line in get_plan(latest):
+        print('    latest:   ', line)
+    for line in get_plan(rare):
+        print('    has_key:  ', line)
+
+    timings = {
+        'ChangeSet.diff': measure(
+            lambda: ChangeSet(instance=instance).diff,
+            number=5,
+        ),
+        'latest log of a field': measure(
+            lambda: list(latest.all()),
+            number=5,
+        ),
+        'fields__has_key count': measure(rare.count, number=1),
+    }
+    return timings
+
+
+def main(number):
+    from django.contrib.contenttypes.models import ContentType
+    from django.db import connection
+
+    from tests.models import TrackedModel
+
+    print('Generating {} logs'.format(number))
+    generate_logs(
+        number,
+        ContentType.objects.get_for_model(TrackedModel).pk,
+    )
+
+    with connection.cursor() as c:
+        for name, _ in INDEXES:
+            c.execute('DROP INDEX {}'.format(name))
+        c.execute('ANALYZE changelog_changelog')
+    before = run('without indexes')
+
+    with connection.cursor() as c:
+        for _, sql in INDEXES:
+            c.execute(sql)
+        c.execute('ANALYZE changelog_changelog')
+    after = run('with indexes')
+
+    for name in sorted(before):
+        report(name + ', without indexes', before[name])
+        report(name + ', with indexes', after[name], baseline=before[name])
+
+
+if __name__ == '__main__':
+    with test_database():
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else NUMBER)
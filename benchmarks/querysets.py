@@ -0,0 +1,36 @@
+"""Cost of building querysets of tracked models
+
+Compares chaining queryset methods on a tracked model with the same chain on
+an untracked model, which changelog leaves alone. Nothing is evaluated, so
+the difference is the overhead changelog adds to every queryset.
+"""
+from __future__ import print_function
+
+from benchmarks import measure, report, test_database
+
+
+NUMBER = 2000
+
+
+def main():
+    from tests.models import TrackedModel, UntrackedModel
+
+    def chain(model):
+        return lambda: (
+            model.objects
+            .filter(pk__gt=0)
+            .exclude(pk=1)
+            .order_by('-pk')
+            .only('pk')
+        )
+
+    print('Chaining {} querysets of 4 methods'.format(NUMBER))
+
+    untracked = measure(chain(UntrackedModel), NUMBER)
+    report('untracked', untracked)
+    report('tracked', measure(chain(TrackedModel), NUMBER), baseline=untracked)
+
+
+if __name__ == '__main__':
+    with test_database():
+        main()
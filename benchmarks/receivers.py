@@ -0,0 +1,45 @@
+"""Cost of changelog's signal receivers for untracked models
+
+Compares instantiating untracked models with receivers connected per tracked
+model (current behavior) and with a receiver connected for all senders that
+checks the sender against the tracked models (previous behavior).
+"""
+from __future__ import print_function
+
+from benchmarks import measure, report, test_database
+
+
+NUMBER = 100000
+
+
+def main():
+    from django.db.models import signals
+
+    from changelog.utils import get_tracked_models
+    from tests.models import TrackedModel, UntrackedModel
+
+    def global_receiver(sender, instance, **kwargs):
+        if sender not in get_tracked_models():
+            return
+
+    print('Instantiating {} models'.format(NUMBER))
+
+    untracked = measure(UntrackedModel, NUMBER)
+    report('untracked, per-model receivers', untracked)
+
+    signals.post_init.connect(global_receiver, dispatch_uid='benchmark')
+    try:
+        report(
+            'untracked, global receiver',
+            measure(UntrackedModel, NUMBER),
+            baseline=untracked,
+        )
+    finally:
+        signals.post_init.disconnect(dispatch_uid='benchmark')
+
+    report('tracked', measure(TrackedModel, NUMBER), baseline=untracked)
+
+
+if __name__ == '__main__':
+    with test_database():
+        main()
@@ -0,0 +1,83 @@
+"""Cost per tracked instance of each capture mode
+
+Loads tracked instances with large tracked values, and reports the time taken
+to load them, and the memory held per instance right after loading and after
+every tracked value has been replaced (at which point snapshots keep the
+initial values alive).
+"""
+from __future__ import print_function
+
+import gc
+import tracemalloc
+
+from benchmarks import measure, test_database
+
+
+NUMBER = 2000
+VALUE_LENGTH = 256
+
+
+def measure_memory(func):
+    """Return the size of the result of ``func``, and of the result after
+    every tracked value is replaced, per instance"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        instances = func()
+        loaded = tracemalloc.get_traced_memory()[0]
+
+        for i, instance in enumerate(instances):
+            instance.tracked_char = str(i).rjust(VALUE_LENGTH, 'z')
+        modified = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+    return (
+        float(loaded - start) / len(instances),
+        float(modified - start) / len(instances),
+    )
+
+
+def main():
+    from django.test import override_settings
+
+    from tests.models import TrackedModel
+
+    TrackedModel.objects.bulk_create(
+        TrackedModel(
+            tracked_char=str(i).rjust(VALUE_LENGTH, 'x'),
+            untracked_char='',
+        )
+        for i in range(NUMBER)
+    )
+
+    def load():
+        return list(TrackedModel.objects.all())
+
+    print('Loading {} instances, {} character values'.format(
+        NUMBER,
+        VALUE_LENGTH,
+    ))
+    print('{:<16} {:>12} {:>12} {:>12}'.format(
+        'mode',
+        'load time',
+        'loaded',
+        'modified',
+    ))
+
+    for mode in ('snapshot', 'digest', 'descriptor'):
+        with override_settings(CHANGELOG_CAPTURE=mode):
+            seconds = measure(load, number=5) / NUMBER
+            loaded, modified = measure_memory(load)
+        print('{:<16} {:>9.2f} us {:>10.0f} B {:>10.0f} B'.format(
+            mode,
+            seconds * 1e6,
+            loaded,
+            modified,
+        ))
+
+
+if __name__ == '__main__':
+    with test_database():
+        main()
@@ -2,6 +2,7 @@ from __future__ import unicode_literals
 import logging
 
 from django.apps import AppConfig
+from django.core.signals import setting_changed
 from django.db.models import signals
 
 
@@ -10,12 +11,52 @@ logger = logging.getLogger(__name__)
 
 class ChangelogConfig(AppConfig):
     def ready(self):
+        import changelog.managers  # noqa
         import changelog.signals  # noqa
+        import changelog.triggers  # noqa
 
-        changelog.signals.patch_managers()
+        changelog.managers.patch_managers()
         signals.post_migrate.connect(
-            receiver=changelog.signals.patch_managers,
+            receiver=changelog.managers.patch_managers,
             dispatch_uid='changelog.patch_managers',
         )
 
+        changelog.signals.patch_models()
+        signals.post_migrate.connect(
+            receiver=changelog.signals.patch_models,
+            dispatch_uid='changelog.patch_models',
+        )
+
+        # tracked models can't be determined until the database is ready
+        changelog.signals.connect_receivers()
+        signals.post_migrate.connect(
+            receiver=changelog.signals.connect_receivers,
+            dispatch_uid='changelog.connect_receivers',
+        )
+        signals.class_prepared.connect(
+            receiver=changelog.signals.track_deferred_model,
+            dispatch_uid='changelog.track_deferred_model',
+        )
+
+        signals.post_migrate.connect(
+            receiver=changelog.triggers.configure_state_trigger,
+            sender=self,
+            dispatch_uid='changelog.configure_state_trigger',
+        )
+        signals.post_migrate.connect(
+            receiver=changelog.triggers.configure_notify_trigger,
+            sender=self,
+            dispatch_uid='changelog.configure_notify_trigger',
+        )
+        # content types of tracked models may be created by any app's
+        # migrations
+        signals.post_migrate.connect(
+            receiver=changelog.triggers.configure_capture_triggers,
+            dispatch_uid='changelog.configure_capture_triggers',
+        )
+        setting_changed.connect(
+            receiver=changelog.signals.capture_setting_changed,
+            dispatch_uid='changelog.capture_setting_changed',
+        )
+
     name = 'changelog'
@@ -0,0 +1,744 @@
+"""Compressed, columnar archives of old logs
+
+Logs are archived a month (in UTC) at a time, to a file per month named
+``changelog_y<year>m<month>.archive`` in ``CHANGELOG_ARCHIVE_DIR``. Archives
+are memory-mapped to read them, and only the blocks holding the logs of the
+requested instance are decompressed, so reading an instance's history costs
+the same however large the archive.
+
+Logs are sorted by content type, object id, ``created_at`` and id, and split
+into blocks of ``BLOCK_ROWS`` logs. A file holds::
+
+    MAGIC
+    blocks          zlib compressed columns of their logs: ids and
+                    created_at (in microseconds) as the first value then
+                    deltas, log types, and the offsets and JSON of fields
+    dictionary      zlib compressed JSON: content type labels
+                    (``'app_label.model'``) and field names, which logs
+                    refer to by index
+    block index     a BLOCK per block
+    object index    an OBJECT per instance, sorted by content type and
+                    object id: the instance's first log and number of logs
+    FOOTER
+
+All integers are little-endian.
+"""
+from array import array
+from collections import namedtuple
+from datetime import datetime, timedelta
+import heapq
+from itertools import groupby
+import json
+import mmap
+import os
+import re
+import struct
+import threading
+import zlib
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils import timezone
+
+from changelog.db import fetch_chunks, server_side_cursor
+
+
+ARCHIVE_DIR_SETTING = 'CHANGELOG_ARCHIVE_DIR'
+
+MAGIC = b'CLARCH01'
+BLOCK_ROWS = 1024
+
+# offset, length, number of logs
+BLOCK = struct.Struct('<QII')
+# content type, object id, first log, number of logs
+OBJECT = struct.Struct('<IqII')
+# dictionary offset and length, block index offset and count, object index
+# offset and count, logs per block, first and last created_at, magic
+FOOTER = struct.Struct('<QIQIQIIqq8s')
+
+FILENAME = 'changelog_y{:04d}m{:02d}.archive'
+FILENAME_RE = re.compile(r'^changelog_y(\d{4})m(\d{2})\.archive$')
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+_open_archives = {}
+_open_archives_lock = threading.Lock()
+
+MONTHS = """
+SELECT
+    month AT TIME ZONE 'UTC',
+    (month + interval '1 month') AT TIME ZONE 'UTC'
+FROM
+    (
+        SELECT DISTINCT
+            date_trunc('month', created_at AT TIME ZONE 'UTC') AS month
+        FROM
+            changelog_changelog
+        WHERE
+            created_at < %(before)s
+    ) AS months
+ORDER BY
+    1
+"""
+
+LOGS = """
+SELECT
+    id,
+    created_at,
+    content_type_id,
+    object_id,
+    log_type,
+    fields
+FROM
+    {table}
+WHERE
+    created_at >= %(start)s AND
+    created_at < %(end)s
+ORDER BY
+    content_type_id,
+    object_id,
+    created_at,
+    id
+"""
+
+
+ArchivedLog = namedtuple(
+    'ArchivedLog',
+    ('id', 'created_at', 'log_type', 'fields'),
+)
+
+
+def _to_micros(when):
+    delta = when - EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+
+def _from_micros(micros):
+    return EPOCH + timedelta(microseconds=micros)
+
+
+def _label(content_type):
+    return '{}.{}'.format(content_type.app_label, content_type.model)
+
+
+def _month(when):
+    """Return the start of the month of ``when``, in UTC"""
+    when = when.astimezone(timezone.utc)
+    return datetime(when.year, when.month, 1, tzinfo=timezone.utc)
+
+
+def _next_month(month):
+    if month.month == 12:
+        return month.replace(year=month.year + 1, month=1)
+    return month.replace(month=month.month + 1)
+
+
+class ArchiveWriter(object):
+    """Write logs to an archive file
+
+    Logs must be written in order of content type, object id, then
+    ``created_at`` and id::
+
+        with ArchiveWriter(path) as writer:
+            for log in logs:
+                writer.write(*log)
+
+    If the block raises, the file is removed.
+    """
+
+    def __init__(self, path, block_rows=BLOCK_ROWS):
+        self.path = path
+        self.block_rows = block_rows
+        self.count = 0
+
+        self._file = open(path, 'wb')
+        self._file.write(MAGIC)
+        self._content_types = []
+        self._fields = {}
+        self._blocks = bytearray()
+        self._objects = bytearray()
+        self._object = None
+        self._rows = []
+        self._first_created_at = None
+        self._last_created_at = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self._file.close()
+            os.remove(self.path)
+
+    def write(self, pk, created_at, content_type, object_id, log_type, fields):
+        """Write a log
+
+        :param content_type: The label (``'app_label.model'``) of the log's
+                             content type
+        """
+        if not self._content_types or self._content_types[-1] != content_type:
+            if content_type in self._content_types:
+                raise ValueError('Logs must be sorted by content type')
+            self._content_types.append(content_type)
+
+        key = (len(self._content_types) - 1, object_id)
+        if self._object is None or key != tuple(self._object[:2]):
+            if self._object is not None:
+                if key < tuple(self._object[:2]):
+                    raise ValueError('Logs must be sorted by object id')
+                self._objects += OBJECT.pack(*self._object)
+            self._object = [key[0], key[1], self.count, 0]
+        self._object[3] += 1
+
+        micros = _to_micros(created_at)
+        if self._first_created_at is None or micros < self._first_created_at:
+            self._first_created_at = micros
+        if self._last_created_at is None or micros > self._last_created_at:
+            self._last_created_at = micros
+
+        self._rows.append((pk, micros, log_type, self._encode(fields)))
+        self.count += 1
+        if len(self._rows) == self.block_rows:
+            self._write_block()
+
+    def close(self):
+        """Write the indexes, and close the file"""
+        if self._rows:
+            self._write_block()
+        if self._object is not None:
+            self._objects += OBJECT.pack(*self._object)
+
+        fields = sorted(self._fields, key=self._fields.get)
+        dictionary = zlib.compress(json.dumps({
+            'content_types': self._content_types,
+            'fields': fields,
+        }).encode('utf-8'))
+        dictionary_offset = self._file.tell()
+        self._file.write(dictionary)
+
+        blocks_offset = self._file.tell()
+        self._file.write(self._blocks)
+        objects_offset = self._file.tell()
+        self._file.write(self._objects)
+
+        self._file.write(FOOTER.pack(
+            dictionary_offset,
+            len(dictionary),
+            blocks_offset,
+            len(self._blocks) // BLOCK.size,
+            objects_offset,
+            len(self._objects) // OBJECT.size,
+            self.block_rows,
+            self._first_created_at or 0,
+            self._last_created_at or 0,
+            MAGIC,
+        ))
+        self._file.close()
+
+    def _encode(self, fields):
+        """Return ``fields`` as JSON, with field names replaced by index"""
+        entries = []
+        for name, change in sorted(fields.items()):
+            if name not in self._fields:
+                self._fields[name] = len(self._fields)
+            entries.append([self._fields[name], change])
+        return json.dumps(entries, separators=(',', ':')).encode('utf-8')
+
+    def _write_block(self):
+        rows = self._rows
+        self._rows = []
+
+        ids = [rows[0][0]]
+        times = [rows[0][1]]
+        for previous, row in zip(rows, rows[1:]):
+            ids.append(row[0] - previous[0])
+            times.append(row[1] - previous[1])
+
+        offsets = [0]
+        for row in rows:
+            offsets.append(offsets[-1] + len(row[3]))
+
+        n = len(rows)
+        block = zlib.compress(b''.join([
+            struct.pack('<{}q'.format(n), *ids),
+            struct.pack('<{}q'.format(n), *times),
+            struct.pack('<{}B'.format(n), *[row[2] for row in rows]),
+            struct.pack('<{}I'.format(n + 1), *offsets),
+        ] + [row[3] for row in rows]))
+
+        self._blocks += BLOCK.pack(self._file.tell(), len(block), n)
+        self._file.write(block)
+
+
+class Archive(object):
+    """A memory-mapped archive file
+
+    Opening an archive only reads its footer and dictionary; logs are read
+    from the blocks that hold them, when they're requested.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if (
+            len(self._mmap) < len(MAGIC) + FOOTER.size or
+            self._mmap[:len(MAGIC)] != MAGIC
+        ):
+            self.close()
+            raise ValueError('Not a changelog archive: {}'.format(path))
+        (
+            dictionary_offset,
+            dictionary_length,
+            self._blocks_offset,
+            self._block_count,
+            self._objects_offset,
+            self._object_count,
+            self._block_rows,
+            first_created_at,
+            last_created_at,
+            magic,
+        ) = FOOTER.unpack_from(self._mmap, len(self._mmap) - FOOTER.size)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError('Truncated changelog archive: {}'.format(path))
+
+        dictionary = json.loads(zlib.decompress(
+            self._mmap[dictionary_offset:dictionary_offset + dictionary_length]
+        ).decode('utf-8'))
+        self.content_types = dictionary['content_types']
+        self.fields = dictionary['fields']
+        self.first_created_at = _from_micros(first_created_at)
+        self.last_created_at = _from_micros(last_created_at)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self._mmap.close()
+
+    def get_logs(self, content_type, object_id, since=None, until=None):
+        """Return the archived logs of an instance, in chronological order
+
+        :param content_type: The label (``'app_label.model'``) of the
+                             instance's content type
+        :param since: If given, only return logs created at or after it
+        :param until: If given, only return logs created at or before it
+        :return: A list of ``ArchivedLog``s
+        """
+        if content_type not in self.content_types:
+            return []
+        found = self._find(self.content_types.index(content_type), object_id)
+        if found is None:
+            return []
+        first, count = found
+
+        since = None if since is None else _to_micros(since)
+        until = None if until is None else _to_micros(until)
+
+        logs = []
+        row = first
+        while row < first + count:
+            block = row // self._block_rows
+            start = block * self._block_rows
+            columns = self._read_block(block)
+            times = columns[1]
+            end = min(first + count, start + len(times))
+            for i in range(row - start, end - start):
+                if (
+                    (since is not None and times[i] < since) or
+                    (until is not None and times[i] > until)
+                ):
+                    continue
+                logs.append(self._get_log(columns, i))
+            row = end
+        return logs
+
+    def iter_logs(self, content_type):
+        """Yield the archived logs of every instance of a content type
+
+        Blocks are decompressed one at a time, as they're reached.
+
+        :param content_type: The label (``'app_label.model'``) of the
+                             content type
+        :return: ``(object_id, ArchivedLog)``s, by object id then in
+                 chronological order
+        """
+        if content_type not in self.content_types:
+            return
+        index = self.content_types.index(content_type)
+
+        # the first instance of the content type
+        low, high = 0, self._object_count
+        while low < high:
+            middle = (low + high) // 2
+            if self._get_object(middle)[0] < index:
+                low = middle + 1
+            else:
+                high = middle
+
+        block, columns = None, None
+        for position in range(low, self._object_count):
+            entry_content_type, object_id, first, count = self._get_object(
+                position,
+            )
+            if entry_content_type != index:
+                break
+            for row in range(first, first + count):
+                if row // self._block_rows != block:
+                    block = row // self._block_rows
+                    columns = self._read_block(block)
+                yield object_id, self._get_log(
+                    columns,
+                    row - block * self._block_rows,
+                )
+
+    def _find(self, content_type, object_id):
+        """Binary search the object index for an instance
+
+        :return: The instance's first log and number of logs, or None
+        """
+        key = (content_type, object_id)
+        low, high = 0, self._object_count
+        while low < high:
+            middle = (low + high) // 2
+            entry = self._get_object(middle)
+            if entry[:2] < key:
+                low = middle + 1
+            elif entry[:2] > key:
+                high = middle
+            else:
+                return entry[2:]
+        return None
+
+    def _get_object(self, position):
+        """Return an entry of the object index"""
+        return OBJECT.unpack_from(
+            self._mmap,
+            self._objects_offset + position * OBJECT.size,
+        )
+
+    def _get_log(self, columns, i):
+        """Return the ``i``th log of a block's columns"""
+        ids, times, log_types, offsets, values = columns
+        fields = json.loads(values[offsets[i]:offsets[i + 1]].decode('utf-8'))
+        return ArchivedLog(
+            ids[i],
+            _from_micros(times[i]),
+            log_types[i],
+            {self.fields[name]: change for name, change in fields},
+        )
+
+    def _read_block(self, block):
+        """Decompress a block, and return its columns"""
+        offset, length, n = BLOCK.unpack_from(
+            self._mmap,
+            self._blocks_offset + block * BLOCK.size,
+        )
+        data = zlib.decompress(self._mmap[offset:offset + length])
+
+        ids = list(struct.unpack_from('<{}q'.format(n), data))
+        times = list(struct.unpack_from('<{}q'.format(n), data, 8 * n))
+        for i in range(1, n):
+            ids[i] += ids[i - 1]
+            times[i] += times[i - 1]
+        log_types = struct.unpack_from('<{}B'.format(n), data, 16 * n)
+        offsets = struct.unpack_from('<{}I'.format(n + 1), data, 17 * n)
+        values = data[17 * n + 4 * (n + 1):]
+        return ids, times, log_types, offsets, values
+
+
+def open_archive(path):
+    """Return the open ``Archive`` of ``path``, shared by the process
+
+    Archives are kept open, so each archive's dictionary is only decompressed
+    once per process rather than on every read; an archive is reopened when
+    its file is replaced.
+    """
+    stat = os.stat(path)
+    key = (stat.st_ino, stat.st_size, stat.st_mtime)
+    with _open_archives_lock:
+        cached = _open_archives.get(path)
+        if cached is None or cached[0] != key:
+            # an archive replaced here may still be read by another thread,
+            # so it's closed when it's garbage collected
+            cached = _open_archives[path] = (key, Archive(path))
+    return cached[1]
+
+
+def get_archive_dir():
+    return getattr(settings, ARCHIVE_DIR_SETTING, None)
+
+
+def get_archive_paths(since=None, until=None, directory=None):
+    """Return the paths of the archives of months in a range, in order
+
+    :param directory: Defaults to ``CHANGELOG_ARCHIVE_DIR``
+    """
+    directory = directory or get_archive_dir()
+    if not directory or not os.path.isdir(directory):
+        return []
+
+    paths = []
+    for filename in sorted(os.listdir(directory)):
+        match = FILENAME_RE.match(filename)
+        if match is None:
+            continue
+        start = datetime(
+            int(match.group(1)),
+            int(match.group(2)),
+            1,
+            tzinfo=timezone.utc,
+        )
+        if (
+            (since is None or _next_month(start) > since) and
+            (until is None or start <= until)
+        ):
+            paths.append(os.path.join(directory, filename))
+    return paths
+
+
+def get_archived_logs(
+    content_type,
+    object_id,
+    since=None,
+    until=None,
+    directory=None,
+):
+    """Return the archived logs of an instance, in chronological order
+
+    Only the archives of months between ``since`` and ``until`` are read.
+
+    :param content_type: The ``ContentType`` of the instance
+    :param directory: Defaults to ``CHANGELOG_ARCHIVE_DIR``
+    :return: A list of ``ArchivedLog``s
+    """
+    return get_archived_logs_in_bulk(
+        content_type,
+        [object_id],
+        since=since,
+        until=until,
+        directory=directory,
+    ).get(object_id, [])
+
+
+def get_archived_logs_in_bulk(
+    content_type,
+    object_ids,
+    since=None,
+    until=None,
+    directory=None,
+):
+    """Return the archived logs of many instances of a model
+
+    Each archive of a month between ``since`` and ``until`` is read once.
+
+    :param content_type: The ``ContentType`` of the instances
+    :param directory: Defaults to ``CHANGELOG_ARCHIVE_DIR``
+    :return: A dict of lists of ``ArchivedLog``s, in chronological order, by
+             object id; instances without archived logs are left out
+    """
+    logs = {}
+    for path in get_archive_paths(since, until, directory):
+        archive = open_archive(path)
+        for object_id in object_ids:
+            found = archive.get_logs(
+                _label(content_type),
+                object_id,
+                since=since,
+                until=until,
+            )
+            if found:
+                logs.setdefault(object_id, []).extend(found)
+    return logs
+
+
+def archive_logs(
+    before,
+    directory=None,
+    using=DEFAULT_DB_ALIAS,
+    delete=False,
+    chunk_size=1000,
+):
+    """Archive the logs of every month that ended before ``before``
+
+    Logs are read a month at a time, in order, through a server-side cursor,
+    and written to a temporary file that replaces the month's archive once
+    it's complete.
+
+    Without ``delete``, months that are already archived are skipped; their
+    logs are still in the database. With ``delete``, logs written to an
+    archived month since (e.g. by late writers) are merged into its archive.
+    Each month's monthly partition, if the table is partitioned, is detached
+    before it's read and dropped once it's archived; other logs are deleted
+    ``chunk_size`` at a time, by id.
+
+    :param directory: Defaults to ``CHANGELOG_ARCHIVE_DIR``
+    :param delete: If true, delete each month's logs from the database once
+                   they're archived
+    :return: The paths of the archives written
+    """
+    # partitions imports the models, which import this module
+    from changelog.partitions import (
+        TABLE,
+        attach_partition,
+        detach_partition,
+        get_partitions,
+        is_partitioned,
+    )
+
+    directory = directory or get_archive_dir()
+    if not directory:
+        raise ValueError('{} is not set'.format(ARCHIVE_DIR_SETTING))
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        cursor.execute(MONTHS, {'before': _month(before)})
+        months = cursor.fetchall()
+
+    partitions = {}
+    if delete and is_partitioned(using=using):
+        partitions = {
+            start: name
+            for name, start, end in get_partitions(using=using)
+            if start is not None and end == _next_month(start)
+        }
+
+    paths = []
+    for start, end in months:
+        filename = FILENAME.format(start.year, start.month)
+        path = os.path.join(directory, filename)
+        if not delete and os.path.exists(path):
+            continue
+
+        partition = partitions.get(start)
+        if partition is not None:
+            # logs of the month written from now on go to the default
+            # partition, and are merged into the archive by the next run
+            detach_partition(partition, using=using)
+        try:
+            ids = _write_archive(
+                path,
+                start,
+                end,
+                partition or TABLE,
+                using,
+                chunk_size,
+            )
+        except Exception:
+            if partition is not None:
+                attach_partition(partition, start, end, using=using)
+            raise
+        paths.append(path)
+
+        if partition is not None:
+            with connection.cursor() as cursor:
+                cursor.execute('DROP TABLE {}'.format(
+                    connection.ops.quote_name(partition),
+                ))
+        elif delete:
+            # only the logs archived are deleted, so logs of the month
+            # written since it was read are kept
+            for i in range(0, len(ids), chunk_size):
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        'DELETE FROM changelog_changelog '
+                        'WHERE created_at >= %s AND created_at < %s AND '
+                        'id = ANY(%s)',
+                        [start, end, list(ids[i:i + chunk_size])],
+                    )
+    return paths
+
+
+def _write_archive(path, start, end, table, using, chunk_size):
+    """Write the logs of a month in ``table`` to its archive
+
+    If the month is already archived, its archived logs are kept.
+
+    :return: An ``array`` of the ids of the logs read from ``table``
+    """
+    content_types = ContentType.objects.db_manager(using)
+    connection = connections[using]
+    ids = array('l')
+
+    def read(cursor):
+        for row in fetch_chunks(cursor, chunk_size):
+            pk, created_at, content_type_id, object_id, log_type, fields = row
+            ids.append(pk)
+            yield (
+                _label(content_types.get_for_id(content_type_id)),
+                object_id,
+                ArchivedLog(pk, created_at, log_type, fields),
+            )
+
+    archive = Archive(path) if os.path.exists(path) else None
+    try:
+        with ArchiveWriter(path + '.tmp') as writer:
+            with server_side_cursor(using) as cursor:
+                cursor.execute(
+                    LOGS.format(table=connection.ops.quote_name(table)),
+                    {'start': start, 'end': end},
+                )
+                for content_type, object_id, log in _merge_logs(
+                    read(cursor),
+                    archive,
+                ):
+                    writer.write(
+                        log.id,
+                        log.created_at,
+                        content_type,
+                        object_id,
+                        log.log_type,
+                        log.fields,
+                    )
+    finally:
+        if archive is not None:
+            archive.close()
+    os.rename(writer.path, path)
+    return ids
+
+
+def _merge_logs(logs, archive):
+    """Merge ``(content_type, object_id, ArchivedLog)``s with an archive's
+
+    :param logs: Grouped by content type, and in order of object id then
+                 ``created_at`` and id within each content type
+    :param archive: An ``Archive``, or None
+    :return: The logs of both, in the same order; logs in both are only
+             returned once
+    """
+    content_types = set()
+    for content_type, group in groupby(logs, key=lambda log: log[0]):
+        content_types.add(content_type)
+        group = (
+            (object_id, log.created_at, log.id, 0, log)
+            for _, object_id, log in group
+        )
+        if archive is not None:
+            group = heapq.merge(group, (
+                (object_id, log.created_at, log.id, 1, log)
+                for object_id, log in archive.iter_logs(content_type)
+            ))
+
+        last_id = None
+        for object_id, _, pk, _, log in group:
+            if pk != last_id:
+                yield content_type, object_id, log
+            last_id = pk
+
+    if archive is None:
+        return
+    for content_type in archive.content_types:
+        if content_type in content_types:
+            continue
+        for object_id, log in archive.iter_logs(content_type):
+            yield content_type, object_id, log
@@ -0,0 +1,232 @@
+"""Rolling up old history into fewer logs
+
+Logs of an instance older than a cutoff are merged into its last log before
+the cutoff, whose fields become the fold of theirs (as in ``ChangeSet.diff``:
+the first ``'was'`` and last ``'now'`` of each field). ``ON_DELETE`` logs are
+kept, and split the logs around them into separate runs, so deletes stay in
+history.
+
+The merged log keeps the id, ``created_at`` and type of the last log of its
+run, so checkpoints and the diffs of ranges ending after the cutoff are
+unchanged.
+"""
+from django.contrib.contenttypes.models import ContentType
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from changelog.models import ChangeLog
+
+
+COMPACT = """
+WITH objects AS (
+    SELECT
+        content_type_id,
+        object_id
+    FROM
+        changelog_changelog
+    WHERE
+        created_at < %(before)s AND
+        {content_types}
+        (content_type_id, object_id) > (%(content_type_id)s, %(object_id)s)
+    GROUP BY
+        content_type_id,
+        object_id
+    HAVING
+        count(*) > 1
+    ORDER BY
+        content_type_id,
+        object_id
+    LIMIT %(batch_size)s
+),
+logs AS (
+    SELECT
+        log.id,
+        log.content_type_id,
+        log.object_id,
+        log.created_at,
+        log.log_type,
+        log.fields,
+        -- runs of logs are split by deletes
+        count(*) FILTER (WHERE log.log_type = %(on_delete)s) OVER (
+            PARTITION BY log.content_type_id, log.object_id
+            ORDER BY log.created_at, log.id
+        ) AS run
+    FROM
+        objects
+        JOIN changelog_changelog AS log ON
+            log.content_type_id = objects.content_type_id AND
+            log.object_id = objects.object_id
+    WHERE
+        log.created_at < %(before)s
+),
+runs AS (
+    SELECT
+        content_type_id,
+        object_id,
+        run,
+        (array_agg(id ORDER BY created_at DESC, id DESC))[1] AS last_id,
+        max(created_at) AS last_created_at
+    FROM
+        logs
+    WHERE
+        log_type != %(on_delete)s
+    GROUP BY
+        content_type_id,
+        object_id,
+        run
+    HAVING
+        count(*) > 1
+),
+entries AS (
+    SELECT
+        logs.content_type_id,
+        logs.object_id,
+        logs.run,
+        entry.key,
+        entry.value,
+        row_number() OVER (
+            PARTITION BY logs.content_type_id, logs.object_id, logs.run,
+                entry.key
+            ORDER BY logs.created_at, logs.id
+        ) AS n,
+        row_number() OVER (
+            PARTITION BY logs.content_type_id, logs.object_id, logs.run,
+                entry.key
+            ORDER BY logs.created_at DESC, logs.id DESC
+        ) AS reverse_n
+    FROM
+        logs
+        JOIN runs USING (content_type_id, object_id, run),
+        jsonb_each(logs.fields) AS entry
+    WHERE
+        logs.log_type != %(on_delete)s
+),
+folded AS (
+    SELECT
+        first_entry.content_type_id,
+        first_entry.object_id,
+        first_entry.run,
+        jsonb_object_agg(
+            first_entry.key,
+            CASE WHEN last_entry.value ? 'now'
+                THEN (first_entry.value - 'now') || jsonb_build_object(
+                    'now',
+                    last_entry.value -> 'now'
+                )
+                -- deleted
+                ELSE first_entry.value - 'now'
+            END
+        ) AS fields
+    FROM
+        entries AS first_entry
+        JOIN entries AS last_entry ON (
+            last_entry.content_type_id = first_entry.content_type_id AND
+            last_entry.object_id = first_entry.object_id AND
+            last_entry.run = first_entry.run AND
+            last_entry.key = first_entry.key AND
+            last_entry.reverse_n = 1
+        )
+    WHERE
+        first_entry.n = 1
+    GROUP BY
+        first_entry.content_type_id,
+        first_entry.object_id,
+        first_entry.run
+),
+updated AS (
+    UPDATE changelog_changelog AS log SET
+        fields = coalesce(folded.fields, '{{}}')
+    FROM
+        runs
+        LEFT JOIN folded USING (content_type_id, object_id, run)
+    WHERE
+        log.id = runs.last_id AND
+        log.created_at = runs.last_created_at
+    RETURNING
+        log.id
+),
+deleted AS (
+    DELETE FROM changelog_changelog AS log
+    USING
+        logs
+        JOIN runs USING (content_type_id, object_id, run)
+    WHERE
+        log.id = logs.id AND
+        log.created_at = logs.created_at AND
+        logs.log_type != %(on_delete)s AND
+        logs.id != runs.last_id
+    RETURNING
+        log.id
+)
+SELECT
+    (SELECT count(*) FROM updated),
+    (SELECT count(*) FROM deleted),
+    last_object.content_type_id,
+    last_object.object_id
+FROM
+    (
+        SELECT
+            *
+        FROM
+            objects
+        ORDER BY
+            content_type_id DESC,
+            object_id DESC
+        LIMIT 1
+    ) AS last_object
+"""
+
+
+def compact_logs(
+    before,
+    models=None,
+    batch_size=1000,
+    using=DEFAULT_DB_ALIAS,
+    progress=None,
+):
+    """Merge the logs of each instance created before ``before``
+
+    Instances are compacted ``batch_size`` at a time, in order of content
+    type and pk, each batch with one statement in its own transaction, so
+    locks are only held briefly and compaction can run alongside writes.
+
+    :param models: If given, only compact logs of these models
+    :param progress: Called after each batch with the number of merged
+                     logs written and logs removed so far
+    :return: The number of logs removed
+    """
+    content_types = ''
+    if models is not None:
+        content_types = 'content_type_id IN ({}) AND'.format(', '.join(
+            str(ContentType.objects.db_manager(using).get_for_model(model).pk)
+            for model in models
+        ))
+
+    sql = COMPACT.format(content_types=content_types)
+    params = {
+        'before': before,
+        'batch_size': batch_size,
+        'on_delete': ChangeLog.ON_DELETE,
+        'content_type_id': 0,
+        'object_id': 0,
+    }
+
+    merged_logs = removed = 0
+    while True:
+        with transaction.atomic(using=using):
+            with connections[using].cursor() as cursor:
+                cursor.execute(sql, params)
+                row = cursor.fetchone()
+
+        if row is None:
+            # no more instances with logs to merge
+            break
+
+        merged, deleted, content_type_id, object_id = row
+        merged_logs += merged
+        removed += deleted
+        params['content_type_id'] = content_type_id
+        params['object_id'] = object_id
+        if progress is not None:
+            progress(merged_logs, removed)
+
+    return removed
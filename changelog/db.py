@@ -0,0 +1,42 @@
+from contextlib import contextmanager
+import uuid
+
+from django.db import connections, transaction
+
+
+@contextmanager
+def server_side_cursor(using):
+    """Return a cursor that keeps query results on the database server
+
+    Rows are only sent as they're fetched, so results of any size can be
+    streamed in chunks with ``fetchmany()``. The cursor is only usable inside
+    a transaction, so the block runs in one.
+    """
+    connection = connections[using]
+    with transaction.atomic(using=using, savepoint=False):
+        connection.ensure_connection()
+        with connection.wrap_database_errors:
+            cursor = connection.connection.cursor(
+                name='changelog_{}'.format(uuid.uuid4().hex),
+            )
+
+        # wrapped like ``connection.cursor()``, so queries are logged
+        if connection.queries_logged:
+            cursor = connection.make_debug_cursor(cursor)
+        else:
+            cursor = connection.make_cursor(cursor)
+
+        try:
+            yield cursor
+        finally:
+            cursor.close()
+
+
+def fetch_chunks(cursor, chunk_size):
+    """Yield the rows of ``cursor``, fetching ``chunk_size`` at a time"""
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            return
+        for row in rows:
+            yield row
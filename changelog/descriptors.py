@@ -0,0 +1,112 @@
+from django.db.models.query_utils import DeferredAttribute
+
+from changelog.snapshots import NOT_LOADED
+
+
+# instance attribute holding the initial values of fields that were set
+CHANGED_ATTR = '_changelog_changed'
+
+
+class TrackedFieldDescriptor(object):
+    """Record the initial value of a tracked field the first time it is set
+
+    Values are stored in the instance dict as usual. Setting a field that
+    already has a value saves that value in the instance's ``CHANGED_ATTR``
+    dict, unless one is saved already. Untouched instances carry no record
+    of their initial values at all.
+
+    :param attname: The attname of the tracked field
+    :param parent: The class attribute this descriptor replaces, if any
+    """
+
+    def __init__(self, attname, parent=None):
+        self.attname = attname
+        self.parent = parent
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+
+        try:
+            return instance.__dict__[self.attname]
+        except KeyError:
+            if self.parent is None:
+                raise AttributeError(self.attname)
+            # deferred; let the parent load it
+            return self.parent.__get__(instance, owner)
+
+    def __set__(self, instance, value):
+        data = instance.__dict__
+
+        if self.attname in data:
+            self.record(data, data[self.attname])
+        elif not instance._state.adding:
+            # deferred fields are set after the instance is loaded; either
+            # by loading them, or without ever knowing their initial value
+            self.record(data, NOT_LOADED)
+        # otherwise the field is being set by ``__init__``
+
+        if self.parent is not None and hasattr(self.parent, '__set__'):
+            self.parent.__set__(instance, value)
+        else:
+            data[self.attname] = value
+
+    def record(self, data, initial):
+        try:
+            changed = data[CHANGED_ATTR]
+        except KeyError:
+            changed = data[CHANGED_ATTR] = {}
+
+        if self.attname not in changed:
+            changed[self.attname] = initial
+
+
+class TrackedDeferredAttribute(TrackedFieldDescriptor, DeferredAttribute):
+    """A ``TrackedFieldDescriptor`` replacing a ``DeferredAttribute``
+
+    Before Django 1.10, deferred fields are found by the class of their
+    descriptor.
+    """
+
+    def __init__(self, attname, parent):
+        self.__dict__.update(parent.__dict__)
+        super(TrackedDeferredAttribute, self).__init__(attname, parent)
+
+
+def install_descriptors(model, fields):
+    """Install ``TrackedFieldDescriptor``s for the given attnames"""
+    for attname in fields:
+        current = model.__dict__.get(attname)
+        if isinstance(current, TrackedFieldDescriptor):
+            continue
+
+        if isinstance(current, DeferredAttribute):
+            descriptor = TrackedDeferredAttribute(attname, current)
+        else:
+            descriptor = TrackedFieldDescriptor(attname, current)
+        setattr(model, attname, descriptor)
+
+
+def remove_descriptors(model, fields):
+    """Restore the class attributes replaced by ``install_descriptors``"""
+    for attname in fields:
+        current = model.__dict__.get(attname)
+        if not isinstance(current, TrackedFieldDescriptor):
+            continue
+
+        if current.parent is None:
+            delattr(model, attname)
+        else:
+            setattr(model, attname, current.parent)
+
+
+def get_changed_values(instance):
+    """Return the initial values of fields set since the last save"""
+    return instance.__dict__.get(CHANGED_ATTR, {})
+
+
+def clear_changed_values(instance, fields):
+    changed = instance.__dict__.get(CHANGED_ATTR)
+    if changed:
+        for field in fields:
+            changed.pop(field, None)
@@ -0,0 +1,167 @@
+"""Streaming logs out of the database
+
+Logs are read in order of id through a server-side cursor, a chunk at a
+time, and written one line each, so exports of any size run in constant
+memory. ``fields`` are selected as JSON text and written as they are, without
+being decoded and encoded again.
+"""
+from __future__ import unicode_literals
+
+from collections import OrderedDict
+import csv
+import json
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Func, TextField
+from django.utils import six
+
+from changelog.db import fetch_chunks, server_side_cursor
+from changelog.models import ChangeLog
+
+
+NDJSON = 'ndjson'
+CSV = 'csv'
+FORMATS = (NDJSON, CSV)
+
+COLUMNS = ('id', 'created_at', 'model', 'object_id', 'log_type', 'fields')
+
+DEFAULT_CHUNK_SIZE = 2000
+
+
+class JSONText(Func):
+    """A JSON column as text"""
+    template = '%(expressions)s::text'
+
+    def __init__(self, expression):
+        super(JSONText, self).__init__(expression, output_field=TextField())
+
+
+def get_model_labels(using=DEFAULT_DB_ALIAS):
+    """Return ``'app_label.model'`` by content type id, for every model"""
+    return {
+        pk: '{}.{}'.format(app_label, model)
+        for pk, app_label, model in ContentType.objects.db_manager(
+            using,
+        ).values_list('pk', 'app_label', 'model')
+    }
+
+
+def _get_csv_writer(stream):
+    """Return a function writing a row to the text ``stream`` as CSV"""
+    if six.PY3:
+        return csv.writer(stream, lineterminator='\n').writerow
+
+    # Python 2's csv module only writes byte strings, so rows are encoded
+    # to a buffer, then decoded to the stream
+    buffer = six.BytesIO()
+    writer = csv.writer(buffer, lineterminator=b'\n')
+
+    def writerow(row):
+        writer.writerow([
+            six.text_type(value).encode('utf-8') for value in row
+        ])
+        stream.write(buffer.getvalue().decode('utf-8'))
+        buffer.seek(0)
+        buffer.truncate()
+
+    return writerow
+
+
+def export_logs(
+    stream,
+    format=NDJSON,
+    models=None,
+    object_id=None,
+    since=None,
+    until=None,
+    log_types=None,
+    after=None,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+    using=DEFAULT_DB_ALIAS,
+    progress=None,
+):
+    """Write logs to ``stream``, one per line, in order of id
+
+    Each log is written as a JSON object (``'ndjson'``) or a CSV row
+    (``'csv'``, after a header), with the columns in ``COLUMNS``. ``model``
+    is the log's ``'app_label.model'``, and ``fields`` its JSON.
+
+    :param stream: A text file-like object
+    :param models: If given, only export logs of these models
+    :param object_id: If given, only export logs of objects with this pk
+    :param since: If given, only export logs created at or after this time
+    :param until: If given, only export logs created at or before this time
+    :param log_types: If given, only export logs of these types
+    :param after: If given, only export logs with greater ids, e.g. to resume
+                  an export from the last id it wrote
+    :param progress: Called after each chunk with the number of logs
+                     written so far and the id of the last one
+    :return: The number of logs written, and the id of the last one
+    """
+    logs = ChangeLog.objects.using(using).order_by('id')
+    if models is not None:
+        logs = logs.filter(content_type__in=[
+            ContentType.objects.db_manager(using).get_for_model(model)
+            for model in models
+        ])
+    if object_id is not None:
+        logs = logs.filter(object_id=object_id)
+    if since is not None:
+        logs = logs.filter(created_at__gte=since)
+    if until is not None:
+        logs = logs.filter(created_at__lte=until)
+    if log_types is not None:
+        logs = logs.filter(log_type__in=log_types)
+    if after is not None:
+        logs = logs.filter(id__gt=after)
+
+    query, params = logs.annotate(
+        fields_text=JSONText('fields'),
+    ).values_list(
+        'id',
+        'created_at',
+        'content_type_id',
+        'object_id',
+        'log_type',
+        'fields_text',
+    ).query.sql_with_params()
+
+    labels = get_model_labels(using)
+    if format == CSV:
+        write = _get_csv_writer(stream)
+        write(COLUMNS)
+    else:
+        def write(row):
+            # ``fields`` is already JSON, and is spliced in as it is
+            stream.write('{}, "fields": {}}}\n'.format(
+                six.text_type(json.dumps(
+                    OrderedDict(zip(COLUMNS, row[:-1])),
+                ))[:-1],
+                row[-1],
+            ))
+
+    count = 0
+    last_id = after
+    with server_side_cursor(using) as cursor:
+        cursor.execute(query, params)
+        for pk, created_at, content_type_id, object_id, log_type, fields in (
+            fetch_chunks(cursor, chunk_size)
+        ):
+            if content_type_id not in labels:
+                # a content type created since the export started
+                labels = get_model_labels(using)
+            write((
+                pk,
+                created_at.isoformat(),
+                labels[content_type_id],
+                object_id,
+                log_type,
+                fields,
+            ))
+            count += 1
+            last_id = pk
+            if progress is not None and count % chunk_size == 0:
+                progress(count, last_id)
+
+    return count, last_id
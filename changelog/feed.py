@@ -0,0 +1,214 @@
+"""A feed of new ``ChangeLog``s, pushed by the database
+
+With ``CHANGELOG_NOTIFY = True``, a trigger sends a notification on the
+``changelog`` channel for every log, however it was written, when its
+transaction commits. ``ChangeFeed`` listens for them, and fetches the
+notified logs in batches with one query each.
+"""
+import json
+import logging
+import select
+import time
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from changelog.models import ChangeLog
+
+
+logger = logging.getLogger(__name__)
+
+
+CHANNEL = 'changelog'
+
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_DELAY = 0.05
+
+
+class ChangeFeed(object):
+    """Follow ``ChangeLog``s as they're committed
+
+    Iterating over a feed yields lists of new logs, in order of id, forever::
+
+        with ChangeFeed(after=last_seen_id) as feed:
+            for logs in feed:
+                handle(logs)
+                save_position(feed.position)
+
+    ``position`` is the highest id yielded so far. A feed created with
+    ``after`` first catches up with the logs after that id, read through the
+    primary key index, then follows notifications; restart from a saved
+    ``position`` to continue where a consumer left off. Logs written while
+    catching up may be yielded twice.
+
+    Logs are delivered as their transactions commit, which may not be in
+    order of id. A log committed after a later id was yielded is still
+    yielded by a running feed, but can be skipped by one resumed from a
+    ``position`` past it; pass a lower ``after`` to be safe.
+
+    To consume from an event loop rather than a thread, register
+    ``fileno()`` with the loop (e.g. ``loop.add_reader()``), and call
+    ``poll()`` when it's readable; it returns the logs notified so far
+    without waiting.
+
+    :param after: If given, first yield the logs with greater ids
+    :param models: If given, only yield logs of instances of these models
+    :param batch_size: Maximum number of logs per batch
+    :param delay: Seconds to wait for more notifications once one arrives,
+                  so they can be fetched together
+    """
+
+    def __init__(
+        self,
+        using=DEFAULT_DB_ALIAS,
+        after=None,
+        models=None,
+        batch_size=DEFAULT_BATCH_SIZE,
+        delay=DEFAULT_DELAY,
+    ):
+        self.using = using
+        self.position = after
+        self.batch_size = batch_size
+        self.delay = delay
+
+        self.content_type_ids = None
+        if models is not None:
+            self.content_type_ids = set(
+                ContentType.objects.db_manager(using).get_for_model(model).pk
+                for model in models
+            )
+
+        self._connection = None
+        self._pending = []
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __iter__(self):
+        if self._connection is None:
+            self.open()
+
+        for logs in self.catch_up():
+            yield logs
+
+        while True:
+            logs = self.wait()
+            if logs:
+                yield logs
+
+    def open(self):
+        """Start listening for notifications
+
+        Listening uses its own connection, so notifications are received
+        whatever transactions the feed's thread runs.
+        """
+        connection = connections[self.using]
+        self._connection = connection.get_new_connection(
+            connection.get_connection_params(),
+        )
+        self._connection.autocommit = True
+        with self._connection.cursor() as cursor:
+            cursor.execute('LISTEN {}'.format(CHANNEL))
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def fileno(self):
+        """Return the socket of the listening connection"""
+        return self._connection.fileno()
+
+    def catch_up(self):
+        """Yield batches of the logs after ``position``, if it's set
+
+        Notifications received meanwhile are kept for ``wait()`` and
+        ``poll()``.
+        """
+        if self.position is None:
+            return
+
+        logs = ChangeLog.objects.using(self.using).order_by('id')
+        if self.content_type_ids is not None:
+            logs = logs.filter(content_type_id__in=self.content_type_ids)
+
+        while True:
+            batch = list(logs.filter(id__gt=self.position)[:self.batch_size])
+            if not batch:
+                return
+            self.position = batch[-1].id
+            yield batch
+
+    def poll(self):
+        """Return the logs notified so far, without waiting"""
+        self._receive()
+        return self._fetch()
+
+    def wait(self, timeout=None):
+        """Return the next batch of notified logs
+
+        Waits up to ``timeout`` seconds (forever if None) for a notification,
+        then ``delay`` more seconds for others to batch with it.
+
+        :return: A list of logs, empty if none were notified in time
+        """
+        self._receive()
+        if not self._pending:
+            self._select(timeout)
+            self._receive()
+            if not self._pending:
+                return []
+
+        deadline = time.time() + self.delay
+        while len(self._pending) < self.batch_size:
+            remaining = deadline - time.time()
+            if remaining <= 0 or not self._select(remaining):
+                break
+            self._receive()
+
+        return self._fetch()
+
+    def _select(self, timeout):
+        """Wait for the listening connection to be readable"""
+        readable, _, _ = select.select([self._connection], [], [], timeout)
+        return bool(readable)
+
+    def _receive(self):
+        """Move received notifications to ``_pending``"""
+        self._connection.poll()
+        notifies = self._connection.notifies
+        while notifies:
+            notify = notifies.pop(0)
+            try:
+                payload = json.loads(notify.payload)
+            except ValueError:
+                logger.warning('Invalid notification: {}'.format(
+                    notify.payload,
+                ))
+                continue
+
+            if (
+                self.content_type_ids is None or
+                payload['content_type_id'] in self.content_type_ids
+            ):
+                self._pending.append(payload['id'])
+
+    def _fetch(self):
+        """Fetch a batch of the pending logs"""
+        ids = self._pending[:self.batch_size]
+        del self._pending[:self.batch_size]
+        if not ids:
+            return []
+
+        logs = list(
+            ChangeLog.objects.using(self.using).filter(
+                id__in=ids,
+            ).order_by('id')
+        )
+        if logs:
+            self.position = max(self.position or 0, logs[-1].id)
+        return logs
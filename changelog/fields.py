@@ -0,0 +1,53 @@
+"""JSON encoding of logged values
+
+Logs written by SQL (bulk updates, deletes and inserts, and trigger
+capture) have their values converted to JSON by PostgreSQL. Values logged
+from Python are encoded the same way, so a value is logged alike whichever
+way its log is written, and compares equal to what's read back from logs.
+"""
+import datetime
+import decimal
+from functools import partial
+import json
+
+from django.contrib.postgres.fields import JSONField
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from psycopg2.extras import Json
+
+
+class LogJSONEncoder(DjangoJSONEncoder):
+    """Encode values as PostgreSQL's ``to_json()`` does
+
+    Times keep their microseconds, aware datetimes are in UTC (the time zone
+    of Django's connections when ``USE_TZ`` is set), and decimals are
+    numbers.
+    """
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            if timezone.is_aware(o):
+                o = o.astimezone(timezone.utc)
+            return o.isoformat()
+        elif isinstance(o, datetime.time):
+            return o.isoformat()
+        elif isinstance(o, decimal.Decimal):
+            return float(o)
+        return super(LogJSONEncoder, self).default(o)
+
+
+dumps = partial(json.dumps, cls=LogJSONEncoder)
+
+
+def normalize(value):
+    """Return ``value`` as it would be read back from a log"""
+    return json.loads(dumps(value))
+
+
+class LogJSONField(JSONField):
+    """A ``JSONField`` encoding its values with ``LogJSONEncoder``"""
+
+    def get_prep_value(self, value):
+        if value is not None:
+            return Json(value, dumps=dumps)
+        return value
@@ -0,0 +1,59 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+
+from changelog.archive import (
+    ARCHIVE_DIR_SETTING,
+    archive_logs,
+    get_archive_dir,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Write the logs of each month older than a number of days to a '
+        'compressed archive file'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'days',
+            type=int,
+            help='Archive the months that ended more than this many days ago',
+        )
+        parser.add_argument(
+            '--directory',
+            help='Directory to write archives to; defaults to {}'.format(
+                ARCHIVE_DIR_SETTING,
+            ),
+        )
+        parser.add_argument(
+            '--delete',
+            action='store_true',
+            default=False,
+            help='Delete the archived logs from the database',
+        )
+        parser.add_argument(
+            '--database',
+            default=DEFAULT_DB_ALIAS,
+            help='Database to archive logs from',
+        )
+
+    def handle(self, *args, **options):
+        directory = options['directory'] or get_archive_dir()
+        if not directory:
+            raise CommandError(
+                'Pass --directory or set {}'.format(ARCHIVE_DIR_SETTING),
+            )
+
+        paths = archive_logs(
+            timezone.now() - timedelta(days=options['days']),
+            directory=directory,
+            using=options['database'],
+            delete=options['delete'],
+        )
+        for path in paths:
+            self.stdout.write('Wrote {}'.format(path))
+        self.stdout.write('Archived {} months'.format(len(paths)))
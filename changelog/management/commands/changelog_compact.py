@@ -0,0 +1,79 @@
+from datetime import timedelta
+import time
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+
+from changelog.compaction import compact_logs
+from changelog.utils import get_tracked_models
+
+
+class Command(BaseCommand):
+    help = (
+        'Merge the logs of each instance older than a number of days into '
+        'one log per instance'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'models',
+            nargs='*',
+            metavar='app_label.ModelName',
+            help='Models to compact; defaults to all models',
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=90,
+            help='Compact logs older than this many days',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of instances compacted per transaction',
+        )
+        parser.add_argument(
+            '--database',
+            default=DEFAULT_DB_ALIAS,
+            help='Database to compact logs in',
+        )
+
+    def handle(self, *args, **options):
+        models = None
+        if options['models']:
+            try:
+                models = [apps.get_model(label) for label in options['models']]
+            except (LookupError, ValueError) as e:
+                raise CommandError(str(e))
+
+            tracked = get_tracked_models()
+            for model in models:
+                if model not in tracked:
+                    raise CommandError(
+                        'Model {} is not a tracked model'.format(
+                            model._meta.label,
+                        )
+                    )
+
+        start = time.time()
+
+        def progress(merged, removed):
+            self.stdout.write('{} logs merged, {} logs removed'.format(
+                merged,
+                removed,
+            ))
+
+        removed = compact_logs(
+            timezone.now() - timedelta(days=options['days']),
+            models=models,
+            batch_size=options['batch_size'],
+            using=options['database'],
+            progress=progress,
+        )
+        self.stdout.write('Removed {} logs in {:.1f}s'.format(
+            removed,
+            time.time() - start,
+        ))
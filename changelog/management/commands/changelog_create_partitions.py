@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from changelog.partitions import create_partitions, is_partitioned
+
+
+class Command(BaseCommand):
+    help = (
+        'Create the monthly partitions of the changelog table for the '
+        'coming months'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months',
+            type=int,
+            default=3,
+            help='Number of months after the current one to create',
+        )
+        parser.add_argument(
+            '--database',
+            default=DEFAULT_DB_ALIAS,
+            help='Database to create the partitions in',
+        )
+
+    def handle(self, *args, **options):
+        using = options['database']
+        if not is_partitioned(using=using):
+            raise CommandError('The changelog table is not partitioned')
+
+        created = create_partitions(using=using, months=options['months'])
+        for name in created:
+            self.stdout.write('Created {}'.format(name))
+        self.stdout.write('Created {} partitions'.format(len(created)))
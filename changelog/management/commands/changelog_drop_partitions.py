@@ -0,0 +1,47 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+
+from changelog.partitions import drop_partitions, is_partitioned
+
+
+class Command(BaseCommand):
+    help = (
+        'Drop the partitions of the changelog table that only hold logs '
+        'older than the retention period'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'days',
+            type=int,
+            help='Number of days of logs to keep',
+        )
+        parser.add_argument(
+            '--detach-only',
+            action='store_true',
+            default=False,
+            help='Detach expired partitions, but keep their tables',
+        )
+        parser.add_argument(
+            '--database',
+            default=DEFAULT_DB_ALIAS,
+            help='Database to drop the partitions from',
+        )
+
+    def handle(self, *args, **options):
+        using = options['database']
+        if not is_partitioned(using=using):
+            raise CommandError('The changelog table is not partitioned')
+
+        dropped = drop_partitions(
+            timezone.now() - timedelta(days=options['days']),
+            using=using,
+            detach_only=options['detach_only'],
+        )
+        action = 'Detached' if options['detach_only'] else 'Dropped'
+        for name in dropped:
+            self.stdout.write('{} {}'.format(action, name))
+        self.stdout.write('{} {} partitions'.format(action, len(dropped)))
@@ -0,0 +1,166 @@
+from datetime import datetime, time
+import gzip
+import io
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from changelog.export import DEFAULT_CHUNK_SIZE, FORMATS, NDJSON, export_logs
+from changelog.models import ChangeLog
+
+
+LOG_TYPES = {
+    'save': ChangeLog.ON_SAVE,
+    'update': ChangeLog.ON_UPDATE,
+    'sync': ChangeLog.ON_SYNC,
+    'delete': ChangeLog.ON_DELETE,
+}
+
+
+def parse_time(value):
+    """Parse an ISO 8601 date or datetime, in the current time zone if naive"""
+    try:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            parsed = parse_date(value)
+            if parsed is not None:
+                parsed = datetime.combine(parsed, time())
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise CommandError('Invalid date or datetime: {}'.format(value))
+
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+class Command(BaseCommand):
+    help = 'Write logs as newline-delimited JSON or CSV, in order of id'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'models',
+            nargs='*',
+            metavar='app_label.ModelName',
+            help='Models to export logs of; defaults to all models',
+        )
+        parser.add_argument(
+            '--object-id',
+            type=int,
+            help='Only export logs of objects with this pk',
+        )
+        parser.add_argument(
+            '--since',
+            help='Only export logs created at or after this date or datetime',
+        )
+        parser.add_argument(
+            '--until',
+            help='Only export logs created at or before this date or datetime',
+        )
+        parser.add_argument(
+            '--log-type',
+            action='append',
+            dest='log_types',
+            choices=sorted(LOG_TYPES),
+            help='Only export logs of this type; may be repeated',
+        )
+        parser.add_argument(
+            '--after',
+            type=int,
+            help='Only export logs with greater ids, to resume an export',
+        )
+        parser.add_argument(
+            '--format',
+            choices=FORMATS,
+            default=NDJSON,
+            help='Output format',
+        )
+        parser.add_argument(
+            '--output',
+            help='File to write to; defaults to standard output',
+        )
+        parser.add_argument(
+            '--gzip',
+            action='store_true',
+            help='Compress the output file with gzip',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help='Number of logs fetched from the database at a time',
+        )
+        parser.add_argument(
+            '--database',
+            default=DEFAULT_DB_ALIAS,
+            help='Database to export logs from',
+        )
+
+    def handle(self, *args, **options):
+        models = None
+        if options['models']:
+            try:
+                models = [apps.get_model(label) for label in options['models']]
+            except (LookupError, ValueError) as e:
+                raise CommandError(str(e))
+
+        log_types = None
+        if options['log_types']:
+            log_types = [LOG_TYPES[name] for name in options['log_types']]
+
+        since = until = None
+        if options['since']:
+            since = parse_time(options['since'])
+        if options['until']:
+            until = parse_time(options['until'])
+
+        output = options['output']
+        if options['gzip'] and not output:
+            raise CommandError('--gzip requires --output')
+
+        def progress(count, last_id):
+            self.stderr.write('{} logs exported, last id {}'.format(
+                count,
+                last_id,
+            ))
+
+        stream = self.open(output, options['gzip'])
+        try:
+            count, last_id = export_logs(
+                stream,
+                format=options['format'],
+                models=models,
+                object_id=options['object_id'],
+                since=since,
+                until=until,
+                log_types=log_types,
+                after=options['after'],
+                chunk_size=options['chunk_size'],
+                using=options['database'],
+                progress=progress,
+            )
+        finally:
+            if output:
+                stream.close()
+
+        self.stderr.write('Exported {} logs, last id {}'.format(
+            count,
+            last_id,
+        ))
+
+    def open(self, output, compress):
+        if not output:
+            # rows are written with their own line endings
+            self.stdout.ending = ''
+            return self.stdout
+        if compress:
+            return io.TextIOWrapper(
+                gzip.open(output, 'wb'),
+                encoding='utf-8',
+                newline='',
+            )
+        return io.open(output, 'w', encoding='utf-8', newline='')
@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from changelog.partitions import (
+    is_partitioned,
+    partition_table,
+    unpartition_table,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Partition the changelog table by month, or convert it back into a '
+        'single table'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months',
+            type=int,
+            default=3,
+            help='Number of months after the current one to create',
+        )
+        parser.add_argument(
+            '--unpartition',
+            action='store_true',
+            default=False,
+            help='Copy all logs back into a single table',
+        )
+        parser.add_argument(
+            '--database',
+            default=DEFAULT_DB_ALIAS,
+            help='Database to partition the changelog table of',
+        )
+
+    def handle(self, *args, **options):
+        using = options['database']
+        partitioned = is_partitioned(using=using)
+
+        if options['unpartition']:
+            if not partitioned:
+                raise CommandError('The changelog table is not partitioned')
+            unpartition_table(using=using)
+            self.stdout.write('Unpartitioned the changelog table')
+            return
+
+        if partitioned:
+            raise CommandError('The changelog table is already partitioned')
+        try:
+            partition_table(using=using, months=options['months'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write('Partitioned the changelog table')
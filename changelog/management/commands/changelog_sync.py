@@ -0,0 +1,215 @@
+from __future__ import division
+
+import logging
+import multiprocessing
+import time
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Max, Min
+from django.utils import six
+
+from changelog.utils import create_sync_logs, get_tracked_models
+
+
+logger = logging.getLogger(__name__)
+
+
+def get_ranges(model, number):
+    """Split the pks of ``model`` into ``number`` ranges
+
+    :return: A list of ``(after, last)`` tuples; ranges include pks greater
+             than ``after`` and no greater than ``last``
+    """
+    bounds = model._default_manager.aggregate(first=Min('pk'), last=Max('pk'))
+    if bounds['first'] is None:
+        return []
+
+    if not isinstance(bounds['first'], six.integer_types):
+        # pks can only be split if they're integers
+        return [(None, None)]
+    first, last = bounds['first'] - 1, bounds['last']
+
+    size = max(-(-(last - first) // number), 1)
+    return [
+        (after, min(after + size, last))
+        for after in range(first, last, size)
+    ]
+
+
+def sync_range(args):
+    """Sync the instances of a model in a range of pks
+
+    Failed attempts are retried from the last chunk that was synced.
+
+    :param args: A tuple of the model's label, the range, the chunk size and
+                 the number of retries
+    :return: A tuple of the range, the number of instances synced and logs
+             created, and the error that ended the last attempt, if any
+    """
+    label, (after, last), chunk_size, retries = args
+    model = apps.get_model(label)
+
+    queryset = model._default_manager.all()
+    if last is not None:
+        queryset = queryset.filter(pk__lte=last)
+
+    state = {'synced': 0, 'logged': 0, 'after': after}
+
+    def progress(synced, logged, pk):
+        state['synced'] = synced
+        state['logged'] = logged
+        state['after'] = pk
+
+    synced = logged = 0
+    for _ in range(retries + 1):
+        try:
+            create_sync_logs(
+                queryset=queryset,
+                chunk_size=chunk_size,
+                after=state['after'],
+                progress=progress,
+            )
+        except Exception as e:
+            logger.exception('Failed to sync {} ({}, {}]'.format(
+                label,
+                after,
+                last,
+            ))
+            error = repr(e)
+            # the connection may be unusable
+            connections.close_all()
+        else:
+            error = None
+        finally:
+            synced += state['synced']
+            logged += state['logged']
+            state['synced'] = state['logged'] = 0
+
+        if error is None:
+            break
+
+    return (after, last), synced, logged, error
+
+
+class Command(BaseCommand):
+    help = (
+        'Create sync logs for instances of tracked models whose tracked '
+        'values differ from their logs, in parallel over ranges of pks'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'models',
+            nargs='*',
+            metavar='app_label.ModelName',
+            help='Models to sync; defaults to all tracked models',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=multiprocessing.cpu_count(),
+            help='Number of worker processes',
+        )
+        parser.add_argument(
+            '--ranges',
+            type=int,
+            help='Number of pk ranges per model; defaults to 4 per worker',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Number of instances synced per query',
+        )
+        parser.add_argument(
+            '--retries',
+            type=int,
+            default=3,
+            help='Number of times a failed range is retried',
+        )
+
+    def handle(self, *args, **options):
+        tracked = get_tracked_models()
+        if options['models']:
+            try:
+                models = [apps.get_model(label) for label in options['models']]
+            except (LookupError, ValueError) as e:
+                raise CommandError(str(e))
+        else:
+            models = sorted(tracked, key=lambda model: model._meta.label)
+
+        for model in models:
+            if model not in tracked:
+                raise CommandError(
+                    'Model {} is not a tracked model'.format(model._meta.label)
+                )
+
+        workers = max(options['workers'], 1)
+        ranges = options['ranges'] or workers * 4
+
+        failed = []
+        for model in models:
+            failed += self.sync_model(model, workers, ranges, options)
+
+        if failed:
+            raise CommandError('Failed to sync {} ranges: {}'.format(
+                len(failed),
+                ', '.join('{} ({}, {}]: {}'.format(*x) for x in failed),
+            ))
+
+    def sync_model(self, model, workers, ranges, options):
+        """Sync ``model`` and report progress
+
+        :return: A list of the ranges that failed
+        """
+        label = model._meta.label
+        tasks = [
+            (label, bounds, options['chunk_size'], options['retries'])
+            for bounds in get_ranges(model, ranges)
+        ]
+
+        if workers > 1 and len(tasks) > 1:
+            # each worker opens its own connection
+            connections.close_all()
+            pool = multiprocessing.Pool(min(workers, len(tasks)))
+            results = pool.imap_unordered(sync_range, tasks)
+        else:
+            pool = None
+            results = (sync_range(task) for task in tasks)
+
+        start = time.time()
+        synced = logged = done = 0
+        failed = []
+        try:
+            for (after, last), range_synced, range_logged, error in results:
+                done += 1
+                synced += range_synced
+                logged += range_logged
+                if error is not None:
+                    failed.append((label, after, last, error))
+
+                elapsed = time.time() - start
+                self.stdout.write(
+                    '{}: {}/{} ranges, {} synced, {} logs, {:.0f}/s'.format(
+                        label,
+                        done,
+                        len(tasks),
+                        synced,
+                        logged,
+                        synced / elapsed if elapsed else 0,
+                    )
+                )
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+        self.stdout.write('{}: synced {} in {:.1f}s, created {} logs'.format(
+            label,
+            synced,
+            time.time() - start,
+            logged,
+        ))
+        return failed
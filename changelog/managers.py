@@ -0,0 +1,519 @@
+import logging
+import uuid
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import connections, transaction
+from django.db.models import QuerySet, sql
+
+from changelog.models import ChangeLog
+from changelog.triggers import log_type, uses_triggers
+from changelog.utils import get_tracked_models
+from changelog.writers import is_async, write_log
+
+
+logger = logging.getLogger(__name__)
+
+
+def _get_update_fields(model, kwargs):
+    """Return the tracked attnames set by keyword arguments to ``update()``
+
+    Values aren't inspected; they may be expressions, which are evaluated by
+    the database.
+    """
+    meta = model._meta
+    return sorted(
+        attname for attname in get_tracked_models()[model]
+        if attname in kwargs or meta.get_field(attname).name in kwargs
+    )
+
+
+def _get_log_insert(model, source, fields, entries, where, log_type):
+    """Return SQL inserting a ``ChangeLog`` for each row of ``source``
+
+    NOTE: This is fragile! If the ``ChangeLog`` model fields change, this
+          will break.
+
+    Logs are created at ``clock_timestamp()``, once the rows of ``source``
+    are locked, so they're in the order of the changes to each row.
+
+    :param source: The name of a CTE with a ``pk`` column
+    :param fields: The attnames of the tracked fields to log
+    :param entries: SQL for the ``fields`` dict entry of each of ``fields``;
+                    entries that are ``NULL`` are left out
+    :param where: SQL condition for rows to log
+    :return: A tuple of SQL and params
+    """
+    query = """
+INSERT INTO changelog_changelog (
+    created_at,
+    object_id,
+    fields,
+    content_type_id,
+    log_type
+)
+SELECT
+    clock_timestamp(),
+    {source}.pk,
+    (
+        SELECT
+            json_object_agg(entry.key, entry.value)
+        FROM
+            (VALUES {entries}) AS entry (key, value)
+        WHERE
+            entry.value IS NOT NULL
+    )::jsonb,
+    %s,
+    %s
+FROM
+    {source}
+WHERE
+    {where}
+    """.format(
+        source=source,
+        entries=', '.join('(%s, {})'.format(entry) for entry in entries),
+        where=where,
+    )
+
+    params = list(fields)
+    params += [ContentType.objects.get_for_model(model).pk, log_type]
+    return query, params
+
+
+def log_deletes(queryset):
+    """Log the tracked values of the rows matching ``queryset`` as deleted
+
+    Unless logs are written asynchronously, this is a single
+    ``INSERT ... SELECT``, so it costs the same whatever the number of rows.
+    It must run before the rows are deleted, in the same transaction.
+    """
+    model = queryset.model
+    fields = list(get_tracked_models()[model])
+
+    select = queryset.values_list('pk', *fields)
+    select.query.clear_ordering(force_empty=True)
+
+    if is_async():
+        content_type = ContentType.objects.get_for_model(model)
+        for row in select:
+            write_log(ChangeLog(
+                content_type=content_type,
+                object_id=row[0],
+                fields={
+                    field: {'was': value}
+                    for field, value in zip(fields, row[1:])
+                },
+                log_type=ChangeLog.ON_DELETE,
+            ))
+        return
+
+    subquery, params = select.query.sql_with_params()
+    insert, insert_params = _get_log_insert(
+        model,
+        'deleted',
+        fields,
+        [
+            "json_build_object('was', was_{})".format(i)
+            for i in range(len(fields))
+        ],
+        'TRUE',
+        ChangeLog.ON_DELETE,
+    )
+    query = """
+WITH deleted (pk, {columns}) AS ({subquery})
+{insert}
+    """.format(
+        columns=', '.join('was_{}'.format(i) for i in range(len(fields))),
+        subquery=subquery,
+        insert=insert,
+    )
+
+    with connections[queryset.db].cursor() as c:
+        c.execute(query, list(params) + insert_params)
+
+
+class ChangeLogQuerySet(QuerySet):
+    """A QuerySet that logs update(), bulk_create() and delete()
+
+    Querysets of tracked models are instances of this class (see
+    ``patch_managers``), so it is carried through ``filter()`` and friends
+    like any other queryset class; nothing is done until ``update()`` is
+    called. With ``CHANGELOG_CAPTURE = 'trigger'``, logging is left to the
+    database.
+    """
+
+    def update(self, **kwargs):
+        """Update rows and log the changes in a single query
+
+        The previous and new values of every updated row are read by the
+        database as part of the update. No model instances are loaded into
+        memory in Python.
+        """
+        fields = _get_update_fields(self.model, kwargs)
+        if not fields:
+            return super(ChangeLogQuerySet, self).update(**kwargs)
+        if uses_triggers(self.model):
+            # logged by the database, as in the other capture modes
+            with log_type(ChangeLog.ON_UPDATE, using=self.db):
+                return super(ChangeLogQuerySet, self).update(**kwargs)
+
+        assert self.query.can_filter(), \
+            "Cannot update a query once a slice has been taken."
+        self._for_write = True
+
+        query = sql.UpdateQuery(self.model)
+        query.add_update_values(kwargs)
+        if query.related_updates:
+            # fields of parent models are updated by separate queries
+            return self._update_with_fallback(fields, kwargs)
+
+        cte, params = self._get_update_cte(query, fields)
+        if is_async():
+            num_rows_updated = self._write_update_logs(cte, params, fields)
+        else:
+            num_rows_updated = self._insert_update_logs(cte, params, fields)
+
+        self._result_cache = None
+        return num_rows_updated
+
+    update.alters_data = True
+
+    def _get_update_cte(self, query, fields):
+        """Return a CTE that updates rows and returns their changed values
+
+        ``old`` locks the matching rows and selects their tracked values,
+        then ``updated`` updates them and returns, for each of ``fields`` (by
+        index), the previous value as ``was_<i>`` and the new one as
+        ``now_<i>``.
+        """
+        connection = connections[self.db]
+        qn = connection.ops.quote_name
+        meta = self.model._meta
+        table = qn(meta.db_table)
+        pk = '{}.{}'.format(table, qn(meta.pk.column))
+        columns = [
+            '{}.{}'.format(table, qn(meta.get_field(field).column))
+            for field in fields
+        ]
+
+        subquery = self.values_list('pk', flat=True).query
+        subquery.clear_ordering(force_empty=True)
+        subquery, subquery_params = subquery.sql_with_params()
+
+        update, update_params = query.get_compiler(self.db).as_sql()
+
+        cte = """
+WITH old AS (
+    SELECT
+        {pk} AS pk,
+        {was}
+    FROM
+        {table}
+    WHERE
+        {pk} IN ({subquery})
+    FOR UPDATE
+), updated AS (
+    {update}
+    FROM
+        old
+    WHERE
+        {pk} = old.pk
+    RETURNING
+        {pk} AS pk,
+        {returning}
+)
+        """.format(
+            pk=pk,
+            table=table,
+            subquery=subquery,
+            update=update,
+            was=',\n        '.join(
+                '{} AS was_{}'.format(column, i)
+                for i, column in enumerate(columns)
+            ),
+            returning=',\n        '.join(
+                'old.was_{i}, {} AS now_{i}'.format(column, i=i)
+                for i, column in enumerate(columns)
+            ),
+        )
+        return cte, list(subquery_params) + list(update_params)
+
+    def _insert_update_logs(self, cte, params, fields):
+        """Run the update, inserting a log for each changed row"""
+        changed = [
+            'was_{i} IS DISTINCT FROM now_{i}'.format(i=i)
+            for i in range(len(fields))
+        ]
+        insert, insert_params = _get_log_insert(
+            self.model,
+            'updated',
+            fields,
+            [
+                "CASE WHEN {} THEN json_build_object("
+                "'was', was_{i}, 'now', now_{i}) END".format(condition, i=i)
+                for i, condition in enumerate(changed)
+            ],
+            ' OR '.join(changed),
+            ChangeLog.ON_UPDATE,
+        )
+        query = cte + """
+, inserted AS ({insert})
+SELECT count(*) FROM updated
+        """.format(insert=insert)
+
+        with connections[self.db].cursor() as c:
+            c.execute(query, params + insert_params)
+            return c.fetchone()[0]
+
+    def _write_update_logs(self, cte, params, fields):
+        """Run the update, passing a log for each changed row to the writer"""
+        query = cte + """
+SELECT * FROM updated
+        """
+        with connections[self.db].cursor() as c:
+            c.execute(query, params)
+            rows = c.fetchall()
+
+        content_type = ContentType.objects.get_for_model(self.model)
+        for row in rows:
+            changes = {}
+            for i, field in enumerate(fields):
+                was, now = row[1 + 2 * i:3 + 2 * i]
+                if was != now:
+                    changes[field] = {'was': was, 'now': now}
+
+            if changes:
+                write_log(ChangeLog(
+                    content_type=content_type,
+                    object_id=row[0],
+                    fields=changes,
+                    log_type=ChangeLog.ON_UPDATE,
+                ))
+
+        return len(rows)
+
+    def delete(self):
+        """Log the tracked values of the matching rows, then delete them
+
+        Related rows deleted by cascades are not logged.
+        """
+        if uses_triggers(self.model):
+            return super(ChangeLogQuerySet, self).delete()
+
+        self._for_write = True
+        with transaction.atomic(using=self.db, savepoint=False):
+            log_deletes(self)
+            return super(ChangeLogQuerySet, self).delete()
+
+    delete.alters_data = True
+
+    def _update_with_fallback(self, fields, kwargs):
+        """Update rows whose fields span several tables, logging the changes
+
+        Django updates fields of parent models (multi-table inheritance) with
+        separate queries, so the previous values can't be read by the update
+        itself. Instead, the matching rows are locked and their pks and
+        previous values copied to a temporary table by one ``INSERT ...
+        SELECT``, then the rows are updated, and the logs are written by one
+        query comparing the copied values with the new ones. No rows are
+        loaded into Python, unless logs are written asynchronously.
+        """
+        connection = connections[self.db]
+        qn = connection.ops.quote_name
+        table = qn('changelog_update_{}'.format(uuid.uuid4().hex))
+        was = ['was_{}'.format(i) for i in range(len(fields))]
+        now = ['now_{}'.format(i) for i in range(len(fields))]
+
+        new = self.model._base_manager.using(self.db).values_list(
+            'pk',
+            *fields
+        )
+        new.query.clear_ordering(force_empty=True)
+        new, new_params = new.query.sql_with_params()
+
+        cte = """
+WITH updated AS (
+    SELECT
+        old.pk,
+        {columns}
+    FROM
+        {table} AS old
+        JOIN ({new}) AS new (pk, {now}) ON (new.pk = old.pk)
+)
+        """.format(
+            table=table,
+            new=new,
+            now=', '.join(now),
+            columns=',\n        '.join(
+                'old.{}, new.{}'.format(was_i, now_i)
+                for was_i, now_i in zip(was, now)
+            ),
+        )
+
+        with transaction.atomic(using=self.db, savepoint=False):
+            # ``FOR UPDATE`` is only compiled inside a transaction
+            old = self.select_for_update().values_list('pk', *fields)
+            old.query.clear_ordering(force_empty=True)
+            old, old_params = old.query.get_compiler(self.db).as_sql()
+
+            with connection.cursor() as c:
+                c.execute(
+                    'CREATE TEMPORARY TABLE {} (pk, {}) ON COMMIT DROP '
+                    'AS {} WITH NO DATA'.format(table, ', '.join(was), old),
+                    old_params,
+                )
+                c.execute(
+                    'INSERT INTO {} {}'.format(table, old),
+                    old_params,
+                )
+
+            num_rows_updated = super(ChangeLogQuerySet, self).update(**kwargs)
+
+            if is_async():
+                self._write_update_logs(cte, list(new_params), fields)
+            else:
+                self._insert_update_logs(cte, list(new_params), fields)
+
+            with connection.cursor() as c:
+                c.execute('DROP TABLE {}'.format(table))
+
+        return num_rows_updated
+
+    def _batched_insert(self, objs, fields, batch_size):
+        """Insert ``objs`` for ``bulk_create()``, logging their values
+
+        Each batch is inserted by one query, which also logs the tracked
+        values of the inserted rows. Primary keys of the inserted rows are
+        set on ``objs``, and returned, in order, as Django expects from
+        ``_batched_insert()`` on backends that return ids from bulk inserts.
+        """
+        if uses_triggers(self.model):
+            return super(ChangeLogQuerySet, self)._batched_insert(
+                objs,
+                fields,
+                batch_size,
+            )
+        if not objs:
+            return []
+        ops = connections[self.db].ops
+        batch_size = (batch_size or max(ops.bulk_batch_size(fields, objs), 1))
+        pks = []
+        for i in range(0, len(objs), batch_size):
+            pks += self._insert_batch(objs[i:i + batch_size], fields)
+        return pks
+
+    def _insert_batch(self, objs, fields):
+        """Insert and log a batch of ``objs``, and return their pks"""
+        connection = connections[self.db]
+        qn = connection.ops.quote_name
+        meta = self.model._meta
+        tracked = list(get_tracked_models()[self.model])
+        table = qn(meta.db_table)
+
+        query = sql.InsertQuery(self.model)
+        query.insert_values(fields, objs)
+        [(insert, params)] = query.get_compiler(self.db).as_sql()
+
+        query = """
+WITH inserted AS (
+    {insert}
+    RETURNING
+        {table}.{pk} AS pk,
+        {returning}
+)
+        """.format(
+            insert=insert,
+            table=table,
+            pk=qn(meta.pk.column),
+            returning=',\n        '.join(
+                '{}.{} AS now_{}'.format(
+                    table,
+                    qn(meta.get_field(field).column),
+                    i,
+                )
+                for i, field in enumerate(tracked)
+            ),
+        )
+        params = list(params)
+
+        queued = is_async()
+        if queued:
+            query += """
+SELECT * FROM inserted
+            """
+        else:
+            log_insert, log_params = _get_log_insert(
+                self.model,
+                'inserted',
+                tracked,
+                [
+                    "json_build_object('now', now_{})".format(i)
+                    for i in range(len(tracked))
+                ],
+                'TRUE',
+                ChangeLog.ON_SAVE,
+            )
+            query += """
+, logged AS ({insert})
+SELECT pk FROM inserted
+            """.format(insert=log_insert)
+            params += log_params
+
+        with connection.cursor() as c:
+            c.execute(query, params)
+            rows = c.fetchall()
+
+        content_type = ContentType.objects.get_for_model(self.model)
+        # rows are returned in the order they were inserted
+        for obj, row in zip(objs, rows):
+            if obj.pk is None:
+                obj.pk = row[0]
+
+            if queued:
+                write_log(ChangeLog(
+                    content_type=content_type,
+                    object_id=row[0],
+                    fields={
+                        field: {'now': value}
+                        for field, value in zip(tracked, row[1:])
+                    },
+                ))
+
+        return [row[0] for row in rows]
+
+
+def get_queryset_class(queryset_class):
+    """Return a subclass of ``queryset_class`` that logs updates"""
+    if issubclass(queryset_class, ChangeLogQuerySet):
+        return queryset_class
+
+    return type(
+        str('ChangeLog{}'.format(queryset_class.__name__)),
+        (ChangeLogQuerySet, queryset_class),
+        {},
+    )
+
+
+def _get_managers(model):
+    """Return the managers of ``model``
+
+    Before Django 1.10, ``_meta.managers`` holds ``(creation_counter,
+    manager, abstract)`` tuples rather than the managers themselves.
+    """
+    return [
+        entry[1] if isinstance(entry, tuple) else entry
+        for entry in model._meta.managers
+    ]
+
+
+def patch_managers(**kwargs):
+    """Make the managers of all tracked models return ``ChangeLogQuerySet``s
+
+    Custom queryset classes are kept; the manager's queryset class is
+    replaced with a subclass of both.
+    """
+
+    for model in get_tracked_models():
+        for manager in _get_managers(model):
+            manager._queryset_class = get_queryset_class(
+                manager._queryset_class
+            )
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.13 on 2026-10-18 20:14
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('changelog', '0002_changelog_log_type'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='changelog',
+            name='log_type',
+            field=models.PositiveSmallIntegerField(choices=[(0, 'On Save'), (1, 'On Update'), (2, 'On Sync'), (3, 'On Delete')], default=0),
+        ),
+    ]
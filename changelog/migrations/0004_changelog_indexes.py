@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('changelog', '0003_changelog_log_type_choices'),
+    ]
+
+    operations = [
+        # history of an instance, in order (ties are ordered by id)
+        migrations.RunSQL(
+            sql=(
+                'CREATE INDEX changelog_changelog_history '
+                'ON changelog_changelog '
+                '(content_type_id, object_id, created_at, id)'
+            ),
+            reverse_sql=(
+                'DROP INDEX changelog_changelog_history'
+            ),
+        ),
+        # logs of a field, e.g. ``fields__has_key``
+        migrations.RunSQL(
+            sql=(
+                'CREATE INDEX changelog_changelog_fields '
+                'ON changelog_changelog USING gin (fields)'
+            ),
+            reverse_sql=(
+                'DROP INDEX changelog_changelog_fields'
+            ),
+        ),
+    ]
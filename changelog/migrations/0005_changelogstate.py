@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.13 on 2026-10-18 20:21
+from __future__ import unicode_literals
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# keeps ``changelog_changelogstate`` up to date with every log written
+CREATE_TRIGGER = """
+CREATE FUNCTION changelog_update_state() RETURNS trigger AS $$
+BEGIN
+    IF NEW.log_type = 3 THEN
+        -- ON_DELETE
+        DELETE FROM changelog_changelogstate
+        WHERE
+            content_type_id = NEW.content_type_id AND
+            object_id = NEW.object_id;
+        RETURN NULL;
+    END IF;
+
+    INSERT INTO changelog_changelogstate AS state (
+        content_type_id,
+        object_id,
+        fields,
+        last_log_id,
+        last_logged_at
+    )
+    SELECT
+        NEW.content_type_id,
+        NEW.object_id,
+        coalesce(json_object_agg(entry.key, entry.value -> 'now'), '{}')::jsonb,
+        NEW.id,
+        NEW.created_at
+    FROM
+        jsonb_each(NEW.fields) AS entry
+    WHERE
+        entry.value ? 'now'
+    ON CONFLICT (content_type_id, object_id) DO UPDATE SET
+        fields = state.fields || EXCLUDED.fields,
+        last_log_id = EXCLUDED.last_log_id,
+        last_logged_at = EXCLUDED.last_logged_at;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER changelog_update_state
+AFTER INSERT ON changelog_changelog
+FOR EACH ROW EXECUTE PROCEDURE changelog_update_state();
+"""
+
+DROP_TRIGGER = """
+DROP TRIGGER changelog_update_state ON changelog_changelog;
+DROP FUNCTION changelog_update_state();
+"""
+
+# fold existing logs into their instances' states
+BACKFILL = """
+INSERT INTO changelog_changelogstate (
+    content_type_id,
+    object_id,
+    fields,
+    last_log_id,
+    last_logged_at
+)
+SELECT
+    latest.content_type_id,
+    latest.object_id,
+    json_object_agg(latest.key, latest.value)::jsonb,
+    max(latest.id),
+    max(latest.created_at)
+FROM
+    (
+        SELECT DISTINCT ON (log.content_type_id, log.object_id, entry.key)
+            log.content_type_id,
+            log.object_id,
+            entry.key,
+            entry.value -> 'now' AS value,
+            log.id,
+            log.created_at
+        FROM
+            changelog_changelog AS log,
+            jsonb_each(log.fields) AS entry
+        WHERE
+            entry.value ? 'now'
+        ORDER BY
+            log.content_type_id,
+            log.object_id,
+            entry.key,
+            log.created_at DESC,
+            log.id DESC
+    ) AS latest
+WHERE
+    NOT EXISTS (
+        SELECT
+            1
+        FROM
+            changelog_changelog AS deleted
+        WHERE
+            deleted.content_type_id = latest.content_type_id AND
+            deleted.object_id = latest.object_id AND
+            deleted.log_type = 3 AND
+            deleted.created_at >= latest.created_at
+    )
+GROUP BY
+    latest.content_type_id,
+    latest.object_id
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('changelog', '0004_changelog_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLogState',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_id', models.PositiveIntegerField()),
+                ('fields', django.contrib.postgres.fields.jsonb.JSONField()),
+                ('last_log_id', models.IntegerField()),
+                ('last_logged_at', models.DateTimeField()),
+                ('content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.ContentType')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='changelogstate',
+            unique_together=set([('content_type', 'object_id')]),
+        ),
+        migrations.RunSQL(
+            sql=CREATE_TRIGGER,
+            reverse_sql=DROP_TRIGGER,
+        ),
+        migrations.RunSQL(
+            sql=BACKFILL,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.13 on 2026-10-18 20:22
+from __future__ import unicode_literals
+
+from importlib import import_module
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# as in ``0005_changelogstate``, but also counts the logs of each instance
+# since its last checkpoint, and writes a checkpoint of its state every
+# TG_ARGV[0] logs or TG_ARGV[1] days (see ``changelog.triggers``)
+CREATE_FUNCTION = """
+CREATE OR REPLACE FUNCTION changelog_update_state() RETURNS trigger AS $$
+DECLARE
+    latest changelog_changelogstate%ROWTYPE;
+BEGIN
+    IF NEW.log_type = 3 THEN
+        -- ON_DELETE
+        DELETE FROM changelog_changelogstate
+        WHERE
+            content_type_id = NEW.content_type_id AND
+            object_id = NEW.object_id;
+        RETURN NULL;
+    END IF;
+
+    INSERT INTO changelog_changelogstate AS state (
+        content_type_id,
+        object_id,
+        fields,
+        last_log_id,
+        last_logged_at,
+        checkpoint_logs,
+        checkpointed_at
+    )
+    SELECT
+        NEW.content_type_id,
+        NEW.object_id,
+        coalesce(json_object_agg(entry.key, entry.value -> 'now'), '{}')::jsonb,
+        NEW.id,
+        NEW.created_at,
+        1,
+        NEW.created_at
+    FROM
+        jsonb_each(NEW.fields) AS entry
+    WHERE
+        entry.value ? 'now'
+    ON CONFLICT (content_type_id, object_id) DO UPDATE SET
+        fields = state.fields || EXCLUDED.fields,
+        last_log_id = EXCLUDED.last_log_id,
+        last_logged_at = EXCLUDED.last_logged_at,
+        checkpoint_logs = state.checkpoint_logs + 1
+    RETURNING * INTO latest;
+
+    IF
+        latest.checkpoint_logs >= TG_ARGV[0]::integer OR
+        latest.last_logged_at - latest.checkpointed_at >=
+            TG_ARGV[1]::integer * interval '1 day'
+    THEN
+        INSERT INTO changelog_changelogcheckpoint (
+            content_type_id,
+            object_id,
+            fields,
+            last_log_id,
+            created_at
+        ) VALUES (
+            latest.content_type_id,
+            latest.object_id,
+            latest.fields,
+            latest.last_log_id,
+            latest.last_logged_at
+        );
+
+        UPDATE changelog_changelogstate SET
+            checkpoint_logs = 0,
+            checkpointed_at = latest.last_logged_at
+        WHERE
+            id = latest.id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER changelog_update_state ON changelog_changelog;
+CREATE TRIGGER changelog_update_state
+AFTER INSERT ON changelog_changelog
+FOR EACH ROW EXECUTE PROCEDURE changelog_update_state('100', '30');
+"""
+
+DROP_FUNCTION = """
+DROP TRIGGER changelog_update_state ON changelog_changelog;
+DROP FUNCTION changelog_update_state();
+"""
+
+# checkpoint the current state of every instance, so states as of their
+# latest logs never replay the logs written before this migration
+BACKFILL = """
+INSERT INTO changelog_changelogcheckpoint (
+    content_type_id,
+    object_id,
+    fields,
+    last_log_id,
+    created_at
+)
+SELECT
+    content_type_id,
+    object_id,
+    fields,
+    last_log_id,
+    last_logged_at
+FROM
+    changelog_changelogstate;
+
+UPDATE changelog_changelogstate SET
+    checkpointed_at = last_logged_at;
+"""
+
+
+def restore_trigger(apps, schema_editor):
+    """Restore the trigger of ``0005_changelogstate``"""
+    previous = import_module('changelog.migrations.0005_changelogstate')
+    schema_editor.execute(DROP_FUNCTION)
+    schema_editor.execute(previous.CREATE_TRIGGER)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('changelog', '0005_changelogstate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLogCheckpoint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_id', models.PositiveIntegerField()),
+                ('fields', django.contrib.postgres.fields.jsonb.JSONField()),
+                ('last_log_id', models.IntegerField()),
+                ('created_at', models.DateTimeField()),
+                ('content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.ContentType')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='changelogstate',
+            name='checkpoint_logs',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='changelogstate',
+            name='checkpointed_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AlterIndexTogether(
+            name='changelogcheckpoint',
+            index_together=set([('content_type', 'object_id', 'created_at')]),
+        ),
+        migrations.RunSQL(
+            sql=CREATE_FUNCTION,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.RunPython(
+            code=migrations.RunPython.noop,
+            reverse_code=restore_trigger,
+        ),
+        migrations.RunSQL(
+            sql=BACKFILL,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
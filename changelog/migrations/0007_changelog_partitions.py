@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """Formerly partitioned ``changelog_changelog`` depending on a setting
+
+    Partitioning is now done by ``./manage.py changelog_partition``, so
+    migrations leave every database with the same schema.
+    """
+
+    dependencies = [
+        ('changelog', '0006_changelogcheckpoint'),
+    ]
+
+    operations = []
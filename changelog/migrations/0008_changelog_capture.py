@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+# logs the tracked columns of a row when it's inserted, updated or deleted,
+# for ``CHANGELOG_CAPTURE = 'trigger'``. Arguments: the content type id, the
+# pk column, then the attname and column of each tracked field (see
+# ``changelog.triggers.get_capture_triggers``).
+CREATE_FUNCTION = """
+CREATE FUNCTION changelog_capture() RETURNS trigger AS $$
+DECLARE
+    old_row jsonb;
+    new_row jsonb;
+    field text;
+    field_column text;
+    fields jsonb := '{}';
+BEGIN
+    IF TG_OP != 'INSERT' THEN
+        old_row := to_jsonb(OLD);
+    END IF;
+    IF TG_OP != 'DELETE' THEN
+        new_row := to_jsonb(NEW);
+    END IF;
+
+    FOR i IN 2 .. TG_NARGS - 1 BY 2 LOOP
+        field := TG_ARGV[i];
+        field_column := TG_ARGV[i + 1];
+        IF TG_OP = 'INSERT' THEN
+            fields := fields || jsonb_build_object(
+                field,
+                jsonb_build_object('now', new_row -> field_column)
+            );
+        ELSIF TG_OP = 'DELETE' THEN
+            fields := fields || jsonb_build_object(
+                field,
+                jsonb_build_object('was', old_row -> field_column)
+            );
+        ELSIF old_row -> field_column IS DISTINCT FROM new_row -> field_column
+        THEN
+            fields := fields || jsonb_build_object(
+                field,
+                jsonb_build_object(
+                    'was', old_row -> field_column,
+                    'now', new_row -> field_column
+                )
+            );
+        END IF;
+    END LOOP;
+
+    IF fields = '{}' THEN
+        RETURN NULL;
+    END IF;
+
+    INSERT INTO changelog_changelog (
+        created_at,
+        content_type_id,
+        object_id,
+        log_type,
+        fields
+    ) VALUES (
+        clock_timestamp(),
+        TG_ARGV[0]::integer,
+        (coalesce(new_row, old_row) ->> TG_ARGV[1])::integer,
+        -- ON_DELETE or ON_SAVE
+        CASE WHEN TG_OP = 'DELETE' THEN 3 ELSE 0 END,
+        fields
+    );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+DROP_FUNCTION = """
+DROP FUNCTION changelog_capture() CASCADE;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('changelog', '0007_changelog_partitions'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=CREATE_FUNCTION,
+            reverse_sql=DROP_FUNCTION,
+        ),
+    ]
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+# sends the id, content type and object of each new log on the ``changelog``
+# channel. Notifications are only delivered once the log's transaction
+# commits. The trigger is installed if ``CHANGELOG_NOTIFY`` is set (see
+# ``changelog.triggers.configure_notify_trigger``).
+CREATE_FUNCTION = """
+CREATE FUNCTION changelog_notify() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify(
+        'changelog',
+        json_build_object(
+            'id', NEW.id,
+            'content_type_id', NEW.content_type_id,
+            'object_id', NEW.object_id
+        )::text
+    );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+DROP_FUNCTION = """
+DROP FUNCTION changelog_notify() CASCADE;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('changelog', '0008_changelog_capture'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=CREATE_FUNCTION,
+            reverse_sql=DROP_FUNCTION,
+        ),
+    ]
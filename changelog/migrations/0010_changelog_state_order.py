@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from importlib import import_module
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+# as in ``0006_changelogcheckpoint``, but logs written out of order (by the
+# batched and async writers, after their transactions commit) never replace
+# the state of a later log, and logs of deleted instances don't bring their
+# states back. Logs are ordered by ``created_at``, then id.
+CREATE_FUNCTION = """
+CREATE OR REPLACE FUNCTION changelog_update_state() RETURNS trigger AS $$
+DECLARE
+    latest changelog_changelogstate%ROWTYPE;
+BEGIN
+    IF NEW.log_type = 3 THEN
+        -- ON_DELETE
+        DELETE FROM changelog_changelogstate
+        WHERE
+            content_type_id = NEW.content_type_id AND
+            object_id = NEW.object_id AND
+            (last_logged_at, last_log_id) <= (NEW.created_at, NEW.id);
+        RETURN NULL;
+    END IF;
+
+    INSERT INTO changelog_changelogstate AS state (
+        content_type_id,
+        object_id,
+        fields,
+        last_log_id,
+        last_logged_at,
+        checkpoint_logs,
+        checkpointed_at
+    )
+    SELECT
+        NEW.content_type_id,
+        NEW.object_id,
+        coalesce(json_object_agg(entry.key, entry.value -> 'now'), '{}')::jsonb,
+        NEW.id,
+        NEW.created_at,
+        1,
+        NEW.created_at
+    FROM
+        jsonb_each(NEW.fields) AS entry
+    WHERE
+        entry.value ? 'now'
+    HAVING
+        NOT EXISTS (
+            SELECT
+                1
+            FROM
+                changelog_changelog AS deleted
+            WHERE
+                deleted.content_type_id = NEW.content_type_id AND
+                deleted.object_id = NEW.object_id AND
+                deleted.log_type = 3 AND
+                deleted.created_at >= NEW.created_at
+        )
+    ON CONFLICT (content_type_id, object_id) DO UPDATE SET
+        fields = state.fields || EXCLUDED.fields,
+        last_log_id = EXCLUDED.last_log_id,
+        last_logged_at = EXCLUDED.last_logged_at,
+        checkpoint_logs = state.checkpoint_logs + 1
+    WHERE
+        (state.last_logged_at, state.last_log_id) <=
+            (EXCLUDED.last_logged_at, EXCLUDED.last_log_id)
+    RETURNING * INTO latest;
+
+    IF
+        latest.checkpoint_logs >= TG_ARGV[0]::integer OR
+        latest.last_logged_at - latest.checkpointed_at >=
+            TG_ARGV[1]::integer * interval '1 day'
+    THEN
+        INSERT INTO changelog_changelogcheckpoint (
+            content_type_id,
+            object_id,
+            fields,
+            last_log_id,
+            created_at
+        ) VALUES (
+            latest.content_type_id,
+            latest.object_id,
+            latest.fields,
+            latest.last_log_id,
+            latest.last_logged_at
+        );
+
+        UPDATE changelog_changelogstate SET
+            checkpoint_logs = 0,
+            checkpointed_at = latest.last_logged_at
+        WHERE
+            id = latest.id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+
+def restore_function(apps, schema_editor):
+    """Restore the function of ``0006_changelogcheckpoint``"""
+    previous = import_module('changelog.migrations.0006_changelogcheckpoint')
+    schema_editor.execute(previous.CREATE_FUNCTION)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('changelog', '0009_changelog_notify'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='changelog',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.RunSQL(
+            sql=CREATE_FUNCTION,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.RunPython(
+            code=migrations.RunPython.noop,
+            reverse_code=restore_function,
+        ),
+    ]
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from importlib import import_module
+
+from django.db import migrations
+
+
+# as in ``0008_changelog_capture``, but updates are logged with the log type
+# in the ``changelog.log_type`` setting, if it's set: ``QuerySet.update()``
+# sets it to ``ON_UPDATE`` for the duration of the update (see
+# ``changelog.triggers.log_type``), so bulk updates are logged as they are
+# by the other capture modes. The setting doesn't exist in sessions that
+# never set it; ``current_setting()`` only tolerates that from PostgreSQL 9.6.
+CREATE_FUNCTION = """
+CREATE OR REPLACE FUNCTION changelog_capture() RETURNS trigger AS $$
+DECLARE
+    old_row jsonb;
+    new_row jsonb;
+    field text;
+    field_column text;
+    fields jsonb := '{}';
+    log_type integer := 0;
+BEGIN
+    IF TG_OP != 'INSERT' THEN
+        old_row := to_jsonb(OLD);
+    END IF;
+    IF TG_OP != 'DELETE' THEN
+        new_row := to_jsonb(NEW);
+    END IF;
+
+    FOR i IN 2 .. TG_NARGS - 1 BY 2 LOOP
+        field := TG_ARGV[i];
+        field_column := TG_ARGV[i + 1];
+        IF TG_OP = 'INSERT' THEN
+            fields := fields || jsonb_build_object(
+                field,
+                jsonb_build_object('now', new_row -> field_column)
+            );
+        ELSIF TG_OP = 'DELETE' THEN
+            fields := fields || jsonb_build_object(
+                field,
+                jsonb_build_object('was', old_row -> field_column)
+            );
+        ELSIF old_row -> field_column IS DISTINCT FROM new_row -> field_column
+        THEN
+            fields := fields || jsonb_build_object(
+                field,
+                jsonb_build_object(
+                    'was', old_row -> field_column,
+                    'now', new_row -> field_column
+                )
+            );
+        END IF;
+    END LOOP;
+
+    IF fields = '{}' THEN
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP = 'DELETE' THEN
+        -- ON_DELETE
+        log_type := 3;
+    ELSIF TG_OP = 'UPDATE' THEN
+        BEGIN
+            log_type := coalesce(
+                nullif(current_setting('changelog.log_type'), '')::integer,
+                0
+            );
+        EXCEPTION WHEN undefined_object THEN
+            -- ON_SAVE
+            log_type := 0;
+        END;
+    END IF;
+
+    INSERT INTO changelog_changelog (
+        created_at,
+        content_type_id,
+        object_id,
+        log_type,
+        fields
+    ) VALUES (
+        clock_timestamp(),
+        TG_ARGV[0]::integer,
+        (coalesce(new_row, old_row) ->> TG_ARGV[1])::integer,
+        log_type,
+        fields
+    );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+
+def restore_function(apps, schema_editor):
+    """Restore the function of ``0008_changelog_capture``"""
+    previous = import_module('changelog.migrations.0008_changelog_capture')
+    # replaced in place, so the capture triggers are kept
+    schema_editor.execute(previous.CREATE_FUNCTION.replace(
+        'CREATE FUNCTION',
+        'CREATE OR REPLACE FUNCTION',
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('changelog', '0010_changelog_state_order'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=CREATE_FUNCTION,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.RunPython(
+            code=migrations.RunPython.noop,
+            reverse_code=restore_function,
+        ),
+    ]
@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.13 on 2026-10-18 21:12
+from __future__ import unicode_literals
+
+import changelog.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('changelog', '0011_changelog_capture_log_type'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='changelog',
+            name='fields',
+            field=changelog.fields.LogJSONField(),
+        ),
+    ]
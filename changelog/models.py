@@ -3,8 +3,16 @@ from __future__ import unicode_literals
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.postgres.fields import JSONField
-from django.db import models
+from django.db import connections, models
 from django.db.models import Q
+from django.utils import timezone
+
+from changelog.archive import (
+    get_archive_dir,
+    get_archived_logs,
+    get_archived_logs_in_bulk,
+)
+from changelog.fields import LogJSONField
 
 
 class ChangeLog(models.Model):
@@ -12,18 +20,23 @@ class ChangeLog(models.Model):
     ON_SAVE = 0
     ON_UPDATE = 1
     ON_SYNC = 2
+    ON_DELETE = 3
     LOG_TYPE_CHOICES = (
         (ON_SAVE, 'On Save'),
-        (ON_SAVE, 'On Update'),
-        (ON_SAVE, 'On Sync'),
+        (ON_UPDATE, 'On Update'),
+        (ON_SYNC, 'On Sync'),
+        (ON_DELETE, 'On Delete'),
     )
     log_type = models.PositiveSmallIntegerField(
         choices=LOG_TYPE_CHOICES,
         default=ON_SAVE,
     )
 
+    # set when the change is captured, not when the log is written, so logs
+    # written after their transaction commits keep the order of the changes
     created_at = models.DateTimeField(
-        auto_now_add=True
+        default=timezone.now,
+        editable=False,
     )
 
     content_type = models.ForeignKey(
@@ -36,7 +49,7 @@ class ChangeLog(models.Model):
         fk_field='object_id',
     )
 
-    fields = JSONField()
+    fields = LogJSONField()
     # Nested dict in the format:
     # {
     #     '<field_name>': {
@@ -44,18 +57,107 @@ class ChangeLog(models.Model):
     #         'now': '<new value>',
     #     }
     # }
-    # Note that some log types may not include the 'was' key.
+    # Note that some log types may not include the 'was' key, and
+    # ``ON_DELETE`` logs only include the 'was' key.
 
     def __repr__(self):
         return '<ChangeLog {pk}: {model_name}:{instance_id}>'.format(
             pk=self.pk,
-            model_name=self.instance._meta.label,
+            model_name=self.content_type.model_class()._meta.label,
+            instance_id=self.object_id,
+        )
+
+
+class ChangeLogState(models.Model):
+    """The latest logged value of each tracked field of an instance
+
+    Rows are maintained by a trigger on ``changelog_changelog`` (see
+    migrations ``0005_changelogstate`` and ``0006_changelogcheckpoint``), in
+    the same transaction as the logs they're updated from, however the logs
+    are written. The row of an instance is removed when its ``ON_DELETE``
+    log is written.
+    """
+
+    content_type = models.ForeignKey(
+        to=ContentType,
+        on_delete=models.CASCADE,
+    )
+    object_id = models.PositiveIntegerField()
+    instance = GenericForeignKey(
+        ct_field='content_type',
+        fk_field='object_id',
+    )
+
+    fields = JSONField()
+    # {'<field_name>': '<latest value>'}
+
+    last_log_id = models.IntegerField()
+    last_logged_at = models.DateTimeField()
+
+    # logs since the last ``ChangeLogCheckpoint`` of the instance
+    checkpoint_logs = models.PositiveIntegerField(default=0)
+    checkpointed_at = models.DateTimeField(null=True)
+
+    class Meta:
+        unique_together = (
+            ('content_type', 'object_id'),
+        )
+
+    def __repr__(self):
+        return '<ChangeLogState {model_name}:{instance_id}>'.format(
+            model_name=self.content_type.model_class()._meta.label,
+            instance_id=self.object_id,
+        )
+
+
+class ChangeLogCheckpoint(models.Model):
+    """The logged state of an instance as of one of its logs
+
+    Checkpoints are written by the ``ChangeLogState`` trigger, every
+    ``CHANGELOG_CHECKPOINT_LOGS`` logs or ``CHANGELOG_CHECKPOINT_DAYS`` days
+    of an instance's history, so its state at any time can be rebuilt from
+    a checkpoint and the few logs after it.
+    """
+
+    content_type = models.ForeignKey(
+        to=ContentType,
+        on_delete=models.CASCADE,
+    )
+    object_id = models.PositiveIntegerField()
+    instance = GenericForeignKey(
+        ct_field='content_type',
+        fk_field='object_id',
+    )
+
+    fields = JSONField()
+    # {'<field_name>': '<value>'}
+
+    # the log the checkpoint was written for, and its ``created_at``
+    last_log_id = models.IntegerField()
+    created_at = models.DateTimeField()
+
+    class Meta:
+        index_together = (
+            ('content_type', 'object_id', 'created_at'),
+        )
+
+    def __repr__(self):
+        return '<ChangeLogCheckpoint {pk}: {model_name}:{instance_id}>'.format(
+            pk=self.pk,
+            model_name=self.content_type.model_class()._meta.label,
             instance_id=self.object_id,
         )
 
 
 class ChangeSet(object):
-    def __init__(self, instance=None, first=None, last=None):
+    def __init__(
+        self,
+        instance=None,
+        first=None,
+        last=None,
+        since=None,
+        until=None,
+    ):
         """A summary of changes to tracked fields between two states.
 
         Any combination of parameters may be passed, provided they refer to
@@ -68,9 +170,24 @@ class ChangeSet(object):
         included. Likewise, if only ``last`` is passed, then all
         ``ChangeLog``s prior will be included.
 
+        No queries are made until ``first``, ``last`` or ``diff`` is used;
+        then all three are found with a single query.
+
+        Logs are looked up by ``created_at`` bounds, so if the changelog
+        table is partitioned, only the partitions in range of ``since``,
+        ``until``, ``first`` and ``last`` are read. A set of only an
+        ``instance`` has no bounds, and reads every partition.
+
+        With ``CHANGELOG_ARCHIVE_DIR`` set, logs in archives of the months in
+        range are included too; ``first`` or ``last`` may then be an archived
+        log, as an unsaved ``ChangeLog``. ``iter_logs()`` only returns logs in
+        the database.
+
         :param first:
         :param last:
         :param instance:
+        :param since: If given, only include logs created at or after it
+        :param until: If given, only include logs created at or before it
         """
 
         if not any((instance, first, last)):
@@ -79,59 +196,380 @@ class ChangeSet(object):
         # ensure all params refer to the same instance
 
         if instance is not None:
-            if first is not None:
-                assert first.instance.pk == instance.pk
-            if last is not None:
-                assert last.instance.pk == instance.pk
+            self.content_type_id = ContentType.objects.get_for_model(
+                instance
+            ).pk
+            self.object_id = instance.pk
+        else:
+            self.content_type_id = (first or last).content_type_id
+            self.object_id = (first or last).object_id
 
-        if first is not None:
-            if last is not None:
-                assert last.instance.pk == first.instance.pk
+        for log in (first, last):
+            if log is not None:
+                assert log.content_type_id == self.content_type_id
+                assert log.object_id == self.object_id
 
         # set instance variables
 
-        self.instance = instance
-        self.first = first
-        self.last = last
+        self._instance = instance
+        self._first = first
+        self._last = last
+        self._since = since
+        self._until = until
+        self._diff = None
 
-        if self.instance is None:
-            self.instance = (self.first or self.last).instance
+    @property
+    def instance(self):
+        if self._instance is None:
+            self._instance = (self._first or self._last).instance
+        return self._instance
 
-        if self.first is None:
-            self.first = ChangeLog.objects.filter(
-                content_type=ContentType.objects.get_for_model(self.instance),
-                object_id=self.instance.pk,
-            ).order_by('created_at').first()
+    @property
+    def first(self):
+        if self._diff is None:
+            self._load()
+        return self._first
 
-        if self.last is None:
-            self.last = ChangeLog.objects.filter(
-                content_type=ContentType.objects.get_for_model(self.instance),
-                object_id=self.instance.pk,
-            ).order_by('-created_at').first()
+    @property
+    def last(self):
+        if self._diff is None:
+            self._load()
+        return self._last
+
+    @property
+    def diff(self):
+        if self._diff is None:
+            self._load()
+        return self._diff
+
+    def _get_bounds(self):
+        """Return a ``Q`` for the ``ChangeLog``s in this set"""
+        query = Q(
+            content_type_id=self.content_type_id,
+            object_id=self.object_id,
+        )
+        if self._first is not None:
+            query &= Q(created_at__gte=self._first.created_at)
+        if self._last is not None:
+            query &= Q(created_at__lte=self._last.created_at)
+        if self._since is not None:
+            query &= Q(created_at__gte=self._since)
+        if self._until is not None:
+            query &= Q(created_at__lte=self._until)
+        return query
 
     def iter_logs(self):
         """Return a queryset containing ``ChangeLog``s, in chrono order"""
-        query = Q(
-            content_type=ContentType.objects.get_for_model(self.instance),
-            object_id=self.instance.pk,
+        return ChangeLog.objects.filter(
+            self._get_bounds()
+        ).order_by('created_at').all()
+
+    def _load(self):
+        """Find the first and last logs and fold the diff, in one query
+
+        Each field's first entry is combined with the ``'now'`` of its last
+        entry (or its lack of one, if it was deleted).
+        """
+        logs = ChangeLog.objects.filter(self._get_bounds())
+        subquery, params = logs.values(
+            *[field.attname for field in ChangeLog._meta.concrete_fields]
+        ).query.sql_with_params()
+
+        using = logs.db
+        qn = connections[using].ops.quote_name
+        columns = [
+            qn(field.column) for field in ChangeLog._meta.concrete_fields
+        ]
+        query = """
+WITH logs AS ({subquery}), entries AS (
+    SELECT
+        entry.key,
+        entry.value,
+        row_number() OVER (
+            PARTITION BY entry.key
+            ORDER BY logs.created_at, logs.id
+        ) AS n,
+        row_number() OVER (
+            PARTITION BY entry.key
+            ORDER BY logs.created_at DESC, logs.id DESC
+        ) AS reverse_n
+    FROM
+        logs,
+        jsonb_each(logs.fields) AS entry
+)
+SELECT
+    {first_columns},
+    {last_columns},
+    (
+        SELECT
+            json_object_agg(
+                first_entry.key,
+                json_build_array(first_entry.value, last_entry.value)
+            )
+        FROM
+            entries AS first_entry
+            JOIN entries AS last_entry ON (
+                last_entry.key = first_entry.key AND
+                last_entry.reverse_n = 1
+            )
+        WHERE
+            first_entry.n = 1
+    )
+FROM
+    (
+        SELECT * FROM logs ORDER BY created_at, id LIMIT 1
+    ) AS first_log,
+    (
+        SELECT * FROM logs ORDER BY created_at DESC, id DESC LIMIT 1
+    ) AS last_log
+        """.format(
+            subquery=subquery,
+            first_columns=', '.join(
+                'first_log.{}'.format(column) for column in columns
+            ),
+            last_columns=', '.join(
+                'last_log.{}'.format(column) for column in columns
+            ),
         )
 
-        # values will not be set if no logs exist
-        if self.first is not None and self.last is not None:
-            query &= Q(
-                created_at__gte=self.first.created_at,
-                created_at__lte=self.last.created_at
+        with connections[using].cursor() as c:
+            c.execute(query, params)
+            row = c.fetchone()
+
+        archived = self._get_archived_logs()
+
+        self._diff = {}
+        for log in archived:
+            for field, change in log.fields.items():
+                if field in self._diff:
+                    change = _fold(self._diff[field], change)
+                self._diff[field] = change
+
+        if archived and self._first is None:
+            self._first = self._from_archive(archived[0])
+        if row is None:
+            if archived and self._last is None:
+                self._last = self._from_archive(archived[-1])
+            return
+
+        field_names = [
+            field.attname for field in ChangeLog._meta.concrete_fields
+        ]
+        if self._first is None:
+            self._first = ChangeLog.from_db(
+                using,
+                field_names,
+                row[:len(columns)],
+            )
+        if self._last is None:
+            self._last = ChangeLog.from_db(
+                using,
+                field_names,
+                row[len(columns):2 * len(columns)],
             )
 
-        return ChangeLog.objects.filter(query).order_by('created_at').all()
+        for field, (change, last_change) in (row[-1] or {}).items():
+            change = _fold(change, last_change)
+            if field in self._diff:
+                change = _fold(self._diff[field], change)
+            self._diff[field] = change
 
-    @property
-    def diff(self):
-        diff = {}
-        for log in self.iter_logs():
-            for field in log.fields:
-                if field not in diff:
-                    diff[field] = log.fields[field]
-                else:
-                    diff[field]['now'] = log.fields[field]['now']
-        return diff
+    def _get_archived_logs(self):
+        """Return the archived logs in this set, if archives are enabled
+
+        Only the archives of months in range are read, so sets bounded by
+        logs or times after the archived months read none. Archives are kept
+        open by ``open_archive()``, so unbounded sets only search each
+        archive's index of instances.
+        """
+        if not get_archive_dir():
+            return []
+
+        lower = [
+            bound for bound in (
+                self._since,
+                self._first and self._first.created_at,
+            ) if bound is not None
+        ]
+        upper = [
+            bound for bound in (
+                self._until,
+                self._last and self._last.created_at,
+            ) if bound is not None
+        ]
+        return get_archived_logs(
+            ContentType.objects.get_for_id(self.content_type_id),
+            self.object_id,
+            since=max(lower) if lower else None,
+            until=min(upper) if upper else None,
+        )
+
+    def _from_archive(self, log):
+        """Return an archived log as an (unsaved) ``ChangeLog``"""
+        return ChangeLog(
+            id=log.id,
+            content_type_id=self.content_type_id,
+            object_id=self.object_id,
+            created_at=log.created_at,
+            log_type=log.log_type,
+            fields=log.fields,
+        )
+
+    @classmethod
+    def for_queryset(cls, queryset, since=None, until=None, chunk_size=1000):
+        """Yield ``(pk, diff)`` for each instance in ``queryset`` with logs
+
+        Instances are read ``chunk_size`` at a time, in order of pk, and the
+        diffs of each chunk are computed by a single query. Each chunk is
+        read completely before its diffs are yielded, so no transaction or
+        cursor is left open between iterations. Instances without logs are
+        left out.
+
+        With ``CHANGELOG_ARCHIVE_DIR`` set, logs in archives of the months in
+        range are included too, as in ``ChangeSet``; each archive is opened
+        once per chunk.
+
+        :param since: If given, only include logs created at or after it
+        :param until: If given, only include logs created at or before it
+        """
+        pks = queryset.order_by('pk').values_list('pk', flat=True)
+        content_type = ContentType.objects.get_for_model(queryset.model)
+
+        last = None
+        while True:
+            chunk = pks if last is None else pks.filter(pk__gt=last)
+            chunk = list(chunk[:chunk_size])
+            if not chunk:
+                return
+            last = chunk[-1]
+
+            diffs = cls._get_diffs(
+                queryset.db,
+                content_type,
+                chunk,
+                since,
+                until,
+            )
+            if get_archive_dir():
+                diffs = cls._add_archived_diffs(
+                    diffs,
+                    content_type,
+                    chunk,
+                    since,
+                    until,
+                )
+            for pk, diff in diffs:
+                yield pk, diff
+
+            if len(chunk) < chunk_size:
+                return
+
+    @classmethod
+    def _get_diffs(cls, using, content_type, pks, since, until):
+        """Return ``(pk, diff)`` for each of ``pks`` with logs, in order"""
+        logs = ChangeLog.objects.using(using).filter(
+            content_type=content_type,
+            object_id__in=pks,
+        )
+        if since is not None:
+            logs = logs.filter(created_at__gte=since)
+        if until is not None:
+            logs = logs.filter(created_at__lte=until)
+        logs, logs_params = logs.values(
+            'object_id',
+            'created_at',
+            'id',
+            'fields',
+        ).query.sql_with_params()
+
+        query = """
+WITH logs AS ({logs}), entries AS (
+    SELECT
+        logs.object_id,
+        entry.key,
+        entry.value,
+        row_number() OVER (
+            PARTITION BY logs.object_id, entry.key
+            ORDER BY logs.created_at, logs.id
+        ) AS n,
+        row_number() OVER (
+            PARTITION BY logs.object_id, entry.key
+            ORDER BY logs.created_at DESC, logs.id DESC
+        ) AS reverse_n
+    FROM
+        logs,
+        jsonb_each(logs.fields) AS entry
+)
+SELECT
+    first_entry.object_id,
+    first_entry.key,
+    first_entry.value,
+    last_entry.value
+FROM
+    entries AS first_entry
+    JOIN entries AS last_entry ON (
+        last_entry.object_id = first_entry.object_id AND
+        last_entry.key = first_entry.key AND
+        last_entry.reverse_n = 1
+    )
+WHERE
+    first_entry.n = 1
+ORDER BY
+    first_entry.object_id
+        """.format(logs=logs)
+
+        with connections[using].cursor() as c:
+            c.execute(query, logs_params)
+            rows = c.fetchall()
+
+        diffs = []
+        for object_id, field, change, last_change in rows:
+            if not diffs or diffs[-1][0] != object_id:
+                diffs.append((object_id, {}))
+            diffs[-1][1][field] = _fold(change, last_change)
+        return diffs
+
+    @classmethod
+    def _add_archived_diffs(cls, diffs, content_type, pks, since, until):
+        """Fold the archived logs of ``pks`` into their ``(pk, diff)``s
+
+        Archived logs come before those in the database, so each pk's diff
+        starts from its archived logs.
+        """
+        archived = get_archived_logs_in_bulk(
+            content_type,
+            pks,
+            since=since,
+            until=until,
+        )
+        if not archived:
+            return diffs
+
+        diffs = dict(diffs)
+        merged = []
+        for pk in pks:
+            if pk not in archived and pk not in diffs:
+                continue
+            diff = {}
+            for log in archived.get(pk, ()):
+                for field, change in log.fields.items():
+                    if field in diff:
+                        change = _fold(diff[field], change)
+                    diff[field] = change
+            for field, change in diffs.get(pk, {}).items():
+                if field in diff:
+                    change = _fold(diff[field], change)
+                diff[field] = change
+            merged.append((pk, diff))
+        return merged
+
+
+def _fold(change, last_change):
+    """Return the change of a field from its first and last log entries"""
+    change = dict(change)
+    if 'now' in last_change:
+        change['now'] = last_change['now']
+    else:
+        # deleted
+        change.pop('now', None)
+    return change
@@ -0,0 +1,307 @@
+"""Range partitioning of ``changelog_changelog`` by ``created_at``
+
+The table is split into monthly partitions named
+``changelog_changelog_y<year>m<month>``, so that queries bounded by
+``created_at`` only read the partitions they need, and expired history can be
+dropped a partition at a time instead of deleted row by row. Logs written
+before the table was partitioned are kept in ``changelog_changelog_legacy``,
+and logs outside of every monthly partition go to
+``changelog_changelog_default``.
+
+Requires PostgreSQL 11 or later.
+"""
+from datetime import datetime
+import logging
+import re
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from changelog.triggers import (
+    configure_notify_trigger,
+    configure_state_trigger,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+TABLE = 'changelog_changelog'
+
+MIN_VERSION = 110000
+
+PARTITION = """
+ALTER TABLE changelog_changelog RENAME TO changelog_changelog_legacy;
+-- replaced by the primary key of the partitioned table
+ALTER TABLE changelog_changelog_legacy
+    DROP CONSTRAINT changelog_changelog_pkey;
+ALTER INDEX changelog_changelog_history
+    RENAME TO changelog_changelog_legacy_history;
+ALTER INDEX changelog_changelog_fields
+    RENAME TO changelog_changelog_legacy_fields;
+DROP TRIGGER changelog_update_state ON changelog_changelog_legacy;
+DROP TRIGGER IF EXISTS changelog_notify ON changelog_changelog_legacy;
+
+CREATE TABLE changelog_changelog (
+    LIKE changelog_changelog_legacy INCLUDING DEFAULTS INCLUDING CONSTRAINTS
+) PARTITION BY RANGE (created_at);
+ALTER SEQUENCE changelog_changelog_id_seq OWNED BY changelog_changelog.id;
+
+ALTER TABLE changelog_changelog
+    ATTACH PARTITION changelog_changelog_legacy
+    FOR VALUES FROM (MINVALUE) TO (%s);
+CREATE TABLE changelog_changelog_default
+    PARTITION OF changelog_changelog DEFAULT;
+
+-- unique constraints of partitioned tables must include the partition key
+ALTER TABLE changelog_changelog
+    ADD CONSTRAINT changelog_changelog_pkey PRIMARY KEY (id, created_at);
+ALTER TABLE changelog_changelog
+    ADD CONSTRAINT changelog_changelog_content_type_id_fk
+    FOREIGN KEY (content_type_id) REFERENCES django_content_type (id)
+    DEFERRABLE INITIALLY DEFERRED;
+-- attaches the indexes of the legacy partition
+CREATE INDEX changelog_changelog_history
+    ON changelog_changelog (content_type_id, object_id, created_at, id);
+CREATE INDEX changelog_changelog_fields
+    ON changelog_changelog USING gin (fields);
+"""
+
+UNPARTITION = """
+CREATE TABLE changelog_changelog_unpartitioned (
+    LIKE changelog_changelog INCLUDING DEFAULTS INCLUDING CONSTRAINTS
+);
+INSERT INTO changelog_changelog_unpartitioned
+    SELECT * FROM changelog_changelog;
+ALTER SEQUENCE changelog_changelog_id_seq OWNED BY NONE;
+DROP TABLE changelog_changelog;
+
+ALTER TABLE changelog_changelog_unpartitioned RENAME TO changelog_changelog;
+ALTER SEQUENCE changelog_changelog_id_seq OWNED BY changelog_changelog.id;
+ALTER TABLE changelog_changelog
+    ADD CONSTRAINT changelog_changelog_pkey PRIMARY KEY (id);
+ALTER TABLE changelog_changelog
+    ADD CONSTRAINT changelog_changelog_content_type_id_fk
+    FOREIGN KEY (content_type_id) REFERENCES django_content_type (id)
+    DEFERRABLE INITIALLY DEFERRED;
+CREATE INDEX changelog_changelog_history
+    ON changelog_changelog (content_type_id, object_id, created_at, id);
+CREATE INDEX changelog_changelog_fields
+    ON changelog_changelog USING gin (fields);
+"""
+
+# rows of the new range are moved out of the default partition, which can't
+# hold rows of another partition
+ATTACH_PARTITION = """
+WITH moved AS (
+    DELETE FROM changelog_changelog_default
+    WHERE
+        created_at >= %(start)s AND
+        created_at < %(end)s
+    RETURNING *
+)
+INSERT INTO {name} SELECT * FROM moved;
+ALTER TABLE changelog_changelog
+    ATTACH PARTITION {name} FOR VALUES FROM (%(start)s) TO (%(end)s);
+"""
+
+CREATE_PARTITION = """
+CREATE TABLE {name} (
+    LIKE changelog_changelog INCLUDING DEFAULTS INCLUDING CONSTRAINTS
+);
+""" + ATTACH_PARTITION
+
+PARTITIONS = """
+SELECT
+    child.relname,
+    pg_get_expr(child.relpartbound, child.oid)
+FROM
+    pg_inherits
+    JOIN pg_class AS parent ON parent.oid = pg_inherits.inhparent
+    JOIN pg_class AS child ON child.oid = pg_inherits.inhrelid
+WHERE
+    parent.relname = %s AND
+    pg_table_is_visible(parent.oid)
+"""
+
+BOUNDS = re.compile(r"FROM \((.+)\) TO \((.+)\)")
+
+
+def _check_version(connection):
+    connection.ensure_connection()
+    if connection.pg_version < MIN_VERSION:
+        raise ValueError(
+            'Partitioning requires PostgreSQL 11 or later'
+        )
+
+
+def _month(when):
+    """Return the start of the month of ``when``, in UTC"""
+    when = timezone.localtime(when, timezone.utc)
+    return datetime(when.year, when.month, 1, tzinfo=timezone.utc)
+
+
+def _next_month(month):
+    if month.month == 12:
+        return month.replace(year=month.year + 1, month=1)
+    return month.replace(month=month.month + 1)
+
+
+def _parse_bound(bound):
+    """Return the datetime of a range bound, or None if it's unbounded"""
+    if bound in ('MINVALUE', 'MAXVALUE'):
+        return None
+    return parse_datetime(bound.strip("'"))
+
+
+def is_partitioned(using=DEFAULT_DB_ALIAS):
+    """Return whether ``changelog_changelog`` is partitioned"""
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            "SELECT relkind FROM pg_class "
+            "WHERE relname = %s AND pg_table_is_visible(oid)",
+            [TABLE],
+        )
+        return cursor.fetchone() == ('p',)
+
+
+def get_partitions(using=DEFAULT_DB_ALIAS):
+    """Return the range partitions of ``changelog_changelog``, in order
+
+    :return: A list of ``(name, start, end)`` tuples; ``start`` is None for
+             the legacy partition. The default partition is not included.
+    """
+    with connections[using].cursor() as cursor:
+        cursor.execute(PARTITIONS, [TABLE])
+        rows = cursor.fetchall()
+
+    partitions = []
+    for name, bounds in rows:
+        match = BOUNDS.search(bounds)
+        if match is None:
+            # the default partition
+            continue
+        start, end = (_parse_bound(bound) for bound in match.groups())
+        partitions.append((name, start, end))
+
+    return sorted(
+        partitions,
+        key=lambda partition: partition[2],
+    )
+
+
+def partition_table(using=DEFAULT_DB_ALIAS, months=3):
+    """Convert ``changelog_changelog`` into a partitioned table
+
+    The existing table is kept as the legacy partition, holding every log
+    up to the end of the current month, so no logs are copied. Monthly
+    partitions are then created for the next ``months`` months.
+    """
+    connection = connections[using]
+    _check_version(connection)
+
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        cursor.execute(
+            PARTITION,
+            [_next_month(_month(timezone.now()))],
+        )
+        configure_state_trigger(using=using)
+        configure_notify_trigger(using=using)
+        create_partitions(using=using, months=months)
+
+
+def unpartition_table(using=DEFAULT_DB_ALIAS):
+    """Convert ``changelog_changelog`` back into a single table
+
+    All logs are copied into the new table.
+    """
+    connection = connections[using]
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        cursor.execute(UNPARTITION)
+        configure_state_trigger(using=using)
+        configure_notify_trigger(using=using)
+
+
+def create_partitions(using=DEFAULT_DB_ALIAS, months=3):
+    """Create the monthly partitions up to ``months`` months from now
+
+    :return: The names of the partitions created
+    """
+    connection = connections[using]
+    until = _month(timezone.now())
+    for _ in range(months + 1):
+        until = _next_month(until)
+
+    partitions = get_partitions(using=using)
+    month = partitions[-1][2] if partitions else _month(timezone.now())
+
+    created = []
+    while month < until:
+        end = _next_month(month)
+        name = '{}_y{:04d}m{:02d}'.format(TABLE, month.year, month.month)
+        with transaction.atomic(using=using), connection.cursor() as cursor:
+            cursor.execute(
+                CREATE_PARTITION.format(
+                    name=connection.ops.quote_name(name),
+                ),
+                {'start': month, 'end': end},
+            )
+        logger.info('Created partition {}'.format(name))
+        created.append(name)
+        month = end
+
+    return created
+
+
+def drop_partitions(before, using=DEFAULT_DB_ALIAS, detach_only=False):
+    """Drop the partitions that only hold logs created before ``before``
+
+    :param detach_only: If True, partitions are detached from
+                        ``changelog_changelog`` but their tables are kept,
+                        e.g. to be archived
+    :return: The names of the partitions dropped or detached
+    """
+    dropped = []
+    for name, _, end in get_partitions(using=using):
+        if end > before:
+            break
+        detach_partition(name, using=using, drop=not detach_only)
+        dropped.append(name)
+
+    return dropped
+
+
+def detach_partition(name, using=DEFAULT_DB_ALIAS, drop=False):
+    """Detach a partition from ``changelog_changelog``
+
+    :param drop: If True, the partition's table is dropped too
+    """
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        cursor.execute('ALTER TABLE {} DETACH PARTITION {}'.format(
+            qn(TABLE),
+            qn(name),
+        ))
+        if drop:
+            cursor.execute('DROP TABLE {}'.format(qn(name)))
+    logger.info('{} partition {}'.format(
+        'Dropped' if drop else 'Detached',
+        name,
+    ))
+
+
+def attach_partition(name, start, end, using=DEFAULT_DB_ALIAS):
+    """Attach a detached partition back to ``changelog_changelog``
+
+    Logs of its range written to the default partition in the meantime are
+    moved into it.
+    """
+    connection = connections[using]
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        cursor.execute(
+            ATTACH_PARTITION.format(name=connection.ops.quote_name(name)),
+            {'start': start, 'end': end},
+        )
+    logger.info('Attached partition {}'.format(name))
@@ -1,175 +1,323 @@
-import datetime
 from functools import wraps
 import logging
 
-from django.contrib.contenttypes.models import ContentType
-from django.db import connection
+from django.conf import settings
+from django.db import router, transaction
 from django.db.models import signals
-from django.dispatch import receiver
-from psycopg2.extras import Json
 
+from changelog import descriptors
+from changelog.managers import log_deletes
 from changelog.models import ChangeLog
+from changelog.snapshots import NOT_LOADED, DigestSnapshot
+from changelog.triggers import CAPTURE_SETTING, TRIGGER, uses_triggers
 from changelog.utils import get_tracked_models
+from changelog.writers import write_log
 
 
 logger = logging.getLogger(__name__)
 
 TRACKED_MODELS_SETTING = 'CHANGELOG_TRACKED_FIELDS'
 
+SNAPSHOT = 'snapshot'
+DIGEST = 'digest'
+DESCRIPTOR = 'descriptor'
 
-def _get_field_values(instance):
+
+def _get_tracked_model(model):
+    if getattr(model, '_deferred', False):
+        # before Django 1.10, deferred loading uses a dynamic subclass
+        return model._meta.proxy_for_model
+    return model
+
+
+def _get_capture_mode(model):
+    mode = getattr(settings, CAPTURE_SETTING, SNAPSHOT)
+    if mode == TRIGGER and not uses_triggers(_get_tracked_model(model)):
+        # the model's table trigger can't see all of its tracked fields
+        return SNAPSHOT
+    return mode
+
+
+def _get_tracked_fields(model):
+    return get_tracked_models().get(_get_tracked_model(model), tuple())
+
+
+def _get_field_values(instance, fields=None):
+    """Return the values of tracked fields that have been loaded
+
+    Deferred fields are left out; getting them would query the database.
+    """
+    if fields is None:
+        fields = _get_tracked_fields(instance.__class__)
+
+    # deferred fields are the ones missing from the instance dict (see
+    # ``Model.get_deferred_fields``)
+    loaded = instance.__dict__
     return {
-        field: getattr(instance, field)
-        for field
-        in get_tracked_models().get(instance.__class__, tuple())
+        field: loaded[field]
+        for field in fields
+        if field in loaded
     }
 
 
-@receiver(signals.post_init, dispatch_uid='changelog.set_initial_values')
-def set_initial_values(sender, instance, **kwargs):
-    models = get_tracked_models()
-    if sender not in models:
+def _take_snapshot(instance, values):
+    if _get_capture_mode(instance.__class__) == DIGEST:
+        return DigestSnapshot(
+            values.get(field, NOT_LOADED)
+            for field in _get_tracked_fields(instance.__class__)
+        )
+    return values
+
+
+def _update_snapshot(instance, values):
+    """Replace the snapshotted values of some fields"""
+    if _get_capture_mode(instance.__class__) == DESCRIPTOR:
+        descriptors.clear_changed_values(instance, values)
         return
 
-    instance.__changelog_initial_values = _get_field_values(instance)
+    snapshot = getattr(instance, '__changelog_initial_values', None)
+    if snapshot is None:
+        instance.__changelog_initial_values = _take_snapshot(instance, values)
+    elif isinstance(snapshot, DigestSnapshot):
+        snapshot.update(_get_tracked_fields(instance.__class__), values)
+    else:
+        snapshot.update(values)
+
+
+def set_initial_values(sender, instance, **kwargs):
+    instance.__changelog_initial_values = _take_snapshot(
+        instance,
+        _get_field_values(instance),
+    )
     logger.debug(
         "Set initial values for tracked fields: {}".format(repr(instance))
     )
 
 
-@receiver(signals.post_save, dispatch_uid='changelone.create_log')
-def create_log(sender, instance, **kwargs):
-    models = get_tracked_models()
-    if sender not in models:
-        return
+def _get_snapshot_changes(sender, instance, current_fields):
+    snapshot = instance.__changelog_initial_values
+
+    if isinstance(snapshot, DigestSnapshot):
+        return snapshot.get_changes(
+            instance,
+            _get_tracked_fields(sender),
+            current_fields,
+        )
 
     changes = {}
-    current_fields = _get_field_values(instance)
     for field, value in current_fields.items():
-        # TODO: is it possible that initial values aren't there?
-        initial_value = instance.__changelog_initial_values[field]
+        if field not in snapshot:
+            # deferred, then set without being loaded
+            changes[field] = {'now': value}
+            continue
+
+        initial_value = snapshot[field]
         if initial_value != value:
             changes[field] = {
                 'was': initial_value,
                 'now': value,
             }
+    return changes
+
+
+def _get_descriptor_changes(instance, fields=None):
+    """Return changes to fields that were set, and their current values
+
+    :param fields: If given, ignore fields not in this list
+    """
+    changes = {}
+    current_fields = {}
+    data = instance.__dict__
+
+    for field, initial_value in descriptors.get_changed_values(
+        instance
+    ).items():
+        if fields is not None and field not in fields:
+            continue
+
+        value = current_fields[field] = data[field]
+        if initial_value is NOT_LOADED:
+            changes[field] = {'now': value}
+        elif initial_value != value:
+            changes[field] = {
+                'was': initial_value,
+                'now': value,
+            }
+    return changes, current_fields
+
+
+def create_log(sender, instance, update_fields=None, **kwargs):
+    fields = _get_tracked_fields(sender)
+    if update_fields is not None:
+        # may contain either names or attnames
+        fields = [
+            field for field in fields
+            if field in update_fields or
+            sender._meta.get_field(field).name in update_fields
+        ]
+
+    if _get_capture_mode(sender) == DESCRIPTOR:
+        changes, current_fields = _get_descriptor_changes(
+            instance,
+            fields if update_fields is not None else None,
+        )
+    else:
+        current_fields = _get_field_values(instance, fields)
+        changes = _get_snapshot_changes(sender, instance, current_fields)
 
     if changes:
-        log = ChangeLog.objects.create(
+        log = ChangeLog(
             instance=instance,
             fields=changes,
         )
+        write_log(log)
         logger.debug("Created Log: {}".format(repr(log)))
 
-        instance.__changelog_initial_values = current_fields
+    # fields that were set back to their initial values are cleared too
+    if changes or _get_capture_mode(sender) == DESCRIPTOR:
+        _update_snapshot(instance, current_fields)
 
 
-def wrapped_update(f):
-    """Decorator for use on <Manager>.update() method of tracked models
+def wrapped_refresh_from_db(f):
+    """Decorator for <Model>.refresh_from_db() of tracked models
 
-    This add a single additional query to the call, but does not load any
-    model instances into memory in Python
-
-    NOTE: This is fragile! If the ``ChangeLog`` model fields change, this
-          will break.
+    Values loaded from the database become the initial values of their
+    fields. This is how deferred fields are snapshotted once they're loaded.
     """
 
-    if hasattr(f, 'im_self'):
-        self = f.im_self
-    else:
-        self = f.__self__
-
-    # Raw SQL query
-    query = """
-INSERT INTO changelog_changelog (
-    created_at,
-    object_id,
-    fields,
-    content_type_id,
-    log_type
-)
-SELECT
-    %s as created_at,
-    "id" as object_id,
-    %s as fields,
-    %s as content_type_id,
-    %s as log_type
-from
-    ({subquery}) as models
-    """.format(
-        # re-use the manager's query,
-        subquery=str(self.all().only('id').query)
-    )
-
     @wraps(f)
-    def wrapper(**kwargs):
-        num_rows_updated = f(**kwargs)
-
-        models = get_tracked_models()
-        diff = {
-            field: {'now': kwargs[field]}
-            for field in models[self.model]
-            if field in kwargs
-        }
-
-        if diff:
-            with connection.cursor() as c:
-                c.execute(
-                    query,
-                    [
-                        datetime.datetime.now(),
-                        Json(diff),
-                        ContentType.objects.get_for_model(self.model).pk,
-                        ChangeLog.ON_UPDATE,
-                    ],
-                )
-
-        return num_rows_updated
+    def wrapper(self, *args, **kwargs):
+        f(self, *args, **kwargs)
+        if _get_capture_mode(self.__class__) == TRIGGER:
+            return
+
+        fields = kwargs.get('fields')
+        if fields is None and len(args) > 1:
+            fields = args[1]
+        tracked = _get_tracked_fields(self.__class__)
+        if fields is not None:
+            tracked = [field for field in tracked if field in fields]
 
+        _update_snapshot(self, _get_field_values(self, tracked))
+
+    wrapper.__changelog_wrapped = True
     return wrapper
 
 
-def wrap_queryset_method(f):
-    """Wrap a method that returns a QuerySet to return a patched QuerySet"""
+def wrapped_delete(f):
+    """Decorator for <Model>.delete() of tracked models
+
+    The instance's tracked values are logged from the database, in the same
+    transaction as the delete.
+    """
+
     @wraps(f)
-    def wrapper(*args, **kwargs):
-        return patch_queryset(f(*args, **kwargs))
+    def wrapper(self, using=None, *args, **kwargs):
+        if _get_capture_mode(self.__class__) == TRIGGER:
+            # logged by the database
+            return f(self, using, *args, **kwargs)
+
+        model = _get_tracked_model(self.__class__)
+        using = using or router.db_for_write(model, instance=self)
+
+        with transaction.atomic(using=using, savepoint=False):
+            log_deletes(model._base_manager.using(using).filter(pk=self.pk))
+            return f(self, using, *args, **kwargs)
 
+    wrapper.__changelog_wrapped = True
     return wrapper
 
 
-def patch_queryset(qs):
-    """Patch a QuerySet to log updates and to return patched QuerySets"""
-    if getattr(qs, '__changelog_wrapped', False):
-        return qs
+def patch_models(**kwargs):
+    """Patch tracked models to capture changes"""
 
-    qs.__changelog_wrapped = True
-    qs.update = wrapped_update(qs.update)
+    for model, fields in get_tracked_models().items():
+        if not getattr(model.refresh_from_db, '__changelog_wrapped', False):
+            model.refresh_from_db = wrapped_refresh_from_db(
+                model.refresh_from_db
+            )
+        if not getattr(model.delete, '__changelog_wrapped', False):
+            model.delete = wrapped_delete(model.delete)
 
-    # wrap all methods that return a queryset to propogate the update wrapper
-    qs.all = wrap_queryset_method(qs.all)
-    qs.filter = wrap_queryset_method(qs.filter)
-    qs.exclude = wrap_queryset_method(qs.exclude)
-    qs.annotate = wrap_queryset_method(qs.annotate)
-    qs.order_by = wrap_queryset_method(qs.order_by)
-    qs.reverse = wrap_queryset_method(qs.reverse)
-    qs.distinct = wrap_queryset_method(qs.distinct)
-    qs.all = wrap_queryset_method(qs.all)
-    qs.select_related = wrap_queryset_method(qs.select_related)
-    qs.prefetch_related = wrap_queryset_method(qs.prefetch_related)
-    qs.extra = wrap_queryset_method(qs.extra)
-    qs.defer = wrap_queryset_method(qs.defer)
-    qs.only = wrap_queryset_method(qs.only)
-    qs.using = wrap_queryset_method(qs.using)
-    qs.select_for_update = wrap_queryset_method(qs.select_for_update)
-    qs.raw = wrap_queryset_method(qs.raw)
+        for model_class in _get_model_classes(model):
+            _patch_fields(model_class, fields)
 
-    return qs
 
+def _get_model_classes(model):
+    """Return a tracked model and its deferred subclasses
+
+    Deferred subclasses only exist before Django 1.10.
+    """
+    return [model] + [
+        subclass for subclass in model.__subclasses__()
+        if getattr(subclass, '_deferred', False)
+    ]
+
+
+def _patch_fields(model, fields):
+    if _get_capture_mode(model) == DESCRIPTOR:
+        descriptors.install_descriptors(model, fields)
+    else:
+        descriptors.remove_descriptors(model, fields)
 
-def patch_managers(**kwargs):
-    """Patch the managers for all tracked models to log updates"""
+
+def connect_receivers(**kwargs):
+    """Connect signal receivers for all tracked models
+
+    Receivers are connected per model, so instances of untracked models don't
+    pay for change tracking at all.
+    """
 
     for model in get_tracked_models():
-        for _, manager, abstract in model._meta.managers:
-            patch_queryset(manager)
+        for model_class in _get_model_classes(model):
+            _connect_receivers(model_class)
+
+
+def track_deferred_model(sender, **kwargs):
+    """Track deferred subclasses of tracked models
+
+    Before Django 1.10, instances with deferred fields belong to a subclass
+    that is created when it's first needed, and send signals as that class.
+    """
+
+    if not getattr(sender, '_deferred', False):
+        return
+
+    if sender._meta.proxy_for_model in get_tracked_models():
+        _patch_fields(sender, _get_tracked_fields(sender))
+        _connect_receivers(sender)
+
+
+def _connect_receivers(model):
+    dispatch_uid = 'changelog.set_initial_values.{}'.format(
+        model._meta.label
+    )
+    create_log_uid = 'changelog.create_log.{}'.format(model._meta.label)
+    if _get_capture_mode(model) == TRIGGER:
+        # changes are logged by the database
+        signals.post_init.disconnect(sender=model, dispatch_uid=dispatch_uid)
+        signals.post_save.disconnect(sender=model, dispatch_uid=create_log_uid)
+        return
+
+    if _get_capture_mode(model) == DESCRIPTOR:
+        # nothing to snapshot
+        signals.post_init.disconnect(sender=model, dispatch_uid=dispatch_uid)
+    else:
+        signals.post_init.connect(
+            receiver=set_initial_values,
+            sender=model,
+            dispatch_uid=dispatch_uid,
+        )
+
+    signals.post_save.connect(
+        receiver=create_log,
+        sender=model,
+        dispatch_uid=create_log_uid,
+    )
+
+
+def capture_setting_changed(setting, **kwargs):
+    """Re-patch tracked models when ``CHANGELOG_CAPTURE`` changes in tests"""
+    if setting == CAPTURE_SETTING:
+        patch_models()
+        connect_receivers()
@@ -0,0 +1,110 @@
+import hashlib
+
+from django.utils import six
+
+from changelog.fields import dumps
+from changelog.utils import get_logged_values
+
+
+# values longer than this are replaced with their digest
+MAX_INLINE_LENGTH = 64
+
+INLINE_TYPES = (bool, float, type(None)) + six.integer_types
+
+# placeholder for deferred fields that haven't been loaded yet
+NOT_LOADED = object()
+
+
+class Digest(bytes):
+    """Digest of a tracked value that was too large to keep in a snapshot"""
+    __slots__ = ()
+
+
+def get_digest(value):
+    """Return a ``Digest`` of ``value``
+
+    Values are digested in their JSON form, so a value recovered from a
+    ``ChangeLog`` has the same digest as the value it was logged from.
+    """
+    try:
+        data = dumps(value, sort_keys=True)
+    except TypeError:
+        data = repr(value)
+    return Digest(hashlib.md5(data.encode('utf-8')).digest())
+
+
+def compact(value):
+    """Return ``value`` if it is small enough to keep, else its digest"""
+    if value is NOT_LOADED or isinstance(value, INLINE_TYPES):
+        return value
+    if (
+        isinstance(value, (six.text_type, six.binary_type)) and
+        len(value) <= MAX_INLINE_LENGTH
+    ):
+        return value
+    return get_digest(value)
+
+
+def is_unchanged(initial, value):
+    # a short ``bytes`` value must never compare equal to a ``Digest``
+    return type(initial) is type(value) and initial == value
+
+
+class DigestSnapshot(object):
+    """Compact record of an instance's initial tracked field values
+
+    Values are stored in a tuple, in the order of the model's tracked fields.
+    Large values are stored as a digest; if one of those fields changes, its
+    initial value is recovered from the latest ``ChangeLog`` instead.
+    """
+    __slots__ = ('values',)
+
+    def __init__(self, values):
+        self.values = tuple(compact(value) for value in values)
+
+    def update(self, fields, values):
+        """Replace the snapshotted values of some fields
+
+        :param fields: The tracked fields of the instance's model
+        :param values: A dict of new values for some of ``fields``
+        """
+        self.values = tuple(
+            compact(values[field]) if field in values else initial
+            for field, initial in zip(fields, self.values)
+        )
+
+    def get_changes(self, instance, fields, values):
+        """Return a ``ChangeLog.fields`` dict of changes since the snapshot
+
+        :param instance: The model instance the snapshot was taken of
+        :param fields: The tracked fields of the instance's model
+        :param values: A dict of current values for some of ``fields``
+        """
+        changes = {}
+        digested = {}
+
+        for field, initial in zip(fields, self.values):
+            if field not in values:
+                continue
+
+            value = values[field]
+            if is_unchanged(initial, compact(value)):
+                continue
+
+            # a deferred field that was set without being loaded has no known
+            # initial value
+            changes[field] = {'now': value}
+            if isinstance(initial, Digest):
+                digested[field] = initial
+            elif initial is not NOT_LOADED:
+                changes[field]['was'] = initial
+
+        if digested:
+            logged = get_logged_values(instance, digested.keys())
+            for field, digest in digested.items():
+                # the latest log may not match if rows were changed without
+                # being logged; leave out ``was`` rather than guess
+                if field in logged and get_digest(logged[field]) == digest:
+                    changes[field]['was'] = logged[field]
+
+        return changes
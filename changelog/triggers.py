@@ -0,0 +1,206 @@
+from contextlib import contextmanager
+import logging
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from changelog.utils import get_tracked_models
+
+
+logger = logging.getLogger(__name__)
+
+
+CAPTURE_SETTING = 'CHANGELOG_CAPTURE'
+CHECKPOINT_LOGS_SETTING = 'CHANGELOG_CHECKPOINT_LOGS'
+CHECKPOINT_DAYS_SETTING = 'CHANGELOG_CHECKPOINT_DAYS'
+NOTIFY_SETTING = 'CHANGELOG_NOTIFY'
+
+DEFAULT_CHECKPOINT_LOGS = 100
+DEFAULT_CHECKPOINT_DAYS = 30
+
+# ``CHANGELOG_CAPTURE`` mode in which changes are captured by the database
+TRIGGER = 'trigger'
+
+STATE_TRIGGER = """
+DROP TRIGGER IF EXISTS changelog_update_state ON changelog_changelog;
+CREATE TRIGGER changelog_update_state
+AFTER INSERT ON changelog_changelog
+FOR EACH ROW EXECUTE PROCEDURE changelog_update_state('{logs:d}', '{days:d}');
+"""
+
+
+def configure_state_trigger(using=DEFAULT_DB_ALIAS, **kwargs):
+    """Re-create the ``ChangeLogState`` trigger with the checkpoint settings
+
+    The trigger writes a ``ChangeLogCheckpoint`` of an instance every
+    ``CHANGELOG_CHECKPOINT_LOGS`` logs, or when its last checkpoint is
+    ``CHANGELOG_CHECKPOINT_DAYS`` days older than its latest log. Connected
+    to ``post_migrate``, so changed settings apply on the next ``migrate``.
+    """
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        tables = connection.introspection.table_names(cursor)
+    if 'changelog_changelogcheckpoint' not in tables:
+        logger.debug('Checkpoints have not been migrated')
+        return
+
+    logs = getattr(settings, CHECKPOINT_LOGS_SETTING, DEFAULT_CHECKPOINT_LOGS)
+    days = getattr(settings, CHECKPOINT_DAYS_SETTING, DEFAULT_CHECKPOINT_DAYS)
+    sql = STATE_TRIGGER.format(logs=logs, days=days)
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        cursor.execute(sql)
+
+
+NOTIFY_TRIGGER = """
+CREATE TRIGGER changelog_notify
+AFTER INSERT ON changelog_changelog
+FOR EACH ROW EXECUTE PROCEDURE changelog_notify();
+"""
+
+CAPTURE_TRIGGER = """
+CREATE TRIGGER changelog_capture
+AFTER INSERT OR DELETE OR UPDATE OF {columns} ON {table}
+FOR EACH ROW EXECUTE PROCEDURE changelog_capture({args});
+"""
+
+CAPTURE_TRIGGERS = """
+SELECT
+    tgrelid::regclass::text
+FROM
+    pg_trigger
+WHERE
+    tgname = 'changelog_capture' AND
+    NOT tgisinternal
+"""
+
+
+def uses_triggers(model=None):
+    """Return whether changes (of ``model``) are captured by database triggers
+
+    Fields inherited from a parent model (multi-table inheritance) are in
+    the parent's table, out of reach of the model's trigger, so models
+    tracking any are left to Python capture (``'snapshot'``).
+    """
+    if getattr(settings, CAPTURE_SETTING, None) != TRIGGER:
+        return False
+    if model is None:
+        return True
+    meta = model._meta
+    return all(
+        meta.get_field(field) in meta.local_concrete_fields
+        for field in get_tracked_models().get(model, ())
+    )
+
+
+@contextmanager
+def log_type(value, using=DEFAULT_DB_ALIAS):
+    """Log the rows changed by capture triggers in the block as ``value``
+
+    The type is passed to the triggers in the ``changelog.log_type``
+    setting, which is local to the transaction the block runs in, and
+    cleared when the block ends. Otherwise, updates are logged as
+    ``ON_SAVE``.
+    """
+    connection = connections[using]
+    with transaction.atomic(using=using, savepoint=False):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT set_config('changelog.log_type', %s, true)",
+                [str(value)],
+            )
+        yield
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT set_config('changelog.log_type', '', true)"
+            )
+
+
+def _literal(value):
+    return "'{}'".format(str(value).replace("'", "''"))
+
+
+def get_capture_triggers(using=DEFAULT_DB_ALIAS):
+    """Return the SQL creating the capture trigger of each tracked model
+
+    The trigger of a model passes ``changelog_capture()`` its content type,
+    the column of its pk, and the attname and column of each of its tracked
+    fields. Models tracking inherited fields get no trigger (see
+    ``uses_triggers``).
+    """
+    qn = connections[using].ops.quote_name
+    statements = []
+    tracked = get_tracked_models()
+    for model in sorted(tracked, key=lambda model: model._meta.label):
+        if not uses_triggers(model):
+            logger.info(
+                '{} tracks inherited fields; its changes are captured in '
+                'Python'.format(model._meta.label)
+            )
+            continue
+        meta = model._meta
+        fields = tracked[model]
+        content_type = ContentType.objects.db_manager(
+            using,
+        ).get_for_model(model)
+        columns = [meta.get_field(field).column for field in fields]
+
+        args = [content_type.pk, meta.pk.column]
+        for field, column in zip(fields, columns):
+            args += [field, column]
+
+        statements.append(CAPTURE_TRIGGER.format(
+            table=qn(meta.db_table),
+            columns=', '.join(qn(column) for column in columns),
+            args=', '.join(_literal(arg) for arg in args),
+        ))
+    return statements
+
+
+def configure_capture_triggers(using=DEFAULT_DB_ALIAS, **kwargs):
+    """Install capture triggers if ``CHANGELOG_CAPTURE`` is ``'trigger'``
+
+    The triggers of models that are no longer tracked, or of all models in
+    other capture modes, are removed. Connected to ``post_migrate``.
+    """
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_proc WHERE proname = 'changelog_capture'"
+        )
+        if cursor.fetchone() is None:
+            logger.debug('Capture triggers have not been migrated')
+            return
+
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        cursor.execute(CAPTURE_TRIGGERS)
+        for table, in cursor.fetchall():
+            cursor.execute('DROP TRIGGER changelog_capture ON {}'.format(
+                table,
+            ))
+
+        if uses_triggers():
+            for sql in get_capture_triggers(using=using):
+                cursor.execute(sql)
+
+
+def configure_notify_trigger(using=DEFAULT_DB_ALIAS, **kwargs):
+    """Install the trigger notifying new logs if ``CHANGELOG_NOTIFY`` is set
+
+    Otherwise, the trigger is removed. Connected to ``post_migrate``.
+    """
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_proc WHERE proname = 'changelog_notify'"
+        )
+        if cursor.fetchone() is None:
+            logger.debug('Notifications have not been migrated')
+            return
+
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        cursor.execute(
+            'DROP TRIGGER IF EXISTS changelog_notify ON changelog_changelog'
+        )
+        if getattr(settings, NOTIFY_SETTING, False):
+            cursor.execute(NOTIFY_TRIGGER)
@@ -2,9 +2,12 @@ import logging
 
 from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections, router
 from django.db.utils import ProgrammingError
 
-from changelog.models import ChangeLog, ChangeSet
+from changelog.fields import normalize
+from changelog.models import ChangeLog, ChangeLogState
 
 
 logger = logging.getLogger(__name__)
@@ -14,8 +17,28 @@ TRACKED_MODELS_SETTING = 'CHANGELOG_TRACKED_FIELDS'
 __models = None
 
 
+def _get_attnames(model, fields):
+    """Return the attribute names of the given fields
+
+    Relations are tracked by their raw value (e.g. ``owner_id`` rather than
+    ``owner``), so tracking them never loads related objects.
+    """
+    attnames = []
+    for name in fields:
+        field = model._meta.get_field(name)
+        if not field.concrete or field.many_to_many:
+            raise ImproperlyConfigured(
+                'Field `{}.{}` cannot be tracked'.format(
+                    model._meta.label,
+                    name,
+                )
+            )
+        attnames.append(field.attname)
+    return tuple(attnames)
+
+
 def get_tracked_models():
-    """Return a dict of tracked models and fields"""
+    """Return a dict of tracked models and the attnames of their fields"""
     global __models
     if __models is None:
         if not hasattr(settings, TRACKED_MODELS_SETTING):
@@ -48,13 +71,187 @@ def get_tracked_models():
                 __models = None
                 return {}
 
-            __models[content_type.model_class()] = tuple(fields)
+            model_class = content_type.model_class()
+            __models[model_class] = _get_attnames(model_class, fields)
 
     return __models
 
 
-def create_sync_logs(model=None, queryset=None):
-    """Iterate through instances, creating sync ``ChangeLog``s"""
+def get_logged_values(instance, fields):
+    """Return the most recently logged value of each of ``fields``
+
+    Fields that have never been logged are not included in the result.
+    """
+    return get_latest_logged_values(
+        instance.__class__,
+        [instance.pk],
+        fields,
+    ).get(instance.pk, {})
+
+
+def get_latest_logged_values(model, pks, fields):
+    """Return the most recently logged values of ``fields`` for many objects
+
+    Values are read from ``ChangeLogState``, so this is an index lookup
+    however many logs the objects have.
+
+    :return: A dict of dicts of values by field, by pk. Objects and fields
+             that have never been logged are not included.
+    """
+    states = ChangeLogState.objects.filter(
+        content_type=ContentType.objects.get_for_model(model),
+        object_id__in=pks,
+    ).values_list('object_id', 'fields')
+
+    return {
+        pk: {
+            field: state[field]
+            for field in fields
+            if field in state
+        }
+        for pk, state in states
+    }
+
+
+STATES_AT = """
+WITH
+objects (pk) AS (
+    {objects}
+),
+checkpoint AS (
+    SELECT
+        objects.pk AS object_id,
+        latest.fields,
+        latest.last_log_id,
+        latest.created_at
+    FROM
+        objects
+        LEFT JOIN LATERAL (
+            SELECT
+                *
+            FROM
+                changelog_changelogcheckpoint AS checkpoint
+            WHERE
+                checkpoint.content_type_id = %s AND
+                checkpoint.object_id = objects.pk AND
+                checkpoint.created_at <= %s
+            ORDER BY
+                checkpoint.created_at DESC,
+                checkpoint.last_log_id DESC
+            LIMIT 1
+        ) AS latest ON true
+)
+SELECT
+    object_id,
+    NULL,
+    fields,
+    0
+FROM
+    checkpoint
+WHERE
+    last_log_id IS NOT NULL
+UNION ALL
+SELECT
+    log.object_id,
+    log.log_type,
+    log.fields,
+    log.id
+FROM
+    checkpoint
+    JOIN changelog_changelog AS log ON
+        log.content_type_id = %s AND
+        log.object_id = checkpoint.object_id AND
+        log.created_at <= %s AND (
+            checkpoint.last_log_id IS NULL OR (
+                log.created_at >= checkpoint.created_at AND
+                log.id > checkpoint.last_log_id
+            )
+        )
+ORDER BY
+    1,
+    4
+"""
+
+
+def _get_states_at(model, objects, params, when, using):
+    """Return the logged state of many objects as of ``when``
+
+    Each object's state is read from its latest ``ChangeLogCheckpoint``
+    written by ``when``, and the logs written after it and by ``when`` are
+    replayed on top. Checkpoints are written every few logs, so at most a
+    few logs are read per object, however long its history.
+
+    :param objects: SQL selecting the pks of the objects
+    """
+    content_type = ContentType.objects.db_manager(using).get_for_model(model)
+    sql = STATES_AT.format(objects=objects)
+    params = list(params) + [content_type.pk, when, content_type.pk, when]
+
+    states = {}
+    with connections[using].cursor() as cursor:
+        cursor.execute(sql, params)
+        for pk, log_type, fields, _ in cursor.fetchall():
+            if log_type is None:
+                # checkpoint
+                states[pk] = fields
+            elif log_type == ChangeLog.ON_DELETE:
+                states.pop(pk, None)
+            else:
+                states.setdefault(pk, {}).update(
+                    (field, entry['now'])
+                    for field, entry in fields.items()
+                    if 'now' in entry
+                )
+    return states
+
+
+def get_state_at(instance, when):
+    """Return the logged values of ``instance`` as of ``when``
+
+    :return: A dict of values by field, or None if the instance had not
+             been logged, or had been deleted, by ``when``
+    """
+    return _get_states_at(
+        instance.__class__,
+        'SELECT %s',
+        [instance.pk],
+        when,
+        instance._state.db or router.db_for_read(instance.__class__),
+    ).get(instance.pk)
+
+
+def get_states_at(queryset, when):
+    """Return the logged values of the objects of ``queryset`` as of ``when``
+
+    The states of all the objects are read with one query.
+
+    :return: A dict of dicts of values by field, by pk. Objects that had not
+             been logged, or had been deleted, by ``when`` are not included.
+    """
+    objects, params = queryset.values('pk').query.sql_with_params()
+    return _get_states_at(queryset.model, objects, params, when, queryset.db)
+
+
+def create_sync_logs(
+    model=None,
+    queryset=None,
+    chunk_size=1000,
+    after=None,
+    progress=None,
+):
+    """Create sync ``ChangeLog``s for instances that differ from their logs
+
+    Instances are read as rows of tracked values, in chunks of
+    ``chunk_size`` ordered by pk. For each chunk, the latest logged values
+    are found with one query, and the sync logs are written with one bulk
+    insert.
+
+    :param after: Only sync instances with a greater pk; pass the last pk
+                  passed to ``progress`` to resume an interrupted sync
+    :param progress: Called after each chunk with the number of instances
+                     synced and logs created so far, and the last pk synced
+    :return: The number of logs created
+    """
 
     if (
         (model is None and queryset is None) or
@@ -71,27 +268,52 @@ def create_sync_logs(model=None, queryset=None):
 
     if model not in config:
         raise ValueError(
-            'Model {} is not a tracked model'.format(model.__class__.__name__)
+            'Model {} is not a tracked model'.format(model._meta.label)
         )
 
-    for instance in queryset:
-        diff = {}
-        logged_diff = ChangeSet(instance=instance).diff
-
-        for field in config[model]:
-            value = getattr(instance, field)
-
-            if (
-                # field has not been logged
-                field not in logged_diff or
-                # value doesn't match most recent log
-                logged_diff[field]['now'] != value
-            ):
-                diff[field] = {'now': value}
-
-        if diff:
-            ChangeLog.objects.create(
-                instance=instance,
-                log_type=ChangeLog.ON_SYNC,
-                fields=diff,
-            )
+    fields = config[model]
+    content_type = ContentType.objects.get_for_model(model)
+    rows = queryset.order_by('pk').values_list('pk', *fields)
+
+    synced = logged = 0
+    while True:
+        chunk = rows if after is None else rows.filter(pk__gt=after)
+        chunk = list(chunk[:chunk_size])
+        if not chunk:
+            break
+
+        logged_values = get_latest_logged_values(
+            model,
+            [row[0] for row in chunk],
+            fields,
+        )
+
+        logs = []
+        for row in chunk:
+            pk, values = row[0], row[1:]
+            latest = logged_values.get(pk, {})
+
+            diff = {
+                field: {'now': value}
+                for field, value in zip(fields, values)
+                # field has not been logged, or value doesn't match most
+                # recent log
+                if field not in latest or latest[field] != normalize(value)
+            }
+            if diff:
+                logs.append(ChangeLog(
+                    content_type=content_type,
+                    object_id=pk,
+                    log_type=ChangeLog.ON_SYNC,
+                    fields=diff,
+                ))
+
+        ChangeLog.objects.bulk_create(logs)
+
+        after = chunk[-1][0]
+        synced += len(chunk)
+        logged += len(logs)
+        if progress is not None:
+            progress(synced, logged, after)
+
+    return logged
@@ -0,0 +1,300 @@
+import atexit
+from functools import partial
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.utils.six.moves import queue
+
+from changelog.models import ChangeLog
+
+
+logger = logging.getLogger(__name__)
+
+WRITER_SETTING = 'CHANGELOG_WRITER'
+BATCH_SIZE_SETTING = 'CHANGELOG_BATCH_SIZE'
+QUEUE_SIZE_SETTING = 'CHANGELOG_QUEUE_SIZE'
+QUEUE_FULL_SETTING = 'CHANGELOG_QUEUE_FULL'
+FLUSH_INTERVAL_SETTING = 'CHANGELOG_FLUSH_INTERVAL'
+
+IMMEDIATE = 'immediate'
+BATCHED = 'batched'
+ASYNC = 'async'
+
+BLOCK = 'block'
+DROP = 'drop'
+
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_QUEUE_SIZE = 10000
+DEFAULT_FLUSH_INTERVAL = 1.0
+SHUTDOWN_TIMEOUT = 10
+
+_stop = object()
+_async_writers = {}
+_async_writer_lock = threading.Lock()
+
+
+class LogBuffer(object):
+    """``ChangeLog``s waiting for the transaction that created them to commit
+
+    A buffer belongs to a single savepoint of a single connection, and is
+    registered with ``transaction.on_commit``. If the savepoint or the
+    transaction is rolled back, Django discards the callback and the buffer
+    along with it.
+    """
+
+    def __init__(self, using, batch_size):
+        self.using = using
+        self.batch_size = batch_size
+        self.logs = []
+
+    def __call__(self):
+        self.flush()
+
+    def add(self, log):
+        self.logs.append(log)
+
+        # cap memory for very large transactions. Rows written here are still
+        # inside the transaction, so they are rolled back along with it.
+        if len(self.logs) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.logs:
+            return
+
+        logs, self.logs = self.logs, []
+        ChangeLog.objects.using(self.using).bulk_create(
+            logs,
+            batch_size=self.batch_size,
+        )
+        logger.debug("Flushed {} buffered logs".format(len(logs)))
+
+
+def get_buffer(using):
+    """Return the ``LogBuffer`` for the current savepoint, creating it if
+    none is registered yet"""
+    connection = transaction.get_connection(using)
+    savepoint_ids = set(connection.savepoint_ids)
+
+    # ``run_on_commit`` only holds callbacks that are still live, so a buffer
+    # found here has not been rolled back.
+    for entry in reversed(connection.run_on_commit):
+        sids, func = entry[0], entry[1]
+        if isinstance(func, LogBuffer) and sids == savepoint_ids:
+            return func
+
+    buffer = LogBuffer(
+        using=using,
+        batch_size=getattr(settings, BATCH_SIZE_SETTING, DEFAULT_BATCH_SIZE),
+    )
+    transaction.on_commit(buffer, using=using)
+    return buffer
+
+
+class AsyncWriter(object):
+    """Write ``ChangeLog``s from a background thread
+
+    Logs are put on a bounded queue and drained by a worker thread, which
+    writes them with ``bulk_create`` on its own database connection. A batch
+    is written when it reaches ``batch_size``, or ``flush_interval`` seconds
+    after its first log was queued.
+
+    :param using: Database alias the worker writes to
+    :param queue_size: Maximum number of logs waiting to be written
+    :param batch_size: Maximum number of logs per ``INSERT``
+    :param flush_interval: Maximum seconds a log waits for its batch to fill
+    :param block: If true, ``put`` waits for room when the queue is full.
+                  Otherwise the log is dropped and counted in ``dropped``.
+    """
+
+    def __init__(
+        self,
+        using,
+        queue_size=DEFAULT_QUEUE_SIZE,
+        batch_size=DEFAULT_BATCH_SIZE,
+        flush_interval=DEFAULT_FLUSH_INTERVAL,
+        block=True,
+    ):
+        self.using = using
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.block = block
+        self.queue = queue.Queue(maxsize=queue_size)
+
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self._counter_lock = threading.Lock()
+        self._thread = None
+        self.pid = os.getpid()
+
+    @property
+    def depth(self):
+        """Approximate number of logs waiting to be written"""
+        return self.queue.qsize()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self.run,
+            name='changelog-writer',
+        )
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout=SHUTDOWN_TIMEOUT):
+        """Write all queued logs, then stop the worker thread"""
+        if not self.running:
+            return
+
+        self.queue.put(_stop)
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logger.warning(
+                "Writer did not drain within {} seconds; {} logs lost".format(
+                    timeout,
+                    self.depth,
+                )
+            )
+
+    def put(self, log):
+        if self.block:
+            self.queue.put(log)
+            return
+
+        try:
+            self.queue.put_nowait(log)
+        except queue.Full:
+            with self._counter_lock:
+                self.dropped += 1
+            logger.warning("Queue is full, dropped log: {}".format(repr(log)))
+
+    def run(self):
+        try:
+            stopping = False
+            while not stopping:
+                batch, stopping = self.get_batch()
+                if batch:
+                    self.write(batch)
+        finally:
+            connections[self.using].close()
+
+    def get_batch(self):
+        """Block until a batch is ready; return it and whether to stop"""
+        batch = []
+        log = self.queue.get()
+        deadline = time.time() + self.flush_interval
+
+        while log is not _stop:
+            batch.append(log)
+            if len(batch) >= self.batch_size:
+                return batch, False
+
+            timeout = deadline - time.time()
+            try:
+                if timeout > 0:
+                    log = self.queue.get(timeout=timeout)
+                else:
+                    log = self.queue.get_nowait()
+            except queue.Empty:
+                return batch, False
+
+        return batch, True
+
+    def write(self, batch):
+        try:
+            ChangeLog.objects.using(self.using).bulk_create(batch)
+        except Exception:
+            logger.exception("Failed to write {} logs".format(len(batch)))
+            with self._counter_lock:
+                self.failed += len(batch)
+            # the connection may be broken; reconnect for the next batch
+            connections[self.using].close()
+        else:
+            with self._counter_lock:
+                self.written += len(batch)
+
+
+def get_async_writer(using):
+    """Return the running ``AsyncWriter`` for ``using`` in this process,
+    starting it if needed"""
+    with _async_writer_lock:
+        writer = _async_writers.get(using)
+        # threads do not survive ``fork()``; the child needs its own worker
+        if writer is None or writer.pid != os.getpid():
+            writer = AsyncWriter(
+                using=using,
+                queue_size=getattr(
+                    settings,
+                    QUEUE_SIZE_SETTING,
+                    DEFAULT_QUEUE_SIZE,
+                ),
+                batch_size=getattr(
+                    settings,
+                    BATCH_SIZE_SETTING,
+                    DEFAULT_BATCH_SIZE,
+                ),
+                flush_interval=getattr(
+                    settings,
+                    FLUSH_INTERVAL_SETTING,
+                    DEFAULT_FLUSH_INTERVAL,
+                ),
+                block=getattr(settings, QUEUE_FULL_SETTING, BLOCK) != DROP,
+            )
+            writer.start()
+            _async_writers[using] = writer
+
+    return writer
+
+
+def stop_async_writer():
+    """Drain and stop the ``AsyncWriter``s of this process, if any"""
+    with _async_writer_lock:
+        stopping = list(_async_writers.values())
+        _async_writers.clear()
+
+    for writer in stopping:
+        if writer.pid == os.getpid():
+            writer.stop()
+
+
+atexit.register(stop_async_writer)
+
+
+def is_async():
+    return getattr(settings, WRITER_SETTING, IMMEDIATE) == ASYNC
+
+
+def write_log(log):
+    """Persist a new ``ChangeLog`` using the configured writer
+
+    :param log: An unsaved ``ChangeLog``
+    """
+    using = router.db_for_write(ChangeLog, instance=log)
+    writer = getattr(settings, WRITER_SETTING, IMMEDIATE)
+
+    if writer == ASYNC:
+        # only queue the log once the transaction that created it commits
+        transaction.on_commit(
+            partial(get_async_writer(using).put, log),
+            using=using,
+        )
+    elif (
+        writer == BATCHED and
+        transaction.get_connection(using).in_atomic_block
+    ):
+        get_buffer(using).add(log)
+    elif writer in (IMMEDIATE, BATCHED):
+        # outside of a transaction there is nothing to wait for
+        log.save(using=using)
+    else:
+        raise ValueError(
+            'Unknown value for `{}`: {}'.format(WRITER_SETTING, writer)
+        )
@@ -16,3 +16,13 @@ class TrackedModelFactory(factory.DjangoModelFactory):
 class UntrackedModelFactory(factory.DjangoModelFactory):
     class Meta:
         model = models.TrackedModel
+
+
+class TrackedRelationModelFactory(factory.DjangoModelFactory):
+    class Meta:
+        model = models.TrackedRelationModel
+
+
+class TrackedCounterModelFactory(factory.DjangoModelFactory):
+    class Meta:
+        model = models.TrackedCounterModel
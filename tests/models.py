@@ -7,5 +7,40 @@ class TrackedModel(models.Model):
     untracked_char = models.CharField(max_length=256)
 
 
+class ParentModel(models.Model):
+
+    parent_char = models.CharField(max_length=256, null=True)
+
+
+class TrackedChildModel(ParentModel):
+
+    child_char = models.CharField(max_length=256, null=True)
+
+
 class UntrackedModel(models.Model):
     pass
+
+
+class CharPrimaryKeyModel(models.Model):
+
+    id = models.CharField(max_length=32, primary_key=True)
+
+
+class TrackedRelationModel(models.Model):
+
+    owner = models.ForeignKey(
+        UntrackedModel,
+        on_delete=models.CASCADE,
+        null=True,
+    )
+
+
+class TrackedCounterModel(models.Model):
+
+    counter = models.IntegerField(default=0)
+
+
+class TrackedValuesModel(models.Model):
+
+    timestamp = models.DateTimeField(null=True)
+    amount = models.DecimalField(max_digits=10, decimal_places=2, null=True)
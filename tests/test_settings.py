@@ -47,7 +47,19 @@ DATABASES = {
         'PASSWORD': '',
         'PORT': '',
         'HOST': 'localhost',
-    }
+    },
+    # another alias for the same database
+    'other': {
+        'ENGINE': 'django.contrib.gis.db.backends.postgis',
+        'NAME': 'changelog',
+        'USER': 'postgres',
+        'PASSWORD': '',
+        'PORT': '',
+        'HOST': 'localhost',
+        'TEST': {
+            'MIRROR': 'default',
+        },
+    },
 }
 
 # Password validation
@@ -116,4 +128,18 @@ CHANGELOG_TRACKED_FIELDS = {
     'tests.TrackedModel': (
         'tracked_char',
     ),
+    'tests.TrackedChildModel': (
+        'parent_char',
+        'child_char',
+    ),
+    'tests.TrackedRelationModel': (
+        'owner',
+    ),
+    'tests.TrackedCounterModel': (
+        'counter',
+    ),
+    'tests.TrackedValuesModel': (
+        'timestamp',
+        'amount',
+    ),
 }
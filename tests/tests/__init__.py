@@ -7,4 +7,6 @@ class BaseTestCase(TestCase):
 
     def tearDown(self):
         models.TrackedModel.objects.all().delete()
+        models.TrackedRelationModel.objects.all().delete()
+        models.TrackedCounterModel.objects.all().delete()
         models.UntrackedModel.objects.all().delete()
@@ -0,0 +1,355 @@
+from datetime import datetime, timedelta
+import os
+import shutil
+import tempfile
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command, CommandError
+from django.db.models import F
+from django.test import override_settings
+from django.utils import timezone
+from django.utils.six import StringIO
+
+from changelog.archive import (
+    Archive,
+    ArchivedLog,
+    ArchiveWriter,
+    archive_logs,
+    get_archive_paths,
+    get_archived_logs,
+    open_archive,
+)
+from changelog.models import ChangeLog, ChangeSet
+from tests import factories
+from tests.models import TrackedModel
+from tests.tests import BaseTestCase
+
+
+class TemporaryDirectoryMixin(object):
+    def setUp(self):
+        super(TemporaryDirectoryMixin, self).setUp()
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        super(TemporaryDirectoryMixin, self).tearDown()
+
+
+class ArchiveFormatTestCase(TemporaryDirectoryMixin, BaseTestCase):
+    def setUp(self):
+        super(ArchiveFormatTestCase, self).setUp()
+        self.path = os.path.join(self.directory, 'test.archive')
+        self.start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+
+    def write(self, logs, block_rows=2):
+        with ArchiveWriter(self.path, block_rows=block_rows) as writer:
+            for log in logs:
+                writer.write(*log)
+
+    def log(self, pk, content_type, object_id, seconds, value):
+        return (
+            pk,
+            self.start + timedelta(seconds=seconds, microseconds=pk),
+            content_type,
+            object_id,
+            ChangeLog.ON_SAVE,
+            {'value': {'now': value}},
+        )
+
+    def test_round_trip(self):
+        logs = [
+            self.log(5, 'tests.a', 1, 0, 'a1'),
+            self.log(2, 'tests.a', 2, 0, 'a2'),
+            self.log(9, 'tests.a', 2, 60, 'a2 again'),
+            self.log(3, 'tests.a', 2, 120, 'a2 once more'),
+            self.log(1, 'tests.b', 1, 0, 'b1'),
+        ]
+        self.write(logs)
+
+        with Archive(self.path) as archive:
+            self.assertEqual(['tests.a', 'tests.b'], archive.content_types)
+            self.assertEqual(['value'], archive.fields)
+            self.assertEqual(
+                [
+                    ArchivedLog(pk, created_at, log_type, fields)
+                    for pk, created_at, _, _, log_type, fields in logs[1:4]
+                ],
+                archive.get_logs('tests.a', 2),
+            )
+            self.assertEqual(['b1'], [
+                log.fields['value']['now']
+                for log in archive.get_logs('tests.b', 1)
+            ])
+            self.assertEqual([], archive.get_logs('tests.b', 2))
+            self.assertEqual([], archive.get_logs('tests.c', 1))
+            self.assertEqual(self.start, archive.first_created_at.replace(
+                microsecond=0,
+            ))
+
+    def test_time_range(self):
+        self.write([
+            self.log(pk, 'tests.a', 1, pk * 60, str(pk))
+            for pk in range(1, 6)
+        ])
+
+        with Archive(self.path) as archive:
+            logs = archive.get_logs(
+                'tests.a',
+                1,
+                since=self.start + timedelta(minutes=2),
+                until=self.start + timedelta(minutes=4),
+            )
+        self.assertEqual([2, 3], [log.id for log in logs])
+
+    def test_unsorted(self):
+        with self.assertRaises(ValueError):
+            self.write([
+                self.log(1, 'tests.a', 2, 0, ''),
+                self.log(2, 'tests.a', 1, 0, ''),
+            ])
+        self.assertFalse(os.path.exists(self.path))
+
+        with self.assertRaises(ValueError):
+            self.write([
+                self.log(1, 'tests.a', 1, 0, ''),
+                self.log(2, 'tests.b', 1, 0, ''),
+                self.log(3, 'tests.a', 2, 0, ''),
+            ])
+
+    def test_not_an_archive(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'not an archive' * 10)
+
+        with self.assertRaises(ValueError):
+            Archive(self.path)
+
+    def test_open_archive(self):
+        self.write([self.log(1, 'tests.a', 1, 0, 'one')])
+        archive = open_archive(self.path)
+
+        self.assertIs(archive, open_archive(self.path))
+
+        # a replaced file is reopened
+        os.remove(self.path)
+        self.write([self.log(2, 'tests.a', 1, 0, 'two')])
+        self.assertIsNot(archive, open_archive(self.path))
+        self.assertEqual(
+            [{'value': {'now': 'two'}}],
+            [log.fields for log in open_archive(self.path).get_logs(
+                'tests.a',
+                1,
+            )],
+        )
+
+
+class ArchiveLogsTestCase(TemporaryDirectoryMixin, BaseTestCase):
+    def setUp(self):
+        super(ArchiveLogsTestCase, self).setUp()
+        self.instance = factories.TrackedModelFactory(tracked_char='first')
+        for value in ('second', 'third'):
+            self.instance.tracked_char = value
+            self.instance.save()
+        ChangeLog.objects.update(
+            created_at=F('created_at') - timedelta(days=100),
+        )
+        self.archived = list(ChangeLog.objects.order_by('id'))
+
+        self.instance.tracked_char = 'fourth'
+        self.instance.save()
+        self.cutoff = timezone.now() - timedelta(days=30)
+
+    def test_archive(self):
+        paths = archive_logs(self.cutoff, directory=self.directory)
+
+        self.assertEqual(1, len(paths))
+        self.assertEqual(paths, get_archive_paths(directory=self.directory))
+        self.assertEqual(3, ChangeLog.objects.count())
+        self.assertEqual(
+            [
+                (log.id, log.created_at, log.log_type, log.fields)
+                for log in self.archived
+            ],
+            [
+                tuple(log)
+                for log in get_archived_logs(
+                    ContentType.objects.get_for_model(self.instance),
+                    self.instance.pk,
+                    directory=self.directory,
+                )
+            ],
+        )
+
+    def test_delete(self):
+        archive_logs(
+            self.cutoff,
+            directory=self.directory,
+            delete=True,
+            chunk_size=1,
+        )
+
+        self.assertEqual(1, ChangeLog.objects.count())
+
+    def test_archived_months_are_skipped(self):
+        archive_logs(self.cutoff, directory=self.directory)
+
+        self.assertEqual(
+            [],
+            archive_logs(self.cutoff, directory=self.directory),
+        )
+        self.assertEqual(3, ChangeLog.objects.count())
+
+    def test_archived_months_are_merged(self):
+        archive_logs(self.cutoff, directory=self.directory)
+        other = factories.TrackedModelFactory(tracked_char='other')
+        other.tracked_char = 'late'
+        other.save()
+        ChangeLog.objects.filter(object_id=other.pk).update(
+            created_at=self.archived[0].created_at,
+        )
+
+        # logs archived but kept are only written once
+        self.assertEqual(1, len(archive_logs(
+            self.cutoff,
+            directory=self.directory,
+            delete=True,
+        )))
+        self.assertEqual(1, ChangeLog.objects.count())
+
+        self.instance.tracked_char = 'late'
+        self.instance.save()
+        late = ChangeLog.objects.latest('id')
+        ChangeLog.objects.filter(pk=late.pk).update(
+            created_at=self.archived[1].created_at + timedelta(seconds=1),
+        )
+        archive_logs(self.cutoff, directory=self.directory, delete=True)
+
+        self.assertEqual(1, ChangeLog.objects.count())
+        content_type = ContentType.objects.get_for_model(TrackedModel)
+        self.assertEqual(
+            [self.archived[0].pk, self.archived[1].pk, late.pk] + [
+                log.pk for log in self.archived[2:]
+            ],
+            [
+                log.id
+                for log in get_archived_logs(
+                    content_type,
+                    self.instance.pk,
+                    directory=self.directory,
+                )
+            ],
+        )
+        self.assertEqual(
+            [{'tracked_char': {'was': 'other', 'now': 'late'}}],
+            [
+                log.fields
+                for log in get_archived_logs(
+                    content_type,
+                    other.pk,
+                    directory=self.directory,
+                )
+            ],
+        )
+
+    def test_change_set(self):
+        archive_logs(self.cutoff, directory=self.directory, delete=True)
+
+        with override_settings(CHANGELOG_ARCHIVE_DIR=self.directory):
+            change_set = ChangeSet(instance=self.instance)
+            self.assertEqual(
+                {'tracked_char': {'was': 'first', 'now': 'fourth'}},
+                change_set.diff,
+            )
+            self.assertEqual(self.archived[0].pk, change_set.first.pk)
+            self.assertEqual(
+                ChangeLog.objects.get().pk,
+                change_set.last.pk,
+            )
+
+            self.assertEqual(
+                {'tracked_char': {'was': 'first', 'now': 'third'}},
+                ChangeSet(
+                    instance=self.instance,
+                    until=self.cutoff,
+                ).diff,
+            )
+
+            # bounded by a log in the database, no archive is read
+            self.assertEqual(
+                {'tracked_char': {'was': 'third', 'now': 'fourth'}},
+                ChangeSet(first=ChangeLog.objects.get()).diff,
+            )
+
+        self.assertEqual(
+            {'tracked_char': {'was': 'third', 'now': 'fourth'}},
+            ChangeSet(instance=self.instance).diff,
+        )
+
+    def test_change_set_with_logs_kept(self):
+        archive_logs(self.cutoff, directory=self.directory)
+
+        with override_settings(CHANGELOG_ARCHIVE_DIR=self.directory):
+            self.assertEqual(
+                {'tracked_char': {'was': 'first', 'now': 'fourth'}},
+                ChangeSet(instance=self.instance).diff,
+            )
+
+    def test_for_queryset(self):
+        other = factories.TrackedModelFactory(tracked_char='other')
+        other.tracked_char = 'archived'
+        other.save()
+        ChangeLog.objects.filter(object_id=other.pk).update(
+            created_at=F('created_at') - timedelta(days=100),
+        )
+        archive_logs(self.cutoff, directory=self.directory, delete=True)
+
+        with override_settings(CHANGELOG_ARCHIVE_DIR=self.directory):
+            self.assertEqual(
+                [
+                    (
+                        self.instance.pk,
+                        {'tracked_char': {'was': 'first', 'now': 'fourth'}},
+                    ),
+                    (
+                        other.pk,
+                        {'tracked_char': {'was': 'other', 'now': 'archived'}},
+                    ),
+                ],
+                list(ChangeSet.for_queryset(
+                    TrackedModel.objects.all(),
+                    chunk_size=1,
+                )),
+            )
+            self.assertEqual(
+                [(
+                    self.instance.pk,
+                    {'tracked_char': {'was': 'third', 'now': 'fourth'}},
+                )],
+                list(ChangeSet.for_queryset(
+                    TrackedModel.objects.all(),
+                    since=self.cutoff,
+                )),
+            )
+
+        self.assertEqual(
+            [(
+                self.instance.pk,
+                {'tracked_char': {'was': 'third', 'now': 'fourth'}},
+            )],
+            list(ChangeSet.for_queryset(TrackedModel.objects.all())),
+        )
+
+    def test_command(self):
+        out = StringIO()
+        call_command(
+            'changelog_archive',
+            '30',
+            directory=self.directory,
+            delete=True,
+            stdout=out,
+        )
+
+        self.assertIn('Archived 1 months', out.getvalue())
+        self.assertEqual(1, ChangeLog.objects.count())
+
+        with self.assertRaises(CommandError):
+            call_command('changelog_archive', '30')
@@ -0,0 +1,126 @@
+from django.contrib.contenttypes.models import ContentType
+from django.test import TransactionTestCase, override_settings
+
+from changelog import writers
+from changelog.models import ChangeLog
+from tests.models import TrackedModel, TrackedRelationModel, UntrackedModel
+from tests.tests import BaseTestCase
+
+
+class BulkCreateTestCase(BaseTestCase):
+    def test_bulk_create(self):
+        instances = TrackedModel.objects.bulk_create([
+            TrackedModel(tracked_char='first', untracked_char='x'),
+            TrackedModel(tracked_char='second', untracked_char='x'),
+        ])
+
+        self.assertEqual(
+            [
+                (instances[0].pk, {'tracked_char': {'now': 'first'}}),
+                (instances[1].pk, {'tracked_char': {'now': 'second'}}),
+            ],
+            [
+                (log.object_id, log.fields)
+                for log in ChangeLog.objects.order_by('object_id')
+            ],
+        )
+        self.assertEqual(
+            {ChangeLog.ON_SAVE},
+            set(ChangeLog.objects.values_list('log_type', flat=True)),
+        )
+
+    def test_batched_insert_returns_pks(self):
+        objs = [
+            TrackedModel(tracked_char=str(i), untracked_char='x')
+            for i in range(3)
+        ]
+        fields = [
+            field for field in TrackedModel._meta.concrete_fields
+            if field.name != 'id'
+        ]
+
+        pks = TrackedModel.objects.all()._batched_insert(objs, fields, 2)
+
+        self.assertEqual([obj.pk for obj in objs], pks)
+        self.assertEqual(
+            ['0', '1', '2'],
+            [
+                TrackedModel.objects.get(pk=pk).tracked_char
+                for pk in pks
+            ],
+        )
+        self.assertEqual(
+            [],
+            TrackedModel.objects.all()._batched_insert([], fields, None),
+        )
+
+    def test_pks_set(self):
+        instances = TrackedModel.objects.bulk_create([
+            TrackedModel(tracked_char='first', untracked_char='x'),
+            TrackedModel(tracked_char='second', untracked_char='x'),
+        ])
+
+        self.assertEqual(
+            ['first', 'second'],
+            [
+                TrackedModel.objects.get(pk=instance.pk).tracked_char
+                for instance in instances
+            ],
+        )
+
+    def test_relation(self):
+        owner = UntrackedModel.objects.create()
+
+        TrackedRelationModel.objects.bulk_create([
+            TrackedRelationModel(owner=owner),
+        ])
+
+        self.assertEqual(
+            {'owner_id': {'now': owner.pk}},
+            ChangeLog.objects.get().fields,
+        )
+
+    def test_batch_size(self):
+        ContentType.objects.get_for_model(TrackedModel)
+
+        # one query per batch; logs are inserted by the same query
+        with self.assertNumQueries(3):
+            TrackedModel.objects.bulk_create(
+                [
+                    TrackedModel(tracked_char=str(i), untracked_char='x')
+                    for i in range(5)
+                ],
+                batch_size=2,
+            )
+
+        self.assertEqual(
+            5,
+            ChangeLog.objects.count(),
+        )
+
+    def test_untracked(self):
+        UntrackedModel.objects.bulk_create([UntrackedModel()])
+
+        self.assertEqual(
+            0,
+            ChangeLog.objects.count(),
+        )
+
+
+@override_settings(CHANGELOG_WRITER='async')
+class AsyncBulkCreateTestCase(TransactionTestCase):
+    def tearDown(self):
+        writers.stop_async_writer()
+
+    def test_bulk_create(self):
+        instances = TrackedModel.objects.bulk_create([
+            TrackedModel(tracked_char='first', untracked_char='x'),
+        ])
+        writers.stop_async_writer()
+
+        log = ChangeLog.objects.get()
+        self.assertEqual(instances[0].pk, log.object_id)
+        self.assertEqual(
+            {'tracked_char': {'now': 'first'}},
+            log.fields,
+        )
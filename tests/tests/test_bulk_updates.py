@@ -1,6 +1,11 @@
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import QuerySet
+from django.db.models.functions import Upper
+
+from changelog.managers import ChangeLogQuerySet, get_queryset_class
 from changelog.models import ChangeLog
 from tests import factories
-from tests.models import TrackedModel
+from tests.models import TrackedChildModel, TrackedModel, UntrackedModel
 from tests.tests import BaseTestCase
 
 
@@ -43,3 +48,150 @@ class BulkUpdateTestCase(BaseTestCase):
             self.tracked[0],
             log.instance,
         )
+
+    def test_update_chained(self):
+        TrackedModel.objects.exclude(
+            id=self.tracked[0].id
+        ).order_by('-id').filter(
+            untracked_char=self.tracked[1].untracked_char,
+        ).update(tracked_char='asdf')
+
+        self.assertEqual(
+            [self.tracked[1].id],
+            list(ChangeLog.objects.values_list('object_id', flat=True)),
+        )
+
+    def test_update_untracked(self):
+        TrackedModel.objects.update(untracked_char='asdf')
+
+        self.assertEqual(
+            0,
+            ChangeLog.objects.count(),
+        )
+
+    def test_queryset_class(self):
+        self.assertIsInstance(
+            TrackedModel.objects.filter(id=1).order_by('id'),
+            ChangeLogQuerySet,
+        )
+        self.assertNotIsInstance(
+            UntrackedModel.objects.all(),
+            ChangeLogQuerySet,
+        )
+
+    def test_custom_queryset_class(self):
+        class CustomQuerySet(QuerySet):
+            pass
+
+        queryset_class = get_queryset_class(CustomQuerySet)
+
+        self.assertTrue(issubclass(queryset_class, ChangeLogQuerySet))
+        self.assertTrue(issubclass(queryset_class, CustomQuerySet))
+        self.assertIs(queryset_class, get_queryset_class(queryset_class))
+
+    def test_update_was(self):
+        TrackedModel.objects.filter(
+            id=self.tracked[0].id
+        ).update(tracked_char='asdf')
+
+        self.assertEqual(
+            {
+                'tracked_char': {
+                    'was': self.tracked[0].tracked_char,
+                    'now': 'asdf',
+                },
+            },
+            ChangeLog.objects.get().fields,
+        )
+
+    def test_update_unchanged(self):
+        TrackedModel.objects.filter(
+            id=self.tracked[0].id
+        ).update(tracked_char='asdf')
+
+        num_rows_updated = TrackedModel.objects.update(tracked_char='asdf')
+
+        self.assertEqual(3, num_rows_updated)
+        self.assertEqual(
+            3,
+            ChangeLog.objects.count(),
+        )
+
+    def test_update_filtered_by_updated_field(self):
+        TrackedModel.objects.filter(
+            tracked_char=self.tracked[0].tracked_char,
+        ).update(tracked_char='asdf')
+
+        self.assertEqual(
+            self.tracked[0].id,
+            ChangeLog.objects.get().object_id,
+        )
+
+    def test_update_num_queries(self):
+        ContentType.objects.get_for_model(TrackedModel)
+
+        with self.assertNumQueries(1):
+            TrackedModel.objects.filter(
+                id__in=[x.id for x in self.tracked],
+            ).update(tracked_char='asdf', untracked_char='asdf')
+
+        self.assertEqual(
+            3,
+            ChangeLog.objects.count(),
+        )
+
+
+class MultiTableUpdateTestCase(BaseTestCase):
+    def setUp(self):
+        self.instances = [
+            TrackedChildModel.objects.create(
+                parent_char='parent {}'.format(i),
+                child_char='child',
+            )
+            for i in range(3)
+        ]
+        ContentType.objects.get_for_model(TrackedChildModel)
+
+    def get_fields(self):
+        return [
+            (log.object_id, log.fields)
+            for log in ChangeLog.objects.order_by('object_id')
+        ]
+
+    def test_update_parent_field(self):
+        num_rows_updated = TrackedChildModel.objects.filter(
+            pk__in=[self.instances[0].pk, self.instances[1].pk],
+        ).update(parent_char='parent 1', child_char='new child')
+
+        self.assertEqual(2, num_rows_updated)
+        self.assertEqual(
+            [
+                (self.instances[0].pk, {
+                    'parent_char': {'was': 'parent 0', 'now': 'parent 1'},
+                    'child_char': {'was': 'child', 'now': 'new child'},
+                }),
+                (self.instances[1].pk, {
+                    'child_char': {'was': 'child', 'now': 'new child'},
+                }),
+            ],
+            self.get_fields(),
+        )
+
+    def test_update_filtered_by_updated_field(self):
+        TrackedChildModel.objects.filter(
+            parent_char='parent 0',
+        ).update(parent_char=Upper('parent_char'))
+
+        self.assertEqual(
+            [(self.instances[0].pk, {
+                'parent_char': {'was': 'parent 0', 'now': 'PARENT 0'},
+            })],
+            self.get_fields(),
+        )
+
+    def test_update_num_queries(self):
+        # copy the previous values, update both tables, log, drop the copy
+        with self.assertNumQueries(6):
+            TrackedChildModel.objects.update(parent_char='new parent')
+
+        self.assertEqual(3, ChangeLog.objects.count())
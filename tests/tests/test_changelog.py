@@ -1,6 +1,9 @@
 from __future__ import absolute_import
 
+from django.db.models import signals
+
 from tests import factories
+from tests.models import TrackedModel, UntrackedModel
 from tests.tests import BaseTestCase
 from changelog.models import ChangeLog
 
@@ -64,3 +67,10 @@ class ChangeLogTestCase(BaseTestCase):
                 }
             }
         )
+
+    def test_receivers_connected_per_model(self):
+        self.assertTrue(signals.post_init.has_listeners(TrackedModel))
+        self.assertTrue(signals.post_save.has_listeners(TrackedModel))
+
+        self.assertFalse(signals.post_init.has_listeners(UntrackedModel))
+        self.assertFalse(signals.post_save.has_listeners(UntrackedModel))
@@ -1,8 +1,10 @@
 from __future__ import absolute_import
 
 from django.contrib.contenttypes.models import ContentType
+from django.db import connection
 
 from tests import factories
+from tests.models import TrackedCounterModel, TrackedModel
 from tests.tests import BaseTestCase
 from changelog.models import ChangeLog, ChangeSet
 
@@ -170,3 +172,171 @@ class ChangeSetTestCase(BaseTestCase):
             {},
             x.diff,
         )
+
+    def test_num_queries(self):
+        with self.assertNumQueries(0):
+            x = ChangeSet(instance=self.tracked)
+
+        with self.assertNumQueries(1):
+            x.first
+            x.last
+            x.diff
+
+        self.assertEqual(self.logs[0], x.first)
+        self.assertEqual(self.logs[-1], x.last)
+
+    def test_num_queries_subset(self):
+        with self.assertNumQueries(1):
+            x = ChangeSet(
+                first=self.logs[1],
+                last=self.logs[3],
+            )
+            x.diff
+
+    def test_num_queries_no_logs(self):
+        x = ChangeSet(
+            instance=factories.TrackedModelFactory()
+        )
+
+        with self.assertNumQueries(1):
+            self.assertIsNone(x.first)
+            self.assertIsNone(x.last)
+            self.assertEqual({}, x.diff)
+
+    def test_diff_integer_field(self):
+        factories.TrackedCounterModelFactory()
+        instance = TrackedCounterModel.objects.get()
+        instance.counter = 1
+        instance.save()
+        instance.counter = 2
+        instance.save()
+
+        x = ChangeSet(instance=instance)
+
+        self.assertEqual(
+            {'counter': {'was': 0, 'now': 2}},
+            x.diff,
+        )
+
+
+class ForQuerySetTestCase(BaseTestCase):
+    def setUp(self):
+        self.tracked = []
+        for i in range(3):
+            instance = factories.TrackedModelFactory(tracked_char='first')
+            instance.tracked_char = 'second'
+            instance.save()
+            instance.tracked_char = 'third'
+            instance.save()
+            self.tracked.append(instance)
+
+        self.unchanged = factories.TrackedModelFactory()
+
+    def test_for_queryset(self):
+        expected = {
+            instance.pk: {
+                'tracked_char': {
+                    'was': 'first',
+                    'now': 'third',
+                },
+            }
+            for instance in self.tracked
+        }
+
+        self.assertEqual(
+            expected,
+            dict(ChangeSet.for_queryset(TrackedModel.objects.all())),
+        )
+
+    def test_matches_changeset(self):
+        for pk, diff in ChangeSet.for_queryset(TrackedModel.objects.all()):
+            self.assertEqual(
+                ChangeSet(instance=TrackedModel(pk=pk)).diff,
+                diff,
+            )
+
+    def test_filtered(self):
+        self.assertEqual(
+            [self.tracked[1].pk],
+            [
+                pk for pk, diff in ChangeSet.for_queryset(
+                    TrackedModel.objects.filter(pk=self.tracked[1].pk),
+                )
+            ],
+        )
+
+    def test_since(self):
+        log = ChangeLog.objects.filter(
+            object_id=self.tracked[0].pk,
+        ).order_by('created_at').last()
+
+        self.assertEqual(
+            {
+                self.tracked[0].pk: {
+                    'tracked_char': {
+                        'was': 'second',
+                        'now': 'third',
+                    },
+                },
+            },
+            dict(ChangeSet.for_queryset(
+                TrackedModel.objects.filter(pk=self.tracked[0].pk),
+                since=log.created_at,
+            )),
+        )
+
+    def test_until(self):
+        log = ChangeLog.objects.filter(
+            object_id=self.tracked[0].pk,
+        ).order_by('created_at').first()
+
+        self.assertEqual(
+            {
+                self.tracked[0].pk: {
+                    'tracked_char': {
+                        'was': 'first',
+                        'now': 'second',
+                    },
+                },
+            },
+            dict(ChangeSet.for_queryset(
+                TrackedModel.objects.filter(pk=self.tracked[0].pk),
+                until=log.created_at,
+            )),
+        )
+
+    def test_num_queries(self):
+        ContentType.objects.get_for_model(TrackedModel)
+
+        # a chunk of pks, then their diffs
+        with self.assertNumQueries(2):
+            diffs = list(ChangeSet.for_queryset(TrackedModel.objects.all()))
+
+        self.assertEqual(3, len(diffs))
+
+    def test_chunks(self):
+        self.assertEqual(
+            list(ChangeSet.for_queryset(TrackedModel.objects.all())),
+            list(ChangeSet.for_queryset(
+                TrackedModel.objects.all(),
+                chunk_size=2,
+            )),
+        )
+
+    def test_partial_consumption(self):
+        diffs = ChangeSet.for_queryset(
+            TrackedModel.objects.all(),
+            chunk_size=1,
+        )
+        pk, _ = next(diffs)
+
+        # nothing is left open between iterations
+        with connection.cursor() as c:
+            c.execute('SELECT count(*) FROM pg_cursors')
+            self.assertEqual(0, c.fetchone()[0])
+
+        TrackedModel.objects.filter(pk=pk).update(tracked_char='fourth')
+        self.assertEqual(
+            [instance.pk for instance in self.tracked[1:]],
+            [pk for pk, _ in diffs],
+        )
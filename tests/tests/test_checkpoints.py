@@ -0,0 +1,140 @@
+from datetime import timedelta
+
+from django.contrib.contenttypes.models import ContentType
+from django.test import override_settings
+
+from changelog.models import ChangeLog, ChangeLogCheckpoint, ChangeLogState
+from changelog.triggers import configure_state_trigger
+from changelog.utils import get_state_at, get_states_at
+from tests import factories
+from tests.models import TrackedModel
+from tests.tests import BaseTestCase
+
+
+class CheckpointTestCase(BaseTestCase):
+    def setUp(self):
+        with override_settings(CHANGELOG_CHECKPOINT_LOGS=3):
+            configure_state_trigger()
+
+        self.instance = factories.TrackedModelFactory(tracked_char='0')
+        self.content_type = ContentType.objects.get_for_model(TrackedModel)
+
+    def save(self, value):
+        self.instance.tracked_char = value
+        self.instance.save()
+        return ChangeLog.objects.latest('id').created_at
+
+    def test_checkpoint_every_n_logs(self):
+        self.save('1')
+        self.save('2')
+        self.assertEqual(0, ChangeLogCheckpoint.objects.count())
+
+        self.save('3')
+        checkpoint = ChangeLogCheckpoint.objects.get()
+        log = ChangeLog.objects.latest('id')
+        self.assertEqual(self.content_type, checkpoint.content_type)
+        self.assertEqual(self.instance.pk, checkpoint.object_id)
+        self.assertEqual({'tracked_char': '3'}, checkpoint.fields)
+        self.assertEqual(log.pk, checkpoint.last_log_id)
+        self.assertEqual(log.created_at, checkpoint.created_at)
+
+        state = ChangeLogState.objects.get(object_id=self.instance.pk)
+        self.assertEqual(0, state.checkpoint_logs)
+        self.assertEqual(log.created_at, state.checkpointed_at)
+
+        for value in ('4', '5', '6'):
+            self.save(value)
+        self.assertEqual(2, ChangeLogCheckpoint.objects.count())
+
+    def test_checkpoint_every_n_days(self):
+        with override_settings(CHANGELOG_CHECKPOINT_DAYS=1):
+            configure_state_trigger()
+
+        self.save('1')
+        state = ChangeLogState.objects.get(object_id=self.instance.pk)
+        state.checkpointed_at -= timedelta(days=1)
+        state.save()
+
+        self.save('2')
+        self.assertEqual(
+            {'tracked_char': '2'},
+            ChangeLogCheckpoint.objects.get().fields,
+        )
+
+    def test_state_at(self):
+        times = [self.save(str(value)) for value in range(1, 11)]
+
+        self.assertEqual(3, ChangeLogCheckpoint.objects.count())
+        for value, when in enumerate(times, 1):
+            self.assertEqual(
+                {'tracked_char': str(value)},
+                get_state_at(self.instance, when),
+            )
+            self.assertEqual(
+                {'tracked_char': str(value)},
+                get_state_at(self.instance, when + timedelta(microseconds=1)),
+            )
+
+    def test_state_at_replays_from_checkpoint(self):
+        for value in ('1', '2', '3'):
+            when = self.save(value)
+
+        # logs before the checkpoint aren't read
+        checkpoint = ChangeLogCheckpoint.objects.get()
+        ChangeLog.objects.filter(pk__lte=checkpoint.last_log_id).delete()
+
+        self.assertEqual(
+            {'tracked_char': '3'},
+            get_state_at(self.instance, when),
+        )
+
+    def test_state_before_first_log(self):
+        when = self.save('1')
+
+        self.assertIsNone(
+            get_state_at(self.instance, when - timedelta(microseconds=1)),
+        )
+
+    def test_state_after_delete(self):
+        for value in ('1', '2', '3'):
+            when = self.save(value)
+        pk = self.instance.pk
+        self.instance.delete()
+        deleted_at = ChangeLog.objects.latest('id').created_at
+
+        instance = TrackedModel(pk=pk)
+        self.assertEqual({'tracked_char': '3'}, get_state_at(instance, when))
+        self.assertIsNone(get_state_at(instance, deleted_at))
+
+    def test_states_at(self):
+        other = factories.TrackedModelFactory(tracked_char='other')
+        other.tracked_char = 'changed'
+        other.save()
+        for value in ('1', '2', '3', '4'):
+            when = self.save(value)
+        self.save('5')
+
+        with self.assertNumQueries(1):
+            states = get_states_at(TrackedModel.objects.all(), when)
+
+        self.assertEqual(
+            {
+                self.instance.pk: {'tracked_char': '4'},
+                other.pk: {'tracked_char': 'changed'},
+            },
+            states,
+        )
+
+    def test_states_at_filtered_queryset(self):
+        other = factories.TrackedModelFactory(tracked_char='other')
+        other.tracked_char = 'changed'
+        other.save()
+        when = self.save('1')
+
+        self.assertEqual(
+            {self.instance.pk: {'tracked_char': '1'}},
+            get_states_at(
+                TrackedModel.objects.filter(pk=self.instance.pk),
+                when,
+            ),
+        )
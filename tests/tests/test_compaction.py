@@ -0,0 +1,164 @@
+from datetime import timedelta
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command
+from django.db.models import F
+from django.utils import timezone
+from django.utils.six import StringIO
+
+from changelog.compaction import compact_logs
+from changelog.models import ChangeLog, ChangeSet
+from changelog.utils import get_state_at
+from tests import factories
+from tests.models import TrackedCounterModel, TrackedModel
+from tests.tests import BaseTestCase
+
+
+class CompactionTestCase(BaseTestCase):
+    def setUp(self):
+        self.instance = factories.TrackedModelFactory(tracked_char='first')
+        self.cutoff = timezone.now() - timedelta(days=90)
+
+    def save(self, instance, value):
+        instance.tracked_char = value
+        instance.save()
+
+    def age(self, logs, days=100):
+        logs.update(created_at=F('created_at') - timedelta(days=days))
+
+    def get_logs(self):
+        return [
+            (log.log_type, log.fields)
+            for log in ChangeLog.objects.order_by('created_at', 'id')
+        ]
+
+    def test_compact(self):
+        for value in ('second', 'third', 'fourth'):
+            self.save(self.instance, value)
+        self.age(ChangeLog.objects.all())
+        last = ChangeLog.objects.latest('id')
+
+        self.assertEqual(2, compact_logs(self.cutoff))
+
+        log = ChangeLog.objects.get()
+        self.assertEqual(last.pk, log.pk)
+        self.assertEqual(last.created_at, log.created_at)
+        self.assertEqual(
+            {'tracked_char': {'was': 'first', 'now': 'fourth'}},
+            log.fields,
+        )
+
+    def test_recent_logs_are_kept(self):
+        for value in ('second', 'third'):
+            self.save(self.instance, value)
+        self.age(ChangeLog.objects.all())
+        for value in ('fourth', 'fifth'):
+            self.save(self.instance, value)
+        diff = ChangeSet(instance=self.instance).diff
+
+        compact_logs(self.cutoff)
+
+        self.assertEqual(
+            [
+                (0, {'tracked_char': {'was': 'first', 'now': 'third'}}),
+                (0, {'tracked_char': {'was': 'third', 'now': 'fourth'}}),
+                (0, {'tracked_char': {'was': 'fourth', 'now': 'fifth'}}),
+            ],
+            self.get_logs(),
+        )
+        self.assertEqual(diff, ChangeSet(instance=self.instance).diff)
+        self.assertEqual(
+            {'tracked_char': 'fifth'},
+            get_state_at(self.instance, timezone.now()),
+        )
+
+    def test_deletes_split_runs(self):
+        content_type = ContentType.objects.get_for_model(TrackedModel)
+        pk = self.instance.pk
+        for value in ('second', 'third'):
+            self.save(self.instance, value)
+        self.instance.delete()
+        for value in ('a', 'b'):
+            ChangeLog.objects.create(
+                content_type=content_type,
+                object_id=pk,
+                fields={'tracked_char': {'now': value}},
+            )
+        self.age(ChangeLog.objects.all())
+
+        self.assertEqual(2, compact_logs(self.cutoff))
+        self.assertEqual(
+            [
+                (0, {'tracked_char': {'was': 'first', 'now': 'third'}}),
+                (3, {'tracked_char': {'was': 'third'}}),
+                (0, {'tracked_char': {'now': 'b'}}),
+            ],
+            self.get_logs(),
+        )
+
+    def test_fields_are_folded_separately(self):
+        instance = factories.TrackedCounterModelFactory(counter=1)
+        TrackedCounterModel.objects.update(counter=F('counter') + 1)
+        self.save(self.instance, 'second')
+        instance.counter = 5
+        instance.save()
+        self.age(ChangeLog.objects.all())
+
+        compact_logs(self.cutoff)
+
+        self.assertEqual(
+            {'counter': {'was': 1, 'now': 5}},
+            ChangeLog.objects.get(object_id=instance.pk).fields,
+        )
+
+    def test_models(self):
+        instance = factories.TrackedCounterModelFactory(counter=1)
+        for value in (2, 3):
+            instance.counter = value
+            instance.save()
+        for value in ('second', 'third'):
+            self.save(self.instance, value)
+        self.age(ChangeLog.objects.all())
+
+        self.assertEqual(1, compact_logs(self.cutoff, models=[TrackedModel]))
+        self.assertEqual(3, ChangeLog.objects.count())
+
+    def test_batches(self):
+        instances = [self.instance] + [
+            factories.TrackedModelFactory(tracked_char='first')
+            for _ in range(4)
+        ]
+        for instance in instances:
+            for value in ('second', 'third'):
+                self.save(instance, value)
+        self.age(ChangeLog.objects.all())
+
+        batches = []
+        compact_logs(
+            self.cutoff,
+            batch_size=2,
+            progress=lambda *args: batches.append(args),
+        )
+
+        self.assertEqual([(2, 2), (4, 4), (5, 5)], batches)
+        self.assertEqual(5, ChangeLog.objects.count())
+
+    def test_compacted_logs_are_not_compacted_again(self):
+        for value in ('second', 'third'):
+            self.save(self.instance, value)
+        self.age(ChangeLog.objects.all())
+        compact_logs(self.cutoff)
+
+        self.assertEqual(0, compact_logs(self.cutoff))
+        self.assertEqual(1, ChangeLog.objects.count())
+
+    def test_command(self):
+        for value in ('second', 'third'):
+            self.save(self.instance, value)
+        self.age(ChangeLog.objects.all())
+
+        out = StringIO()
+        call_command('changelog_compact', days=90, stdout=out)
+
+        self.assertIn('Removed 1 logs', out.getvalue())
+        self.assertEqual(1, ChangeLog.objects.count())
@@ -0,0 +1,130 @@
+from __future__ import absolute_import
+
+from django.test import override_settings
+
+from tests import factories
+from tests.models import TrackedModel
+from tests.tests import BaseTestCase
+from changelog.models import ChangeLog
+
+
+class DeferredFieldsTestCase(BaseTestCase):
+    def setUp(self):
+        self.instance = factories.TrackedModelFactory(
+            tracked_char='initial value',
+        )
+
+    def test_only_pk(self):
+        factories.TrackedModelFactory()
+
+        with self.assertNumQueries(1):
+            instances = list(TrackedModel.objects.only('id'))
+
+        self.assertEqual(2, len(instances))
+
+    def test_save_without_loading(self):
+        instance = TrackedModel.objects.defer('tracked_char').get()
+        instance.untracked_char = 'new value'
+
+        with self.assertNumQueries(1):
+            instance.save()
+
+        self.assertEqual(
+            0,
+            ChangeLog.objects.count(),
+        )
+
+    def test_loaded_later(self):
+        instance = TrackedModel.objects.defer('tracked_char').get()
+
+        # loads the field, which becomes its initial value
+        self.assertEqual('initial value', instance.tracked_char)
+
+        instance.tracked_char = 'new value'
+        instance.save()
+
+        self.assertEqual(
+            {
+                'tracked_char': {
+                    'was': 'initial value',
+                    'now': 'new value',
+                },
+            },
+            ChangeLog.objects.get().fields,
+        )
+
+    def test_set_without_loading(self):
+        instance = TrackedModel.objects.defer('tracked_char').get()
+        instance.tracked_char = 'new value'
+        instance.save()
+
+        self.assertEqual(
+            {
+                'tracked_char': {
+                    'now': 'new value',
+                },
+            },
+            ChangeLog.objects.get().fields,
+        )
+
+    def test_refresh_from_db(self):
+        TrackedModel.objects.update(tracked_char='updated value')
+        self.instance.refresh_from_db()
+
+        self.instance.tracked_char = 'new value'
+        self.instance.save()
+
+        log = ChangeLog.objects.order_by('-created_at').first()
+        self.assertEqual(
+            {
+                'tracked_char': {
+                    'was': 'updated value',
+                    'now': 'new value',
+                },
+            },
+            log.fields,
+        )
+
+    @override_settings(CHANGELOG_CAPTURE='digest')
+    def test_digest(self):
+        instance = TrackedModel.objects.defer('tracked_char').get()
+        self.assertEqual('initial value', instance.tracked_char)
+
+        instance.tracked_char = 'new value'
+        instance.save()
+
+        self.assertEqual(
+            {
+                'tracked_char': {
+                    'was': 'initial value',
+                    'now': 'new value',
+                },
+            },
+            ChangeLog.objects.get().fields,
+        )
+
+
+class UpdateFieldsTestCase(BaseTestCase):
+    def test_tracked_field_not_saved(self):
+        x = factories.TrackedModelFactory(tracked_char='initial value')
+        x.tracked_char = 'new value'
+        x.untracked_char = 'new value'
+        x.save(update_fields=['untracked_char'])
+
+        self.assertEqual(
+            0,
+            ChangeLog.objects.count(),
+        )
+
+        # the unsaved change is still pending
+        x.save(update_fields=['tracked_char'])
+
+        self.assertEqual(
+            {
+                'tracked_char': {
+                    'was': 'initial value',
+                    'now': 'new value',
+                },
+            },
+            ChangeLog.objects.get().fields,
+        )
@@ -0,0 +1,127 @@
+from django.contrib.contenttypes.models import ContentType
+from django.test import TransactionTestCase, override_settings
+
+from changelog import writers
+from changelog.models import ChangeLog, ChangeSet
+from tests import factories
+from tests.models import TrackedModel, TrackedRelationModel, UntrackedModel
+from tests.tests import BaseTestCase
+
+
+class DeleteTestCase(BaseTestCase):
+    def setUp(self):
+        self.tracked = [
+            factories.TrackedModelFactory(tracked_char='first'),
+            factories.TrackedModelFactory(tracked_char='second'),
+            factories.TrackedModelFactory(tracked_char='third'),
+        ]
+
+    def test_instance_delete(self):
+        pk = self.tracked[0].pk
+        self.tracked[0].delete()
+
+        log = ChangeLog.objects.get()
+        self.assertEqual(ChangeLog.ON_DELETE, log.log_type)
+        self.assertEqual(pk, log.object_id)
+        self.assertEqual(
+            {'tracked_char': {'was': 'first'}},
+            log.fields,
+        )
+
+    def test_instance_delete_logs_saved_values(self):
+        self.tracked[0].tracked_char = 'not saved'
+        self.tracked[0].delete()
+
+        self.assertEqual(
+            {'tracked_char': {'was': 'first'}},
+            ChangeLog.objects.get().fields,
+        )
+
+    def test_deferred_instance_delete(self):
+        instance = TrackedModel.objects.defer('tracked_char').get(
+            pk=self.tracked[0].pk,
+        )
+        instance.delete()
+
+        self.assertEqual(
+            {'tracked_char': {'was': 'first'}},
+            ChangeLog.objects.get().fields,
+        )
+
+    def test_queryset_delete(self):
+        TrackedModel.objects.exclude(pk=self.tracked[0].pk).delete()
+
+        self.assertEqual(
+            [
+                (self.tracked[1].pk, {'tracked_char': {'was': 'second'}}),
+                (self.tracked[2].pk, {'tracked_char': {'was': 'third'}}),
+            ],
+            [
+                (log.object_id, log.fields)
+                for log in ChangeLog.objects.filter(
+                    log_type=ChangeLog.ON_DELETE,
+                ).order_by('object_id')
+            ],
+        )
+        self.assertEqual(1, TrackedModel.objects.count())
+
+    def test_queryset_delete_num_queries(self):
+        ContentType.objects.get_for_model(TrackedModel)
+
+        # INSERT ... SELECT, then a fast DELETE
+        with self.assertNumQueries(2):
+            TrackedModel.objects.all().delete()
+
+        self.assertEqual(
+            3,
+            ChangeLog.objects.count(),
+        )
+
+    def test_untracked_delete(self):
+        UntrackedModel.objects.create().delete()
+
+        self.assertEqual(
+            0,
+            ChangeLog.objects.count(),
+        )
+
+    def test_relation(self):
+        owner = UntrackedModel.objects.create()
+        instance = TrackedRelationModel.objects.create(owner=owner)
+        instance.delete()
+
+        self.assertEqual(
+            {'owner_id': {'was': owner.pk}},
+            ChangeLog.objects.get().fields,
+        )
+
+    def test_changeset(self):
+        instance = self.tracked[0]
+        instance.tracked_char = 'new value'
+        instance.save()
+        pk = instance.pk
+        instance.delete()
+
+        self.assertEqual(
+            {'tracked_char': {'was': 'first'}},
+            ChangeSet(instance=TrackedModel(pk=pk)).diff,
+        )
+
+
+@override_settings(CHANGELOG_WRITER='async')
+class AsyncDeleteTestCase(TransactionTestCase):
+    def tearDown(self):
+        writers.stop_async_writer()
+
+    def test_queryset_delete(self):
+        instance = factories.TrackedModelFactory(tracked_char='first')
+
+        TrackedModel.objects.all().delete()
+        writers.stop_async_writer()
+
+        log = ChangeLog.objects.get()
+        self.assertEqual(instance.pk, log.object_id)
+        self.assertEqual(
+            {'tracked_char': {'was': 'first'}},
+            log.fields,
+        )
@@ -0,0 +1,146 @@
+from __future__ import absolute_import
+
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import signals
+from django.test import override_settings
+
+from tests import factories
+from tests.models import TrackedModel, TrackedRelationModel, UntrackedModel
+from tests.tests import BaseTestCase
+from changelog.descriptors import CHANGED_ATTR, TrackedFieldDescriptor
+from changelog.models import ChangeLog
+
+
+@override_settings(CHANGELOG_CAPTURE='descriptor')
+class DescriptorCaptureTestCase(BaseTestCase):
+    def setUp(self):
+        ContentType.objects.get_for_model(TrackedModel)
+        factories.TrackedModelFactory(tracked_char='initial value')
+        self.instance = TrackedModel.objects.get()
+
+    def test_no_snapshot(self):
+        self.assertFalse(signals.post_init.has_listeners(TrackedModel))
+        self.assertFalse(
+            hasattr(self.instance, '__changelog_initial_values')
+        )
+        self.assertNotIn(CHANGED_ATTR, self.instance.__dict__)
+
+    def test_save(self):
+        self.instance.tracked_char = 'second value'
+        self.instance.tracked_char = 'new value'
+
+        # UPDATE and INSERT only
+        with self.assertNumQueries(2):
+            self.instance.save()
+
+        self.assertEqual(
+            {
+                'tracked_char': {
+                    'was': 'initial value',
+                    'now': 'new value',
+                },
+            },
+            ChangeLog.objects.get().fields,
+        )
+        self.assertEqual({}, self.instance.__dict__[CHANGED_ATTR])
+
+    def test_set_to_initial_value(self):
+        self.instance.tracked_char = 'new value'
+        self.instance.tracked_char = 'initial value'
+        self.instance.save()
+
+        self.assertEqual(
+            0,
+            ChangeLog.objects.count(),
+        )
+
+    def test_untracked_field(self):
+        self.instance.untracked_char = 'new value'
+        self.instance.save()
+
+        self.assertNotIn(CHANGED_ATTR, self.instance.__dict__)
+
+    def test_update_fields(self):
+        self.instance.tracked_char = 'new value'
+        self.instance.save(update_fields=['untracked_char'])
+
+        self.assertEqual(
+            0,
+            ChangeLog.objects.count(),
+        )
+
+        self.instance.save()
+
+        self.assertEqual(
+            1,
+            ChangeLog.objects.count(),
+        )
+
+    def test_deferred_loaded_later(self):
+        instance = TrackedModel.objects.defer('tracked_char').get()
+        self.assertEqual('initial value', instance.tracked_char)
+
+        instance.tracked_char = 'new value'
+        instance.save()
+
+        self.assertEqual(
+            {
+                'tracked_char': {
+                    'was': 'initial value',
+                    'now': 'new value',
+                },
+            },
+            ChangeLog.objects.get().fields,
+        )
+
+    def test_deferred_set_without_loading(self):
+        instance = TrackedModel.objects.defer('tracked_char').get()
+        instance.tracked_char = 'new value'
+        instance.save()
+
+        self.assertEqual(
+            {
+                'tracked_char': {
+                    'now': 'new value',
+                },
+            },
+            ChangeLog.objects.get().fields,
+        )
+
+    def test_relation(self):
+        owners = [
+            UntrackedModel.objects.create(),
+            UntrackedModel.objects.create(),
+        ]
+        instance = factories.TrackedRelationModelFactory(owner=owners[0])
+        instance.owner = owners[1]
+        instance.save()
+
+        self.assertEqual(
+            {
+                'owner_id': {
+                    'was': owners[0].pk,
+                    'now': owners[1].pk,
+                },
+            },
+            ChangeLog.objects.get().fields,
+        )
+
+
+class DescriptorInstallTestCase(BaseTestCase):
+    def test_installed_with_setting(self):
+        with override_settings(CHANGELOG_CAPTURE='descriptor'):
+            self.assertIsInstance(
+                TrackedModel.__dict__['tracked_char'],
+                TrackedFieldDescriptor,
+            )
+            self.assertIsInstance(
+                TrackedRelationModel.__dict__['owner_id'],
+                TrackedFieldDescriptor,
+            )
+
+        self.assertNotIsInstance(
+            TrackedModel.__dict__.get('tracked_char'),
+            TrackedFieldDescriptor,
+        )
+        self.assertTrue(signals.post_init.has_listeners(TrackedModel))
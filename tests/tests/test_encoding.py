@@ -0,0 +1,120 @@
+from datetime import datetime
+from decimal import Decimal
+
+from django.test import TransactionTestCase, override_settings
+from django.utils import timezone
+
+from changelog import writers
+from changelog.models import ChangeLog, ChangeLogState
+from changelog.utils import create_sync_logs
+from tests.models import TrackedValuesModel
+from tests.tests import BaseTestCase
+
+
+TIMESTAMP = datetime(2016, 1, 1, 12, 0, 0, 123456, tzinfo=timezone.utc)
+AMOUNT = Decimal('1.50')
+
+# as PostgreSQL encodes them
+LOGGED = {
+    'timestamp': '2016-01-01T12:00:00.123456+00:00',
+    'amount': 1.5,
+}
+
+
+class EncodingMixin(object):
+    def setUp(self):
+        super(EncodingMixin, self).setUp()
+        self.instance = TrackedValuesModel.objects.create()
+
+    def get_logs(self, log_type):
+        return [
+            log.fields
+            for log in ChangeLog.objects.filter(
+                log_type=log_type,
+            ).order_by('id')
+        ]
+
+    def assertLogged(self, log_type, key):
+        self.assertEqual(
+            [
+                {
+                    'timestamp': {key: LOGGED['timestamp']},
+                    'amount': {key: LOGGED['amount']},
+                },
+            ],
+            [
+                {
+                    field: {key: change[key]}
+                    for field, change in fields.items()
+                }
+                for fields in self.get_logs(log_type)
+            ],
+        )
+
+
+class EncodingTestCase(EncodingMixin, BaseTestCase):
+    def test_save(self):
+        self.instance.timestamp = TIMESTAMP
+        self.instance.amount = AMOUNT
+        self.instance.save()
+
+        self.assertLogged(ChangeLog.ON_SAVE, 'now')
+
+    def test_update(self):
+        TrackedValuesModel.objects.update(timestamp=TIMESTAMP, amount=AMOUNT)
+
+        self.assertLogged(ChangeLog.ON_UPDATE, 'now')
+
+    def test_bulk_create(self):
+        TrackedValuesModel.objects.bulk_create([
+            TrackedValuesModel(timestamp=TIMESTAMP, amount=AMOUNT),
+        ])
+
+        self.assertLogged(ChangeLog.ON_SAVE, 'now')
+
+    def test_delete(self):
+        TrackedValuesModel.objects.update(timestamp=TIMESTAMP, amount=AMOUNT)
+        TrackedValuesModel.objects.all().delete()
+
+        self.assertLogged(ChangeLog.ON_DELETE, 'was')
+
+    def test_sync(self):
+        create_sync_logs(TrackedValuesModel)
+        TrackedValuesModel.objects.update(timestamp=TIMESTAMP, amount=AMOUNT)
+
+        # values logged by SQL match the instance's
+        self.assertEqual(0, create_sync_logs(TrackedValuesModel))
+
+    def test_sync_logs(self):
+        self.instance.timestamp = TIMESTAMP
+        self.instance.amount = AMOUNT
+        self.instance.save()
+        ChangeLog.objects.all().delete()
+        ChangeLogState.objects.all().delete()
+
+        create_sync_logs(TrackedValuesModel)
+
+        self.assertLogged(ChangeLog.ON_SYNC, 'now')
+
+
+@override_settings(CHANGELOG_WRITER='async')
+class AsyncEncodingTestCase(EncodingMixin, TransactionTestCase):
+    def tearDown(self):
+        writers.stop_async_writer()
+
+    def test_update(self):
+        TrackedValuesModel.objects.update(timestamp=TIMESTAMP, amount=AMOUNT)
+        writer = writers.get_async_writer('default')
+        writers.stop_async_writer()
+
+        self.assertEqual(0, writer.failed)
+        self.assertLogged(ChangeLog.ON_UPDATE, 'now')
+
+    def test_delete(self):
+        self.instance.timestamp = TIMESTAMP
+        self.instance.amount = AMOUNT
+        self.instance.save()
+        TrackedValuesModel.objects.all().delete()
+        writers.stop_async_writer()
+
+        self.assertLogged(ChangeLog.ON_DELETE, 'was')
@@ -0,0 +1,206 @@
+from __future__ import unicode_literals
+
+from datetime import timedelta
+import csv
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+
+from django.core.management import call_command, CommandError
+from django.db.models import F
+from django.utils import timezone
+from django.utils.six import StringIO
+
+from changelog.export import export_logs
+from changelog.models import ChangeLog
+from tests import factories
+from tests.models import TrackedCounterModel, TrackedModel
+from tests.tests import BaseTestCase
+
+
+class ExportTestCase(BaseTestCase):
+    def setUp(self):
+        self.instance = factories.TrackedModelFactory(tracked_char='first')
+        for value in ('second', 'third'):
+            self.instance.tracked_char = value
+            self.instance.save()
+        self.logs = list(ChangeLog.objects.order_by('id'))
+
+    def export(self, **kwargs):
+        stream = StringIO()
+        export_logs(stream, **kwargs)
+        return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+    def test_ndjson(self):
+        rows = self.export()
+
+        self.assertEqual(
+            [
+                {
+                    'id': log.pk,
+                    'created_at': log.created_at.isoformat(),
+                    'model': 'tests.trackedmodel',
+                    'object_id': self.instance.pk,
+                    'log_type': ChangeLog.ON_SAVE,
+                    'fields': log.fields,
+                }
+                for log in self.logs
+            ],
+            rows,
+        )
+
+    def test_csv(self):
+        stream = StringIO()
+        export_logs(stream, format='csv')
+
+        rows = list(csv.reader(StringIO(stream.getvalue())))
+        self.assertEqual(
+            ['id', 'created_at', 'model', 'object_id', 'log_type', 'fields'],
+            rows[0],
+        )
+        self.assertEqual(
+            [str(log.pk) for log in self.logs],
+            [row[0] for row in rows[1:]],
+        )
+        self.assertEqual(
+            {'tracked_char': {'was': 'second', 'now': 'third'}},
+            json.loads(rows[-1][-1]),
+        )
+
+    def test_chunks(self):
+        progress = []
+
+        count, last_id = export_logs(
+            StringIO(),
+            chunk_size=1,
+            progress=lambda *args: progress.append(args),
+        )
+
+        self.assertEqual((2, self.logs[-1].pk), (count, last_id))
+        self.assertEqual(
+            [(1, self.logs[0].pk), (2, self.logs[1].pk)],
+            progress,
+        )
+
+    def test_after(self):
+        rows = self.export(after=self.logs[0].pk)
+
+        self.assertEqual([self.logs[1].pk], [row['id'] for row in rows])
+        self.assertEqual(
+            (0, self.logs[1].pk),
+            export_logs(StringIO(), after=self.logs[1].pk),
+        )
+
+    def test_filters(self):
+        other = factories.TrackedCounterModelFactory()
+        TrackedCounterModel.objects.update(counter=1)
+        self.instance.delete()
+        ChangeLog.objects.filter(pk=self.logs[0].pk).update(
+            created_at=F('created_at') - timedelta(days=10),
+        )
+
+        self.assertEqual(
+            [other.pk],
+            [row['object_id'] for row in self.export(
+                models=[TrackedCounterModel],
+            )],
+        )
+        self.assertEqual(
+            3,
+            len(self.export(models=[TrackedModel], object_id=self.instance.pk))
+        )
+        self.assertEqual(
+            ['tests.trackedmodel'],
+            [row['model'] for row in self.export(
+                log_types=[ChangeLog.ON_DELETE],
+            )],
+        )
+        self.assertEqual(
+            [self.logs[0].pk],
+            [row['id'] for row in self.export(
+                until=timezone.now() - timedelta(days=1),
+            )],
+        )
+        self.assertEqual(
+            3,
+            len(self.export(since=timezone.now() - timedelta(days=1))),
+        )
+
+
+class ExportCommandTestCase(BaseTestCase):
+    def setUp(self):
+        self.instance = factories.TrackedModelFactory(tracked_char='first')
+        self.instance.tracked_char = 'second'
+        self.instance.save()
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_stdout(self):
+        out, err = StringIO(), StringIO()
+        call_command(
+            'changelog_export',
+            'tests.TrackedModel',
+            log_types=['save'],
+            since='2000-01-01',
+            stdout=out,
+            stderr=err,
+        )
+
+        lines = out.getvalue().splitlines()
+        self.assertEqual(1, len(lines))
+        self.assertEqual(
+            {'tracked_char': {'was': 'first', 'now': 'second'}},
+            json.loads(lines[0])['fields'],
+        )
+        self.assertIn('Exported 1 logs', err.getvalue())
+
+    def test_file(self):
+        self.instance.tracked_char = '\u00e9t\u00e9'
+        self.instance.save()
+
+        path = os.path.join(self.directory, 'logs.ndjson')
+        call_command('changelog_export', output=path, stderr=StringIO())
+        with io.open(path, encoding='utf-8') as f:
+            rows = [json.loads(line) for line in f]
+        self.assertEqual(
+            {'tracked_char': {'was': 'second', 'now': '\u00e9t\u00e9'}},
+            rows[-1]['fields'],
+        )
+
+        path = os.path.join(self.directory, 'logs.csv')
+        call_command(
+            'changelog_export',
+            format='csv',
+            output=path,
+            stderr=StringIO(),
+        )
+        with io.open(path, encoding='utf-8') as f:
+            lines = f.read().splitlines()
+        self.assertEqual(3, len(lines))
+        self.assertIn('\u00e9t\u00e9', lines[-1])
+
+    def test_gzip(self):
+        path = os.path.join(self.directory, 'logs.csv.gz')
+        call_command(
+            'changelog_export',
+            format='csv',
+            output=path,
+            gzip=True,
+            stderr=StringIO(),
+        )
+
+        with gzip.open(path, 'rt') as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(2, len(rows))
+        self.assertEqual('tests.trackedmodel', rows[1][2])
+
+    def test_invalid_options(self):
+        with self.assertRaises(CommandError):
+            call_command('changelog_export', since='yesterday')
+        with self.assertRaises(CommandError):
+            call_command('changelog_export', gzip=True)
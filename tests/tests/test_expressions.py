@@ -0,0 +1,78 @@
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Concat
+from django.test import TransactionTestCase, override_settings
+
+from changelog import writers
+from changelog.models import ChangeLog
+from tests import factories
+from tests.models import TrackedCounterModel, TrackedModel
+from tests.tests import BaseTestCase
+
+
+class ExpressionUpdateTestCase(BaseTestCase):
+    def setUp(self):
+        self.counters = [
+            factories.TrackedCounterModelFactory(counter=1),
+            factories.TrackedCounterModelFactory(counter=5),
+        ]
+
+    def get_fields(self):
+        return [
+            log.fields
+            for log in ChangeLog.objects.order_by('object_id')
+        ]
+
+    def test_f_expression(self):
+        TrackedCounterModel.objects.update(counter=F('counter') + 1)
+
+        self.assertEqual(
+            [
+                {'counter': {'was': 1, 'now': 2}},
+                {'counter': {'was': 5, 'now': 6}},
+            ],
+            self.get_fields(),
+        )
+
+    def test_case_when(self):
+        TrackedCounterModel.objects.update(
+            counter=Case(
+                When(counter__gt=2, then=Value(0)),
+                default=F('counter'),
+            ),
+        )
+
+        self.assertEqual(
+            [
+                {'counter': {'was': 5, 'now': 0}},
+            ],
+            self.get_fields(),
+        )
+
+    def test_function(self):
+        instance = factories.TrackedModelFactory(tracked_char='value')
+
+        TrackedModel.objects.update(
+            tracked_char=Concat(F('tracked_char'), Value('-new')),
+        )
+
+        self.assertEqual(
+            {'tracked_char': {'was': 'value', 'now': 'value-new'}},
+            ChangeLog.objects.get(object_id=instance.pk).fields,
+        )
+
+
+@override_settings(CHANGELOG_WRITER='async')
+class AsyncExpressionUpdateTestCase(TransactionTestCase):
+    def tearDown(self):
+        writers.stop_async_writer()
+
+    def test_f_expression(self):
+        instance = factories.TrackedCounterModelFactory(counter=1)
+
+        TrackedCounterModel.objects.update(counter=F('counter') + 1)
+        writers.stop_async_writer()
+
+        self.assertEqual(
+            {'counter': {'was': 1, 'now': 2}},
+            ChangeLog.objects.get(object_id=instance.pk).fields,
+        )
@@ -0,0 +1,121 @@
+import select
+
+from django.db import transaction
+from django.test import TransactionTestCase, override_settings
+
+from changelog.feed import ChangeFeed
+from changelog.models import ChangeLog
+from changelog.triggers import configure_notify_trigger
+from tests import factories
+from tests.models import TrackedCounterModel, TrackedModel
+
+
+@override_settings(CHANGELOG_NOTIFY=True)
+class ChangeFeedTestCase(TransactionTestCase):
+    def setUp(self):
+        configure_notify_trigger()
+        self.instance = factories.TrackedModelFactory(tracked_char='first')
+        self.feed = ChangeFeed(delay=0.1)
+        self.feed.open()
+
+    def tearDown(self):
+        self.feed.close()
+        with override_settings(CHANGELOG_NOTIFY=False):
+            configure_notify_trigger()
+
+    def save(self, instance, value):
+        instance.tracked_char = value
+        instance.save()
+        return ChangeLog.objects.latest('id')
+
+    def test_wait(self):
+        log = self.save(self.instance, 'second')
+
+        logs = self.feed.wait(timeout=5)
+
+        self.assertEqual([log], logs)
+        self.assertEqual(
+            {'tracked_char': {'was': 'first', 'now': 'second'}},
+            logs[0].fields,
+        )
+        self.assertEqual(log.pk, self.feed.position)
+
+    def test_wait_timeout(self):
+        self.assertEqual([], self.feed.wait(timeout=0.1))
+
+    def test_batches(self):
+        logs = [
+            self.save(self.instance, str(value))
+            for value in range(5)
+        ]
+
+        self.assertEqual(logs, self.feed.wait(timeout=5))
+
+    def test_batch_size(self):
+        self.feed.batch_size = 2
+        logs = [
+            self.save(self.instance, str(value))
+            for value in range(3)
+        ]
+
+        self.assertEqual(logs[:2], self.feed.wait(timeout=5))
+        self.assertEqual(logs[2:], self.feed.wait(timeout=5))
+
+    def test_rollback(self):
+        with self.assertRaises(ValueError):
+            with transaction.atomic():
+                self.save(self.instance, 'rolled back')
+                raise ValueError
+
+        self.assertEqual([], self.feed.wait(timeout=0.2))
+
+    def test_notified_on_commit(self):
+        with transaction.atomic():
+            log = self.save(self.instance, 'second')
+            self.assertEqual([], self.feed.poll())
+
+        self.assertEqual([log], self.feed.wait(timeout=5))
+
+    def test_models(self):
+        self.feed.close()
+        self.feed = ChangeFeed(models=[TrackedCounterModel])
+        self.feed.open()
+
+        self.save(self.instance, 'second')
+        instance = factories.TrackedCounterModelFactory()
+        TrackedCounterModel.objects.update(counter=1)
+
+        logs = self.feed.wait(timeout=5)
+        self.assertEqual([instance.pk], [log.object_id for log in logs])
+
+    def test_catch_up(self):
+        first = self.save(self.instance, 'second')
+        logs = [self.save(self.instance, value) for value in ('a', 'b', 'c')]
+        self.feed.close()
+
+        self.feed = ChangeFeed(after=first.pk, batch_size=2)
+        with self.feed:
+            batches = iter(self.feed)
+            self.assertEqual(logs[:2], next(batches))
+            self.assertEqual(logs[2:], next(batches))
+
+            log = self.save(self.instance, 'd')
+            self.assertEqual([log], next(batches))
+            self.assertEqual(log.pk, self.feed.position)
+
+    def test_fileno(self):
+        readable, _, _ = select.select([self.feed.fileno()], [], [], 0)
+        self.assertEqual([], readable)
+
+        log = self.save(self.instance, 'second')
+        readable, _, _ = select.select([self.feed.fileno()], [], [], 5)
+        self.assertEqual([self.feed.fileno()], readable)
+        self.assertEqual([log], self.feed.poll())
+
+    def test_raw_writes(self):
+        TrackedModel.objects.bulk_create([TrackedModel(tracked_char='bulk')])
+
+        self.assertEqual(
+            {'tracked_char': {'now': 'bulk'}},
+            self.feed.wait(timeout=5)[0].fields,
+        )
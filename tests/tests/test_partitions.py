@@ -0,0 +1,266 @@
+from datetime import timedelta
+import os
+import shutil
+import tempfile
+from unittest import SkipTest
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command, CommandError
+from django.db import connection
+from django.utils import timezone
+from django.utils.six import StringIO
+
+from changelog import partitions
+from changelog.archive import archive_logs, get_archived_logs
+from changelog.models import ChangeLog, ChangeLogState, ChangeSet
+from tests import factories
+from tests.tests import BaseTestCase
+
+
+class PartitionTestCase(BaseTestCase):
+    @classmethod
+    def setUpClass(cls):
+        # the test database only exists once tests are run
+        connection.ensure_connection()
+        if connection.pg_version < partitions.MIN_VERSION:
+            raise SkipTest('Partitioning requires PostgreSQL 11')
+        super(PartitionTestCase, cls).setUpClass()
+
+    def setUp(self):
+        self.instance = factories.TrackedModelFactory(tracked_char='first')
+        self.save('second')
+        self.check_constraints()
+
+        partitions.partition_table()
+        self.month = partitions._next_month(
+            partitions._month(timezone.now())
+        )
+
+    def save(self, value):
+        self.instance.tracked_char = value
+        self.instance.save()
+        return ChangeLog.objects.latest('id')
+
+    def check_constraints(self):
+        # tables with deferred constraint checks pending can't be altered
+        with connection.cursor() as cursor:
+            cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+    def count(self, table):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT count(*) FROM {}'.format(table))
+            return cursor.fetchone()[0]
+
+    def move(self, log, created_at):
+        ChangeLog.objects.filter(pk=log.pk).update(created_at=created_at)
+        self.check_constraints()
+
+    def test_partition_table(self):
+        self.assertTrue(partitions.is_partitioned())
+
+        names = [name for name, _, _ in partitions.get_partitions()]
+        self.assertEqual(4, len(names))
+        self.assertEqual('changelog_changelog_legacy', names[0])
+        self.assertEqual(
+            'changelog_changelog_y{:04d}m{:02d}'.format(
+                self.month.year,
+                self.month.month,
+            ),
+            names[1],
+        )
+
+        # existing logs are kept in the legacy partition
+        self.assertEqual(1, self.count('changelog_changelog_legacy'))
+        self.assertEqual(
+            {'tracked_char': {'was': 'first', 'now': 'second'}},
+            ChangeLog.objects.get().fields,
+        )
+
+    def test_logs_are_written(self):
+        log = self.save('third')
+        self.assertEqual(2, ChangeLog.objects.count())
+
+        state = ChangeLogState.objects.get(object_id=self.instance.pk)
+        self.assertEqual({'tracked_char': 'third'}, state.fields)
+        self.assertEqual(log.pk, state.last_log_id)
+
+    def test_logs_are_routed_by_created_at(self):
+        self.move(self.save('third'), self.month)
+        self.move(self.save('fourth'), self.month + timedelta(days=365))
+
+        name, _, _ = partitions.get_partitions()[1]
+        self.assertEqual(1, self.count(name))
+        self.assertEqual(1, self.count('changelog_changelog_default'))
+
+    def test_create_partitions(self):
+        self.assertEqual([], partitions.create_partitions())
+
+        created = partitions.create_partitions(months=4)
+        self.assertEqual(1, len(created))
+        self.assertEqual(5, len(partitions.get_partitions()))
+
+    def test_create_partitions_moves_default_rows(self):
+        later = self.month + timedelta(days=200)
+        self.move(self.save('third'), later)
+
+        partitions.create_partitions(months=12)
+
+        self.assertEqual(0, self.count('changelog_changelog_default'))
+        self.assertEqual(
+            'third',
+            ChangeLog.objects.get(created_at=later).fields[
+                'tracked_char'
+            ]['now'],
+        )
+
+    def test_drop_partitions(self):
+        self.assertEqual(
+            [],
+            partitions.drop_partitions(self.month - timedelta(days=1)),
+        )
+
+        dropped = partitions.drop_partitions(self.month)
+        self.assertEqual(['changelog_changelog_legacy'], dropped)
+        self.assertEqual(0, ChangeLog.objects.count())
+        with connection.cursor() as cursor:
+            self.assertNotIn(
+                'changelog_changelog_legacy',
+                connection.introspection.table_names(cursor),
+            )
+
+    def test_detach_partitions(self):
+        partitions.drop_partitions(self.month, detach_only=True)
+
+        self.assertEqual(0, ChangeLog.objects.count())
+        self.assertEqual(1, self.count('changelog_changelog_legacy'))
+
+    def test_changeset_prunes_partitions(self):
+        log = self.save('third')
+        self.move(log, self.month)
+        changeset = ChangeSet(instance=self.instance, since=self.month)
+
+        sql, params = changeset.iter_logs().query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN ' + sql, params)
+            plan = '\n'.join(line for line, in cursor.fetchall())
+
+        self.assertNotIn('changelog_changelog_legacy', plan)
+        self.assertEqual(
+            {'tracked_char': {'was': 'second', 'now': 'third'}},
+            changeset.diff,
+        )
+
+    def test_archive_drops_partitions(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        name, _, _ = partitions.get_partitions()[1]
+        self.move(self.save('third'), self.month)
+        before = partitions._next_month(self.month)
+
+        archive_logs(before, directory=directory, delete=True)
+
+        self.assertNotIn(
+            name,
+            [partition for partition, _, _ in partitions.get_partitions()],
+        )
+        with connection.cursor() as cursor:
+            self.assertNotIn(
+                name,
+                connection.introspection.table_names(cursor),
+            )
+        self.assertEqual(0, ChangeLog.objects.count())
+
+        # written to the default partition once the month's is dropped
+        self.move(self.save('fourth'), self.month)
+        self.assertEqual(1, self.count('changelog_changelog_default'))
+        archive_logs(before, directory=directory, delete=True)
+
+        self.assertEqual(0, ChangeLog.objects.count())
+        self.assertEqual(
+            ['second', 'third', 'fourth'],
+            [
+                log.fields['tracked_char']['now']
+                for log in get_archived_logs(
+                    ContentType.objects.get_for_model(self.instance),
+                    self.instance.pk,
+                    directory=directory,
+                )
+            ],
+        )
+
+    def test_archive_failure_attaches_partition(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.move(self.save('third'), self.month)
+        # the archive can't be written
+        os.mkdir(os.path.join(
+            directory,
+            'changelog_y{:04d}m{:02d}.archive.tmp'.format(
+                self.month.year,
+                self.month.month,
+            ),
+        ))
+
+        with self.assertRaises(EnvironmentError):
+            archive_logs(
+                partitions._next_month(self.month),
+                directory=directory,
+                delete=True,
+            )
+
+        self.assertEqual(4, len(partitions.get_partitions()))
+        self.assertEqual(1, ChangeLog.objects.filter(
+            created_at=self.month,
+        ).count())
+
+    def test_unpartition_table(self):
+        self.move(self.save('third'), self.month)
+
+        partitions.unpartition_table()
+
+        self.assertFalse(partitions.is_partitioned())
+        self.assertEqual(2, ChangeLog.objects.count())
+        other = factories.TrackedModelFactory(tracked_char='other')
+        other.tracked_char = 'changed'
+        other.save()
+        self.assertEqual(
+            {'tracked_char': 'changed'},
+            ChangeLogState.objects.get(object_id=other.pk).fields,
+        )
+
+    def test_commands(self):
+        out = StringIO()
+        call_command('changelog_create_partitions', months=4, stdout=out)
+        self.assertIn('Created 1 partitions', out.getvalue())
+
+        out = StringIO()
+        call_command('changelog_drop_partitions', '30', stdout=out)
+        self.assertIn('Dropped 0 partitions', out.getvalue())
+
+    def test_commands_require_partitioned_table(self):
+        partitions.unpartition_table()
+
+        with self.assertRaises(CommandError):
+            call_command('changelog_create_partitions')
+        with self.assertRaises(CommandError):
+            call_command('changelog_drop_partitions', '30')
+
+    def test_partition_command(self):
+        with self.assertRaises(CommandError):
+            call_command('changelog_partition')
+
+        call_command(
+            'changelog_partition',
+            unpartition=True,
+            stdout=StringIO(),
+        )
+        self.assertFalse(partitions.is_partitioned())
+        with self.assertRaises(CommandError):
+            call_command('changelog_partition', unpartition=True)
+
+        self.check_constraints()
+        out = StringIO()
+        call_command('changelog_partition', months=1, stdout=out)
+        self.assertTrue(partitions.is_partitioned())
+        self.assertIn('Partitioned', out.getvalue())
+        self.assertEqual(2, len(partitions.get_partitions()))
@@ -0,0 +1,75 @@
+from __future__ import absolute_import
+
+from django.contrib.contenttypes.models import ContentType
+
+from tests import factories
+from tests.models import TrackedRelationModel, UntrackedModel
+from tests.tests import BaseTestCase
+from changelog.models import ChangeLog
+from changelog.utils import get_tracked_models
+
+
+class RelationTestCase(BaseTestCase):
+    def setUp(self):
+        self.owners = [
+            UntrackedModel.objects.create(),
+            UntrackedModel.objects.create(),
+        ]
+        self.instance = factories.TrackedRelationModelFactory(
+            owner=self.owners[0],
+        )
+
+    def test_tracked_by_attname(self):
+        self.assertEqual(
+            ('owner_id',),
+            get_tracked_models()[TrackedRelationModel],
+        )
+
+    def test_no_related_queries(self):
+        factories.TrackedRelationModelFactory(owner=self.owners[1])
+
+        with self.assertNumQueries(1):
+            instances = list(TrackedRelationModel.objects.all())
+
+        self.assertEqual(2, len(instances))
+
+    def test_save(self):
+        ContentType.objects.get_for_model(TrackedRelationModel)
+        instance = TrackedRelationModel.objects.get()
+        instance.owner = self.owners[1]
+
+        # UPDATE and INSERT only
+        with self.assertNumQueries(2):
+            instance.save()
+
+        self.assertEqual(
+            {
+                'owner_id': {
+                    'was': self.owners[0].pk,
+                    'now': self.owners[1].pk,
+                },
+            },
+            ChangeLog.objects.get().fields,
+        )
+
+    def test_update(self):
+        TrackedRelationModel.objects.update(owner=self.owners[1])
+
+        self.assertEqual(
+            {
+                'owner_id': {
+                    'was': self.owners[0].pk,
+                    'now': self.owners[1].pk,
+                },
+            },
+            ChangeLog.objects.get().fields,
+        )
+
+    def test_update_fields(self):
+        self.instance.owner = self.owners[1]
+        self.instance.save(update_fields=['owner'])
+
+        self.assertEqual(
+            1,
+            ChangeLog.objects.count(),
+        )
@@ -0,0 +1,112 @@
+from __future__ import absolute_import
+
+from django.db import connection
+from django.test import override_settings
+
+from tests import factories
+from tests.models import TrackedModel
+from tests.tests import BaseTestCase
+from changelog.models import ChangeLog
+from changelog.snapshots import Digest, DigestSnapshot
+
+
+LONG_VALUE = 'x' * 200
+OTHER_LONG_VALUE = 'y' * 200
+
+
+@override_settings(CHANGELOG_CAPTURE='digest')
+class DigestSnapshotTestCase(BaseTestCase):
+    def test_snapshot(self):
+        factories.TrackedModelFactory(tracked_char=LONG_VALUE)
+
+        instance = TrackedModel.objects.get()
+        snapshot = getattr(instance, '__changelog_initial_values')
+
+        self.assertIsInstance(snapshot, DigestSnapshot)
+        self.assertIsInstance(snapshot.values[0], Digest)
+
+    def test_short_value(self):
+        x = factories.TrackedModelFactory(tracked_char='initial value')
+        x.tracked_char = 'new value'
+
+        # UPDATE and INSERT only; no lookup of the initial value
+        with self.assertNumQueries(2):
+            x.save()
+
+        self.assertEqual(
+            {
+                'tracked_char': {
+                    'was': 'initial value',
+                    'now': 'new value',
+                },
+            },
+            ChangeLog.objects.get().fields,
+        )
+
+    def test_unchanged(self):
+        x = factories.TrackedModelFactory(tracked_char=LONG_VALUE)
+        x.untracked_char = 'new value'
+        x.save()
+
+        self.assertEqual(
+            0,
+            ChangeLog.objects.count(),
+        )
+
+    def test_long_value_recovered_from_log(self):
+        x = factories.TrackedModelFactory()
+        x.tracked_char = LONG_VALUE
+        x.save()
+
+        x = TrackedModel.objects.get(pk=x.pk)
+        x.tracked_char = OTHER_LONG_VALUE
+        x.save()
+
+        log = ChangeLog.objects.order_by('-created_at').first()
+        self.assertEqual(
+            {
+                'tracked_char': {
+                    'was': LONG_VALUE,
+                    'now': OTHER_LONG_VALUE,
+                },
+            },
+            log.fields,
+        )
+
+    def test_long_value_not_logged(self):
+        x = factories.TrackedModelFactory(tracked_char=LONG_VALUE)
+        x.tracked_char = OTHER_LONG_VALUE
+        x.save()
+
+        self.assertEqual(
+            {
+                'tracked_char': {
+                    'now': OTHER_LONG_VALUE,
+                },
+            },
+            ChangeLog.objects.get().fields,
+        )
+
+    def test_long_value_changed_since_log(self):
+        x = factories.TrackedModelFactory()
+        x.tracked_char = LONG_VALUE
+        x.save()
+
+        connection.cursor().execute(
+            "UPDATE tests_trackedmodel SET tracked_char = %s",
+            [OTHER_LONG_VALUE],
+        )
+
+        x = TrackedModel.objects.get(pk=x.pk)
+        x.tracked_char = 'new value'
+        x.save()
+
+        log = ChangeLog.objects.order_by('-created_at').first()
+        self.assertEqual(
+            {
+                'tracked_char': {
+                    'now': 'new value',
+                },
+            },
+            log.fields,
+        )
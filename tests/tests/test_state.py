@@ -0,0 +1,145 @@
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import F
+
+from changelog.models import ChangeLog, ChangeLogState
+from changelog.utils import create_sync_logs, get_logged_values
+from changelog.writers import LogBuffer
+from tests import factories
+from tests.models import TrackedCounterModel, TrackedModel
+from tests.tests import BaseTestCase
+
+
+class ChangeLogStateTestCase(BaseTestCase):
+    def setUp(self):
+        self.instance = factories.TrackedModelFactory(tracked_char='first')
+
+    def get_state(self, instance):
+        return ChangeLogState.objects.get(
+            content_type=ContentType.objects.get_for_model(instance),
+            object_id=instance.pk,
+        )
+
+    def test_save(self):
+        self.instance.tracked_char = 'second'
+        self.instance.save()
+
+        state = self.get_state(self.instance)
+        log = ChangeLog.objects.get()
+        self.assertEqual({'tracked_char': 'second'}, state.fields)
+        self.assertEqual(log.pk, state.last_log_id)
+        self.assertEqual(log.created_at, state.last_logged_at)
+
+    def test_latest_log(self):
+        for value in ('second', 'third', 'fourth'):
+            self.instance.tracked_char = value
+            self.instance.save()
+
+        self.assertEqual(
+            {'tracked_char': 'fourth'},
+            self.get_state(self.instance).fields,
+        )
+        self.assertEqual(1, ChangeLogState.objects.count())
+
+    def test_update(self):
+        TrackedModel.objects.update(tracked_char='second')
+
+        self.assertEqual(
+            {'tracked_char': 'second'},
+            self.get_state(self.instance).fields,
+        )
+
+    def test_expression_update(self):
+        instance = factories.TrackedCounterModelFactory(counter=1)
+        TrackedCounterModel.objects.update(counter=F('counter') + 1)
+
+        self.assertEqual(
+            {'counter': 2},
+            self.get_state(instance).fields,
+        )
+
+    def test_bulk_create(self):
+        instance, = TrackedModel.objects.bulk_create([
+            TrackedModel(tracked_char='created', untracked_char='x'),
+        ])
+
+        self.assertEqual(
+            {'tracked_char': 'created'},
+            self.get_state(instance).fields,
+        )
+
+    def test_sync(self):
+        create_sync_logs(TrackedModel)
+
+        self.assertEqual(
+            {'tracked_char': 'first'},
+            self.get_state(self.instance).fields,
+        )
+
+    def test_delete(self):
+        self.instance.tracked_char = 'second'
+        self.instance.save()
+        self.instance.delete()
+
+        self.assertEqual(0, ChangeLogState.objects.count())
+
+    def test_logged_values(self):
+        self.instance.tracked_char = 'second'
+        self.instance.save()
+        ContentType.objects.get_for_model(TrackedModel)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                {'tracked_char': 'second'},
+                get_logged_values(self.instance, ['tracked_char']),
+            )
+
+    def test_fields_merged(self):
+        self.instance.tracked_char = 'second'
+        self.instance.save()
+        ChangeLog.objects.create(
+            instance=self.instance,
+            fields={'other': {'was': 1, 'now': 2}},
+        )
+
+        self.assertEqual(
+            {'tracked_char': 'second', 'other': 2},
+            self.get_state(self.instance).fields,
+        )
+
+    def test_logs_written_out_of_order(self):
+        # two transactions changing the instance, whose buffered logs are
+        # written after they commit, in the reverse order
+        first, second = LogBuffer('default', 10), LogBuffer('default', 10)
+        first.add(ChangeLog(
+            instance=self.instance,
+            fields={'tracked_char': {'was': 'first', 'now': 'second'}},
+        ))
+        second.add(ChangeLog(
+            instance=self.instance,
+            fields={'tracked_char': {'was': 'second', 'now': 'third'}},
+        ))
+        second.flush()
+        first.flush()
+
+        state = self.get_state(self.instance)
+        latest = ChangeLog.objects.latest('created_at')
+        self.assertEqual({'tracked_char': 'third'}, state.fields)
+        self.assertEqual(latest.pk, state.last_log_id)
+        self.assertEqual(latest.created_at, state.last_logged_at)
+        self.assertNotEqual(ChangeLog.objects.latest('id').pk, latest.pk)
+
+    def test_delete_written_before_save(self):
+        save, delete = LogBuffer('default', 10), LogBuffer('default', 10)
+        save.add(ChangeLog(
+            instance=self.instance,
+            fields={'tracked_char': {'was': 'first', 'now': 'second'}},
+        ))
+        delete.add(ChangeLog(
+            instance=self.instance,
+            fields={'tracked_char': {'was': 'second'}},
+            log_type=ChangeLog.ON_DELETE,
+        ))
+        delete.flush()
+        save.flush()
+
+        self.assertEqual(0, ChangeLogState.objects.count())
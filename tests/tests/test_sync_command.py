@@ -0,0 +1,76 @@
+from django.core.management import CommandError, call_command
+from django.test import TransactionTestCase
+from django.utils.six import StringIO
+
+from changelog.management.commands.changelog_sync import get_ranges
+from changelog.models import ChangeLog
+from tests import factories
+from tests.models import CharPrimaryKeyModel, TrackedModel, UntrackedModel
+
+
+class SyncCommandTestCase(TransactionTestCase):
+    def setUp(self):
+        self.instances = [
+            factories.TrackedModelFactory(tracked_char=str(i))
+            for i in range(10)
+        ]
+
+    def sync(self, *args, **kwargs):
+        out = StringIO()
+        call_command('changelog_sync', *args, stdout=out, **kwargs)
+        return out.getvalue()
+
+    def get_synced_pks(self):
+        return sorted(
+            ChangeLog.objects.filter(
+                log_type=ChangeLog.ON_SYNC,
+            ).values_list('object_id', flat=True)
+        )
+
+    def test_sync(self):
+        out = self.sync('tests.TrackedModel', workers=1, ranges=3)
+
+        self.assertEqual(
+            [x.pk for x in self.instances],
+            self.get_synced_pks(),
+        )
+        self.assertIn('tests.TrackedModel: 3/3 ranges', out)
+        self.assertIn('tests.TrackedModel: synced 10', out)
+
+    def test_parallel(self):
+        self.sync('tests.TrackedModel', workers=2, ranges=4, chunk_size=2)
+
+        self.assertEqual(
+            [x.pk for x in self.instances],
+            self.get_synced_pks(),
+        )
+
+    def test_all_tracked_models(self):
+        out = self.sync(workers=1)
+
+        self.assertIn('tests.TrackedModel: synced 10', out)
+        self.assertIn('tests.TrackedRelationModel: synced 0', out)
+
+    def test_untracked_model(self):
+        with self.assertRaises(CommandError):
+            self.sync('tests.UntrackedModel')
+
+    def test_ranges(self):
+        pks = [x.pk for x in self.instances]
+
+        ranges = get_ranges(TrackedModel, 3)
+
+        self.assertEqual(3, len(ranges))
+        self.assertEqual(pks[0] - 1, ranges[0][0])
+        self.assertEqual(pks[-1], ranges[-1][1])
+        for (_, last), (after, _) in zip(ranges, ranges[1:]):
+            self.assertEqual(last, after)
+
+    def test_ranges_empty(self):
+        self.assertEqual([], get_ranges(UntrackedModel, 3))
+
+    def test_ranges_non_integer_pks(self):
+        CharPrimaryKeyModel.objects.create(id='a')
+        CharPrimaryKeyModel.objects.create(id='b')
+
+        self.assertEqual([(None, None)], get_ranges(CharPrimaryKeyModel, 3))
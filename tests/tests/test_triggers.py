@@ -0,0 +1,238 @@
+from __future__ import absolute_import
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.db.models import F, signals
+from django.test import override_settings
+
+from changelog.models import ChangeLog, ChangeLogState
+from changelog.triggers import (
+    configure_capture_triggers,
+    get_capture_triggers,
+)
+from tests import factories
+from tests.models import (
+    TrackedChildModel,
+    TrackedCounterModel,
+    TrackedModel,
+    TrackedRelationModel,
+    UntrackedModel,
+)
+from tests.tests import BaseTestCase
+
+
+def get_trigger_tables():
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT tgrelid::regclass::text FROM pg_trigger "
+            "WHERE tgname = 'changelog_capture' ORDER BY 1"
+        )
+        return [table for table, in cursor.fetchall()]
+
+
+@override_settings(CHANGELOG_CAPTURE='trigger')
+class TriggerCaptureTestCase(BaseTestCase):
+    def setUp(self):
+        configure_capture_triggers()
+        self.instance = factories.TrackedModelFactory(tracked_char='first')
+
+    def get_logs(self, log_type=None):
+        logs = ChangeLog.objects.order_by('id')
+        if log_type is not None:
+            logs = logs.filter(log_type=log_type)
+        return [(log.object_id, log.fields) for log in logs]
+
+    def test_triggers_are_installed(self):
+        self.assertEqual(
+            [
+                'tests_trackedcountermodel',
+                'tests_trackedmodel',
+                'tests_trackedrelationmodel',
+                'tests_trackedvaluesmodel',
+            ],
+            get_trigger_tables(),
+        )
+
+    def test_no_receivers(self):
+        self.assertFalse(signals.post_init.has_listeners(TrackedModel))
+        self.assertFalse(signals.post_save.has_listeners(TrackedModel))
+
+    def test_insert(self):
+        self.assertEqual(
+            [(self.instance.pk, {'tracked_char': {'now': 'first'}})],
+            self.get_logs(),
+        )
+        log = ChangeLog.objects.get()
+        self.assertEqual(ChangeLog.ON_SAVE, log.log_type)
+        self.assertEqual(
+            ContentType.objects.get_for_model(TrackedModel),
+            log.content_type,
+        )
+
+    def test_save(self):
+        self.instance.tracked_char = 'second'
+        self.instance.save()
+        self.instance.untracked_char = 'not logged'
+        self.instance.save()
+
+        self.assertEqual(
+            {'tracked_char': {'was': 'first', 'now': 'second'}},
+            ChangeLog.objects.latest('id').fields,
+        )
+        self.assertEqual(2, ChangeLog.objects.count())
+
+    def test_update(self):
+        other = factories.TrackedModelFactory(tracked_char='other')
+
+        TrackedModel.objects.update(tracked_char='second')
+
+        self.assertEqual(
+            [
+                (self.instance.pk, {
+                    'tracked_char': {'was': 'first', 'now': 'second'},
+                }),
+                (other.pk, {
+                    'tracked_char': {'was': 'other', 'now': 'second'},
+                }),
+            ],
+            sorted(self.get_logs(log_type=ChangeLog.ON_UPDATE)),
+        )
+
+        # the log type is only set for the update
+        self.instance.tracked_char = 'third'
+        self.instance.save()
+        self.assertEqual(
+            ChangeLog.ON_SAVE,
+            ChangeLog.objects.latest('id').log_type,
+        )
+
+    def test_expression_update(self):
+        instance = factories.TrackedCounterModelFactory(counter=1)
+
+        TrackedCounterModel.objects.update(counter=F('counter') + 1)
+
+        self.assertEqual(
+            {'counter': {'was': 1, 'now': 2}},
+            ChangeLog.objects.latest('id').fields,
+        )
+        self.assertEqual(
+            {'counter': 2},
+            ChangeLogState.objects.get(object_id=instance.pk).fields,
+        )
+
+    def test_raw_update(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'UPDATE tests_trackedmodel SET tracked_char = %s',
+                ['raw'],
+            )
+
+        log = ChangeLog.objects.latest('id')
+        self.assertEqual(
+            {'tracked_char': {'was': 'first', 'now': 'raw'}},
+            log.fields,
+        )
+        self.assertEqual(ChangeLog.ON_SAVE, log.log_type)
+
+    def test_bulk_create(self):
+        TrackedModel.objects.bulk_create([
+            TrackedModel(tracked_char='second'),
+            TrackedModel(tracked_char='third'),
+        ])
+
+        self.assertEqual(
+            [
+                {'tracked_char': {'now': 'second'}},
+                {'tracked_char': {'now': 'third'}},
+            ],
+            [fields for _, fields in self.get_logs()[1:]],
+        )
+
+    def test_delete(self):
+        pk = self.instance.pk
+        self.instance.delete()
+
+        self.assertEqual(
+            [(pk, {'tracked_char': {'was': 'first'}})],
+            self.get_logs(log_type=ChangeLog.ON_DELETE),
+        )
+
+    def test_queryset_delete(self):
+        TrackedModel.objects.all().delete()
+
+        self.assertEqual(
+            [(self.instance.pk, {'tracked_char': {'was': 'first'}})],
+            self.get_logs(log_type=ChangeLog.ON_DELETE),
+        )
+
+    def test_relation(self):
+        owner = UntrackedModel.objects.create()
+        instance = TrackedRelationModel.objects.create(owner=owner)
+
+        self.assertEqual(
+            {'owner_id': {'now': owner.pk}},
+            ChangeLog.objects.get(object_id=instance.pk).fields,
+        )
+
+    def test_trigger_sql(self):
+        content_type = ContentType.objects.get_for_model(TrackedModel)
+        self.assertIn(
+            'AFTER INSERT OR DELETE OR UPDATE OF "tracked_char" '
+            'ON "tests_trackedmodel"\n'
+            'FOR EACH ROW EXECUTE PROCEDURE changelog_capture('
+            "'{}', 'id', 'tracked_char', 'tracked_char')".format(
+                content_type.pk,
+            ),
+            get_capture_triggers()[1],
+        )
+
+    def test_inherited_fields(self):
+        instance = TrackedChildModel.objects.create(
+            parent_char='parent',
+            child_char='child',
+        )
+        instance.parent_char = 'saved'
+        instance.save()
+        TrackedChildModel.objects.update(parent_char='updated')
+        pk = instance.pk
+        instance.delete()
+
+        # the parent's column is in another table, out of reach of a
+        # trigger, so the model is captured in Python
+        self.assertTrue(signals.post_save.has_listeners(TrackedChildModel))
+        self.assertEqual(
+            [
+                (ChangeLog.ON_SAVE, {
+                    'parent_char': {'was': 'parent', 'now': 'saved'},
+                }),
+                (ChangeLog.ON_UPDATE, {
+                    'parent_char': {'was': 'saved', 'now': 'updated'},
+                }),
+                (ChangeLog.ON_DELETE, {
+                    'parent_char': {'was': 'updated'},
+                    'child_char': {'was': 'child'},
+                }),
+            ],
+            [
+                (log.log_type, log.fields)
+                for log in ChangeLog.objects.filter(
+                    content_type=ContentType.objects.get_for_model(
+                        TrackedChildModel,
+                    ),
+                    object_id=pk,
+                ).order_by('id')
+            ],
+        )
+
+
+class TriggerRemovalTestCase(BaseTestCase):
+    def test_triggers_are_removed(self):
+        with override_settings(CHANGELOG_CAPTURE='trigger'):
+            configure_capture_triggers()
+        self.assertEqual(4, len(get_trigger_tables()))
+
+        configure_capture_triggers()
+
+        self.assertEqual([], get_trigger_tables())
+        factories.TrackedModelFactory(tracked_char='first')
+        self.assertEqual(0, ChangeLog.objects.count())
@@ -1,9 +1,10 @@
 from __future__ import absolute_import
 
+from django.contrib.contenttypes.models import ContentType
 from django.db import connection
 
 from tests import factories
-from tests.models import TrackedModel
+from tests.models import TrackedModel, TrackedRelationModel, UntrackedModel
 from tests.tests import BaseTestCase
 from changelog.models import ChangeLog
 from changelog.utils import create_sync_logs
@@ -75,3 +76,79 @@ class CreateSyncLogTestCase(BaseTestCase):
             self.instance,
             log.instance,
         )
+
+
+class ChunkedSyncLogTestCase(BaseTestCase):
+    def setUp(self):
+        self.instances = [
+            factories.TrackedModelFactory(tracked_char=str(i))
+            for i in range(5)
+        ]
+        # logged, so not synced
+        self.instances[1].tracked_char = 'logged value'
+        self.instances[1].save()
+
+    def get_synced_pks(self):
+        return sorted(
+            ChangeLog.objects.filter(
+                log_type=ChangeLog.ON_SYNC,
+            ).values_list('object_id', flat=True)
+        )
+
+    def test_chunks(self):
+        progress = []
+
+        created = create_sync_logs(
+            TrackedModel,
+            chunk_size=2,
+            progress=lambda *args: progress.append(args),
+        )
+
+        self.assertEqual(4, created)
+        self.assertEqual(
+            [
+                x.pk for x in self.instances
+                if x is not self.instances[1]
+            ],
+            self.get_synced_pks(),
+        )
+        self.assertEqual(
+            [
+                (2, 1, self.instances[1].pk),
+                (4, 3, self.instances[3].pk),
+                (5, 4, self.instances[4].pk),
+            ],
+            progress,
+        )
+
+    def test_num_queries(self):
+        ContentType.objects.get_for_model(TrackedModel)
+
+        # rows, logged values and insert for each chunk, then an empty chunk
+        with self.assertNumQueries(3 * 3 + 1):
+            create_sync_logs(TrackedModel, chunk_size=2)
+
+    def test_resume(self):
+        create_sync_logs(TrackedModel, after=self.instances[2].pk)
+
+        self.assertEqual(
+            [self.instances[3].pk, self.instances[4].pk],
+            self.get_synced_pks(),
+        )
+
+    def test_second_sync(self):
+        create_sync_logs(TrackedModel)
+
+        self.assertEqual(0, create_sync_logs(TrackedModel))
+
+    def test_relation(self):
+        owner = UntrackedModel.objects.create()
+        TrackedRelationModel.objects.create(owner=owner)
+
+        create_sync_logs(TrackedRelationModel)
+
+        self.assertEqual(
+            {'owner_id': {'now': owner.pk}},
+            ChangeLog.objects.get(log_type=ChangeLog.ON_SYNC).fields,
+        )
+        self.assertEqual(0, create_sync_logs(TrackedRelationModel))
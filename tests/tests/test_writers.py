@@ -0,0 +1,204 @@
+from __future__ import absolute_import
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.test import TransactionTestCase, override_settings
+
+from tests import factories
+from tests.models import TrackedChildModel, TrackedModel
+from changelog import writers
+from changelog.models import ChangeLog
+
+
+class Rollback(Exception):
+    pass
+
+
+@override_settings(CHANGELOG_WRITER='batched')
+class BatchedWriterTestCase(TransactionTestCase):
+    def setUp(self):
+        self.tracked = [
+            factories.TrackedModelFactory(),
+            factories.TrackedModelFactory(),
+            factories.TrackedModelFactory(),
+        ]
+
+    def update_all(self, value):
+        for instance in self.tracked:
+            instance.tracked_char = value
+            instance.save()
+
+    def test_autocommit(self):
+        self.update_all('asdf')
+
+        self.assertEqual(
+            3,
+            ChangeLog.objects.count(),
+        )
+
+    def test_written_on_commit(self):
+        with transaction.atomic():
+            self.update_all('asdf')
+
+            self.assertEqual(
+                0,
+                ChangeLog.objects.count(),
+            )
+
+        self.assertEqual(
+            3,
+            ChangeLog.objects.count(),
+        )
+
+    def test_single_insert(self):
+        ContentType.objects.get_for_model(self.tracked[0])
+
+        # one UPDATE per save, then a single INSERT for all logs
+        with self.assertNumQueries(4):
+            with transaction.atomic():
+                self.update_all('asdf')
+
+    def test_rollback(self):
+        with self.assertRaises(Rollback):
+            with transaction.atomic():
+                self.update_all('asdf')
+                raise Rollback
+
+        self.assertEqual(
+            0,
+            ChangeLog.objects.count(),
+        )
+
+    def test_savepoint_rollback(self):
+        with transaction.atomic():
+            self.tracked[0].tracked_char = 'asdf'
+            self.tracked[0].save()
+
+            with self.assertRaises(Rollback):
+                with transaction.atomic():
+                    self.tracked[1].tracked_char = 'asdf'
+                    self.tracked[1].save()
+                    raise Rollback
+
+            self.tracked[2].tracked_char = 'asdf'
+            self.tracked[2].save()
+
+        self.assertEqual(
+            [self.tracked[0].pk, self.tracked[2].pk],
+            sorted(ChangeLog.objects.values_list('object_id', flat=True)),
+        )
+
+    @override_settings(CHANGELOG_BATCH_SIZE=2)
+    def test_batch_size(self):
+        with transaction.atomic():
+            self.update_all('asdf')
+
+            self.assertEqual(
+                2,
+                ChangeLog.objects.count(),
+            )
+
+        self.assertEqual(
+            3,
+            ChangeLog.objects.count(),
+        )
+
+
+@override_settings(CHANGELOG_WRITER='async', CHANGELOG_FLUSH_INTERVAL=0.01)
+class AsyncWriterTestCase(TransactionTestCase):
+    def setUp(self):
+        self.tracked = [
+            factories.TrackedModelFactory(),
+            factories.TrackedModelFactory(),
+            factories.TrackedModelFactory(),
+        ]
+
+    def tearDown(self):
+        writers.stop_async_writer()
+
+    def test_save(self):
+        for instance in self.tracked:
+            instance.tracked_char = 'asdf'
+            instance.save()
+
+        writer = writers.get_async_writer('default')
+        writers.stop_async_writer()
+
+        self.assertEqual(
+            3,
+            ChangeLog.objects.count(),
+        )
+        self.assertEqual(3, writer.written)
+        self.assertEqual(0, writer.depth)
+
+    def test_update(self):
+        TrackedModel.objects.filter(
+            id__in=[self.tracked[0].id, self.tracked[1].id],
+        ).update(tracked_char='asdf')
+
+        writers.stop_async_writer()
+
+        self.assertEqual(
+            [self.tracked[0].pk, self.tracked[1].pk],
+            sorted(ChangeLog.objects.values_list('object_id', flat=True)),
+        )
+        self.assertEqual(
+            {ChangeLog.ON_UPDATE},
+            set(ChangeLog.objects.values_list('log_type', flat=True)),
+        )
+
+    def test_multi_table_update(self):
+        instance = TrackedChildModel.objects.create(parent_char='parent')
+
+        TrackedChildModel.objects.update(parent_char='new parent')
+
+        writers.stop_async_writer()
+
+        self.assertEqual(
+            {'parent_char': {'was': 'parent', 'now': 'new parent'}},
+            ChangeLog.objects.get(object_id=instance.pk).fields,
+        )
+
+    def test_rollback(self):
+        with self.assertRaises(Rollback):
+            with transaction.atomic():
+                self.tracked[0].tracked_char = 'asdf'
+                self.tracked[0].save()
+                raise Rollback
+
+        writers.stop_async_writer()
+
+        self.assertEqual(
+            0,
+            ChangeLog.objects.count(),
+        )
+
+    def test_writer_per_database(self):
+        writer = writers.get_async_writer('default')
+        other = writers.get_async_writer('other')
+
+        self.assertIsNot(writer, other)
+        self.assertEqual('other', other.using)
+        self.assertIs(other, writers.get_async_writer('other'))
+
+        other.put(ChangeLog(instance=self.tracked[0], fields={}))
+        writers.stop_async_writer()
+
+        self.assertFalse(writer.running)
+        self.assertFalse(other.running)
+        self.assertEqual(1, other.written)
+        self.assertEqual(1, ChangeLog.objects.count())
+
+    def test_drop_when_full(self):
+        # not started, so nothing drains the queue
+        writer = writers.AsyncWriter(
+            using='default',
+            queue_size=1,
+            block=False,
+        )
+
+        writer.put(ChangeLog(instance=self.tracked[0], fields={}))
+        writer.put(ChangeLog(instance=self.tracked[1], fields={}))
+
+        self.assertEqual(1, writer.depth)
+        self.assertEqual(1, writer.dropped)